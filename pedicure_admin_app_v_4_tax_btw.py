@@ -18,16 +18,28 @@ v4 – Wat zit erin:
 
 Benodigdheden:
     pip install tkcalendar reportlab babel python-dotenv xlsxwriter
+    (optioneel) pip install numpy   # tabblad Analyse
 """
 
 import os
+import io
+import json
+import functools
+import struct
+import queue
+import shutil
 import sqlite3
+import threading
+import time
+import zipfile
+import zlib
 import datetime as dt
+from collections import OrderedDict, namedtuple
 from dataclasses import dataclass
 from pathlib import Path
 
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 
 # Externe libs (optioneel)
 try:
@@ -44,6 +56,11 @@ try:
 except Exception:
     pdfcanvas = None
 
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None
+
 try:
     from dotenv import load_dotenv  # type: ignore
     load_dotenv()
@@ -53,11 +70,42 @@ except Exception:
 APP_DIR = Path.home() / ".pedicure_app"
 DB_PATH = APP_DIR / "pedicure.db"
 PDF_DIR = APP_DIR / "receipts"
+BACKUP_DIR = APP_DIR / "backups"
 APP_DIR.mkdir(parents=True, exist_ok=True)
 PDF_DIR.mkdir(parents=True, exist_ok=True)
 
 SUPPORTED_LANGS = ["nl", "fr", "en", "ar"]  # ar ~ Algerijns (Arabisch)
 
+# Jaararchieven: tabellen die per afgesloten jaar naar archive/pedicure_<jaar>.db verhuizen
+ARCHIVED_TABLES = ("receipts", "receipt_items", "appointments")
+ARCHIVE_INDEXES = {
+    "receipts": (("idx_receipts_date", "date"), ("idx_receipts_id", "id"), ("idx_receipts_client_date", "client_id, date"),
+                 ("idx_receipts_date_totals", "date, total_cents, net_cents, vat_cents, vat_rate")),
+    "receipt_items": (("idx_receipt_items_receipt", "receipt_id"), ("idx_receipt_items_date_name", "date, name, qty, price_cents")),
+    "appointments": (("idx_appointments_date", "date, time"),),
+}
+MAX_ATTACHED_ARCHIVES = 8  # SQLite laat standaard max. 10 gekoppelde databanken toe
+
+# Config-sleutels die in gerenderde documenten terechtkomen: wijzigen leegt render_cache
+RENDER_CONFIG_KEYS = ("company_name", "admin_name", "vat_rate", "base_lang")
+
+# Jaarafsluiting: deze kolommen bepalen de bevroren totalen en liggen na close_year vast
+LOCKED_COLUMNS = {
+    "receipts": ("number", "date", "total_cents", "vat_rate", "net_cents", "vat_cents"),
+    "receipt_items": ("receipt_id", "qty", "price_cents", "vat_rate", "net_cents", "vat_cents", "date"),
+}
+
+# Delta-synchronisatie: tabellen met change-log, in volgorde ouder -> kind,
+# en hun verwijzingen die in een delta als uid (niet als lokale id) reizen.
+SYNC_TABLES = ("clients", "manipulations", "receipts", "receipt_items", "appointments", "appointment_items")
+SYNC_REFS = {
+    "receipts": {"client_id": "clients"},
+    "receipt_items": {"receipt_id": "receipts", "manipulation_id": "manipulations"},
+    "appointments": {"client_id": "clients", "receipt_id": "receipts"},
+    # Reeksen (appointment_rules) reizen niet mee: enkel lijnen van losse afspraken
+    "appointment_items": {"appointment_id": "appointments", "manipulation_id": "manipulations"},
+}
+
 # ---- Vertalingen ------------------------------------------------------------
 T = {
     "nl": {
@@ -124,6 +172,53 @@ T = {
         "export_excel": "Exporteer Excel",
         "subtotal_by_manip": "Subtotaal per manipulatie",
         "tax_doc": "Belastingdocument huidig jaar",
+        "repeat_weeks": "Herhaal elke (weken)",
+        "repeat_until": "Herhalen tot (datum)",
+        "repeat_count": "Aantal keer",
+        "delete_occurrence_only": "Alleen deze afspraak verwijderen? (Nee = hele reeks)",
+        "archive_year": "Jaar archiveren",
+        "archive_year_prompt": "Welk afgesloten jaar archiveren?",
+        "backup_now": "Nu back-up maken",
+        "sync_export": "Wijzigingen exporteren (sync)",
+        "sync_import": "Wijzigingen importeren (sync)",
+        "open_pdf": "Open PDF",
+        "pack_pdfs": "PDF's van afgesloten maanden inpakken",
+        "analytics": "Analyse",
+        "an_client": "Omzet per cliënt",
+        "an_weekday": "Omzet per weekdag",
+        "an_hour": "Omzet per uur",
+        "an_manipulation": "Omzet per manipulatie",
+        "an_month": "Maand t.o.v. vorige maand",
+        "refresh": "Vernieuwen",
+        "quantity": "Aantal",
+        "weekdays": "ma,di,wo,do,vr,za,zo",
+        "no_numpy": "numpy niet geïnstalleerd. Installeer met: pip install numpy",
+        "import_clients": "Importeren (CSV/vCard)",
+        "import_receipts": "Reçus importeren",
+        "keep_numbers": "Reçunummers uit het bestand behouden? (Nee = nieuwe nummers toekennen)",
+        "close_year": "Boekjaar afsluiten",
+        "close_year_prompt": "Welk jaar definitief afsluiten?",
+        "close_day": "Dag afsluiten (Z)",
+        "z_report": "Z-rapport",
+        "compare_years": "Jaarvergelijking",
+        "compare_years_prompt": "Welke jaren vergelijken? (bv. 2023-2025 of 2022,2024)",
+        "months": "jan,feb,mrt,apr,mei,jun,jul,aug,sep,okt,nov,dec",
+        "print_batch": "Reçus samen afdrukken",
+        "checkout_day": "Dag afrekenen",
+        "billed": "Afgerekend",
+        "job_history": "Geplande taken",
+        "run_now": "Nu uitvoeren",
+        "job": "Taak",
+        "next_run": "Volgende keer",
+        "last_run": "Laatste keer",
+        "job_started": "Gestart",
+        "job_duration": "Duur",
+        "job_status": "Status",
+        "job_result": "Resultaat",
+        "job_reminders": "Herinneringen afspraken",
+        "job_nightly_reports": "Nachtelijke rapporten",
+        "job_optimize": "Databank optimaliseren",
+        "job_wal_checkpoint": "WAL-checkpoint",
     },
     "fr": {
         "app_title": "Administration Pédicure",
@@ -189,6 +284,53 @@ T = {
         "export_excel": "Exporter Excel",
         "subtotal_by_manip": "Sous-total par manipulation",
         "tax_doc": "Document fiscal (année en cours)",
+        "repeat_weeks": "Répéter toutes les (semaines)",
+        "repeat_until": "Répéter jusqu'au (date)",
+        "repeat_count": "Nombre de fois",
+        "delete_occurrence_only": "Supprimer seulement ce rendez-vous ? (Non = toute la série)",
+        "archive_year": "Archiver une année",
+        "archive_year_prompt": "Quelle année clôturée archiver ?",
+        "backup_now": "Sauvegarder maintenant",
+        "sync_export": "Exporter les modifications (sync)",
+        "sync_import": "Importer les modifications (sync)",
+        "open_pdf": "Ouvrir PDF",
+        "pack_pdfs": "Archiver les PDF des mois clôturés",
+        "analytics": "Analyse",
+        "an_client": "Chiffre par client",
+        "an_weekday": "Chiffre par jour de semaine",
+        "an_hour": "Chiffre par heure",
+        "an_manipulation": "Chiffre par soin",
+        "an_month": "Mois par rapport au mois précédent",
+        "refresh": "Actualiser",
+        "quantity": "Quantité",
+        "weekdays": "lun,mar,mer,jeu,ven,sam,dim",
+        "no_numpy": "numpy n'est pas installé. Installez avec : pip install numpy",
+        "import_clients": "Importer (CSV/vCard)",
+        "import_receipts": "Importer des reçus",
+        "keep_numbers": "Conserver les numéros du fichier ? (Non = nouveaux numéros)",
+        "close_year": "Clôturer l'exercice",
+        "close_year_prompt": "Quelle année clôturer définitivement ?",
+        "close_day": "Clôture du jour (Z)",
+        "z_report": "Rapport Z",
+        "compare_years": "Comparaison annuelle",
+        "compare_years_prompt": "Quelles années comparer ? (ex. 2023-2025 ou 2022,2024)",
+        "months": "janv,févr,mars,avr,mai,juin,juil,août,sept,oct,nov,déc",
+        "print_batch": "Imprimer les reçus en lot",
+        "checkout_day": "Clôturer les rendez-vous du jour",
+        "billed": "Facturé",
+        "job_history": "Tâches planifiées",
+        "run_now": "Exécuter maintenant",
+        "job": "Tâche",
+        "next_run": "Prochaine exécution",
+        "last_run": "Dernière exécution",
+        "job_started": "Démarré",
+        "job_duration": "Durée",
+        "job_status": "Statut",
+        "job_result": "Résultat",
+        "job_reminders": "Rappels de rendez-vous",
+        "job_nightly_reports": "Rapports nocturnes",
+        "job_optimize": "Optimiser la base de données",
+        "job_wal_checkpoint": "Checkpoint WAL",
     },
     "en": {
         "app_title": "Pedicure Admin",
@@ -254,6 +396,53 @@ T = {
         "export_excel": "Export Excel",
         "subtotal_by_manip": "Subtotal by procedure",
         "tax_doc": "Tax document (current year)",
+        "repeat_weeks": "Repeat every (weeks)",
+        "repeat_until": "Repeat until (date)",
+        "repeat_count": "Number of times",
+        "delete_occurrence_only": "Delete only this appointment? (No = whole series)",
+        "archive_year": "Archive year",
+        "archive_year_prompt": "Which closed year to archive?",
+        "backup_now": "Back up now",
+        "sync_export": "Export changes (sync)",
+        "sync_import": "Import changes (sync)",
+        "open_pdf": "Open PDF",
+        "pack_pdfs": "Pack PDFs of closed months",
+        "analytics": "Analytics",
+        "an_client": "Revenue by client",
+        "an_weekday": "Revenue by weekday",
+        "an_hour": "Revenue by hour",
+        "an_manipulation": "Revenue by treatment",
+        "an_month": "Month over month",
+        "refresh": "Refresh",
+        "quantity": "Quantity",
+        "weekdays": "Mon,Tue,Wed,Thu,Fri,Sat,Sun",
+        "no_numpy": "numpy not installed. Install with: pip install numpy",
+        "import_clients": "Import (CSV/vCard)",
+        "import_receipts": "Import receipts",
+        "keep_numbers": "Keep receipt numbers from the file? (No = assign new numbers)",
+        "close_year": "Close fiscal year",
+        "close_year_prompt": "Which year to close permanently?",
+        "close_day": "Close day (Z)",
+        "z_report": "Z report",
+        "compare_years": "Year comparison",
+        "compare_years_prompt": "Which years to compare? (e.g. 2023-2025 or 2022,2024)",
+        "months": "Jan,Feb,Mar,Apr,May,Jun,Jul,Aug,Sep,Oct,Nov,Dec",
+        "print_batch": "Batch print receipts",
+        "checkout_day": "Check out day",
+        "billed": "Billed",
+        "job_history": "Scheduled jobs",
+        "run_now": "Run now",
+        "job": "Job",
+        "next_run": "Next run",
+        "last_run": "Last run",
+        "job_started": "Started",
+        "job_duration": "Duration",
+        "job_status": "Status",
+        "job_result": "Result",
+        "job_reminders": "Appointment reminders",
+        "job_nightly_reports": "Nightly reports",
+        "job_optimize": "Optimize database",
+        "job_wal_checkpoint": "WAL checkpoint",
     },
     "ar": {
         "app_title": "إدارة العناية بالقدم",
@@ -319,6 +508,53 @@ T = {
         "export_excel": "تصدير Excel",
         "subtotal_by_manip": "الإجمالي حسب الإجراء",
         "tax_doc": "مستند الضرائب (هذه السنة)",
+        "repeat_weeks": "تكرار كل (أسابيع)",
+        "repeat_until": "تكرار حتى (تاريخ)",
+        "repeat_count": "عدد المرات",
+        "delete_occurrence_only": "حذف هذا الموعد فقط؟ (لا = السلسلة كاملة)",
+        "archive_year": "أرشفة سنة",
+        "archive_year_prompt": "أي سنة مغلقة تريد أرشفتها؟",
+        "backup_now": "نسخ احتياطي الآن",
+        "sync_export": "تصدير التغييرات (مزامنة)",
+        "sync_import": "استيراد التغييرات (مزامنة)",
+        "open_pdf": "فتح PDF",
+        "pack_pdfs": "حزم ملفات PDF للأشهر المغلقة",
+        "analytics": "تحليل",
+        "an_client": "المداخيل حسب الزبون",
+        "an_weekday": "المداخيل حسب يوم الأسبوع",
+        "an_hour": "المداخيل حسب الساعة",
+        "an_manipulation": "المداخيل حسب العلاج",
+        "an_month": "شهر مقارنة بالشهر السابق",
+        "refresh": "تحديث",
+        "quantity": "الكمية",
+        "weekdays": "الإثنين,الثلاثاء,الأربعاء,الخميس,الجمعة,السبت,الأحد",
+        "no_numpy": "numpy غير مثبت. ثبّته بـ: pip install numpy",
+        "import_clients": "استيراد (CSV/vCard)",
+        "import_receipts": "استيراد الإيصالات",
+        "keep_numbers": "الاحتفاظ بأرقام الإيصالات من الملف؟ (لا = أرقام جديدة)",
+        "close_year": "إقفال السنة المالية",
+        "close_year_prompt": "أي سنة تريد إقفالها نهائيًا؟",
+        "close_day": "إقفال اليوم (Z)",
+        "z_report": "تقرير Z",
+        "compare_years": "مقارنة السنوات",
+        "compare_years_prompt": "أي سنوات تريد مقارنتها؟ (مثال 2023-2025 أو 2022,2024)",
+        "months": "جانفي,فيفري,مارس,أفريل,ماي,جوان,جويلية,أوت,سبتمبر,أكتوبر,نوفمبر,ديسمبر",
+        "print_batch": "طباعة الإيصالات دفعة واحدة",
+        "checkout_day": "محاسبة مواعيد اليوم",
+        "billed": "مفوتر",
+        "job_history": "المهام المجدولة",
+        "run_now": "تشغيل الآن",
+        "job": "المهمة",
+        "next_run": "التشغيل التالي",
+        "last_run": "آخر تشغيل",
+        "job_started": "بدأ",
+        "job_duration": "المدة",
+        "job_status": "الحالة",
+        "job_result": "النتيجة",
+        "job_reminders": "تذكيرات المواعيد",
+        "job_nightly_reports": "التقارير الليلية",
+        "job_optimize": "تحسين قاعدة البيانات",
+        "job_wal_checkpoint": "نقطة تفتيش WAL",
     },
 }
 
@@ -335,7 +571,9 @@ CREATE TABLE IF NOT EXISTS clients (
     email TEXT,
     phone TEXT,
     notes TEXT,
-    lang TEXT DEFAULT 'nl'
+    lang TEXT DEFAULT 'nl',
+    email_norm TEXT,            -- normalize_email(email), voor ontdubbelen
+    phone_norm TEXT             -- normalize_phone(phone)
 );
 CREATE TABLE IF NOT EXISTS manipulations (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -351,21 +589,173 @@ CREATE TABLE IF NOT EXISTS appointments (
     notes TEXT,
     FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE SET NULL
 );
+CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments(date, time);
+-- Terugkerende afspraken: één regel per reeks, herhalingen worden bij het opvragen berekend
+CREATE TABLE IF NOT EXISTS appointment_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_id INTEGER,
+    start_date TEXT NOT NULL,   -- eerste afspraak YYYY-MM-DD
+    time TEXT NOT NULL,         -- HH:MM
+    duration_min INTEGER DEFAULT 30,
+    notes TEXT,
+    interval_weeks INTEGER NOT NULL,
+    until_date TEXT,            -- laatste datum (ook afgeleid uit count); NULL = onbeperkt
+    count INTEGER,
+    FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE SET NULL
+);
+CREATE INDEX IF NOT EXISTS idx_appointment_rules_range ON appointment_rules(start_date, until_date);
+CREATE TABLE IF NOT EXISTS appointment_exceptions (
+    rule_id INTEGER NOT NULL,
+    date TEXT NOT NULL,         -- oorspronkelijke datum van de herhaling
+    cancelled INTEGER NOT NULL DEFAULT 1,
+    time TEXT,                  -- afwijkend tijdstip (indien niet geannuleerd)
+    notes TEXT,
+    PRIMARY KEY(rule_id, date),
+    FOREIGN KEY(rule_id) REFERENCES appointment_rules(id) ON DELETE CASCADE
+);
+-- Geplande manipulaties van een afspraak of van een hele reeks (elke herhaling)
+CREATE TABLE IF NOT EXISTS appointment_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    appointment_id INTEGER,
+    rule_id INTEGER,
+    manipulation_id INTEGER NOT NULL,
+    qty INTEGER NOT NULL DEFAULT 1,
+    FOREIGN KEY(appointment_id) REFERENCES appointments(id) ON DELETE CASCADE,
+    FOREIGN KEY(rule_id) REFERENCES appointment_rules(id) ON DELETE CASCADE,
+    FOREIGN KEY(manipulation_id) REFERENCES manipulations(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_appointment_items_appointment ON appointment_items(appointment_id);
+CREATE INDEX IF NOT EXISTS idx_appointment_items_rule ON appointment_items(rule_id);
+-- Verstuurde herinneringen; ref = id uit list_appointments_in_range ('12' of 'R3:2025-06-02')
+CREATE TABLE IF NOT EXISTS appointment_reminders (
+    ref TEXT NOT NULL,
+    date TEXT NOT NULL,
+    sent_at TEXT NOT NULL,
+    PRIMARY KEY(ref, date)
+);
+-- Geplande taken (zie Scheduler); next_run is lokale tijd YYYY-MM-DDTHH:MM:SS
+CREATE TABLE IF NOT EXISTS jobs (
+    name TEXT PRIMARY KEY,
+    interval_min INTEGER NOT NULL,
+    at_time TEXT,               -- HH:MM voor dagelijkse taken, anders NULL
+    enabled INTEGER NOT NULL DEFAULT 1,
+    next_run TEXT NOT NULL,
+    last_run TEXT
+);
+CREATE TABLE IF NOT EXISTS job_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    status TEXT NOT NULL,       -- 'running', 'ok', 'error'
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_job_runs_job ON job_runs(job, id);
+CREATE TABLE IF NOT EXISTS store_flags (
+    name TEXT PRIMARY KEY       -- bv. 'sync_suppress' tijdens archiveren/importeren
+);
+CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    tbl TEXT NOT NULL,
+    row_id INTEGER NOT NULL,
+    uid TEXT,
+    op TEXT NOT NULL,           -- I / U / D
+    ts TEXT NOT NULL            -- UTC
+);
+CREATE INDEX IF NOT EXISTS idx_change_log_uid ON change_log(uid, seq);
+CREATE TABLE IF NOT EXISTS sync_peers (
+    node_id TEXT PRIMARY KEY,
+    last_imported_seq INTEGER NOT NULL DEFAULT 0,
+    imported_at TEXT
+);
+CREATE TABLE IF NOT EXISTS pdf_pack_index (
+    receipt_id INTEGER PRIMARY KEY,
+    pack TEXT NOT NULL,         -- zip relatief t.o.v. PDF_DIR
+    offset INTEGER NOT NULL,    -- begin van de (ongecomprimeerde) PDF-bytes in de zip
+    size INTEGER NOT NULL
+);
+-- Gerenderde documenten per hash van hun invoer (zie cached_render)
+CREATE TABLE IF NOT EXISTS render_cache (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,         -- 'receipt', 'period', 'summary', 'tax_doc', 'z_report', 'comparison'
+    path TEXT NOT NULL,         -- relatief t.o.v. PDF_DIR
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_render_cache_path ON render_cache(path);
+-- Hervatbare imports: voortgang wordt samen met elk stuk gecommit
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,         -- bv. 'receipts'
+    source TEXT NOT NULL,       -- pad van het bronbestand
+    size INTEGER,
+    mtime REAL,
+    options TEXT,               -- JSON
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'running',
+    stats TEXT,                 -- JSON, na afloop
+    started_at TEXT,
+    updated_at TEXT
+);
+-- Dagafsluiting (Z-rapport): totalen per dag, aangevuld vanaf last_id bij een nieuwe afsluiting
+CREATE TABLE IF NOT EXISTS day_closures (
+    date TEXT PRIMARY KEY,      -- YYYY-MM-DD
+    last_id INTEGER NOT NULL,   -- hoogste reçu-id in deze afsluiting
+    n INTEGER NOT NULL,
+    gross INTEGER NOT NULL,
+    net INTEGER NOT NULL,
+    vat INTEGER NOT NULL,
+    min_rate REAL,
+    max_rate REAL,
+    manipulations TEXT,         -- JSON [[naam, aantal, cent], ...]
+    runs INTEGER NOT NULL DEFAULT 1,
+    closed_at TEXT,
+    stale INTEGER NOT NULL DEFAULT 0   -- 1: een al afgesloten reçu van die dag is nadien gewijzigd
+);
+-- Jaarafsluiting: maandtotalen eenmalig berekend door close_year, daarna onveranderlijk
+CREATE TABLE IF NOT EXISTS closed_years (
+    year INTEGER PRIMARY KEY,
+    closed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS year_totals (
+    month TEXT PRIMARY KEY,     -- YYYY-MM
+    gross INTEGER NOT NULL,
+    net INTEGER NOT NULL,
+    vat INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    min_rate REAL,
+    max_rate REAL
+);
+CREATE TABLE IF NOT EXISTS archives (
+    year INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,         -- bestandsnaam onder APP_DIR/archive
+    archived_at TEXT
+);
 CREATE TABLE IF NOT EXISTS receipts (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     number TEXT UNIQUE,
     client_id INTEGER,
     date TEXT NOT NULL,
+    time TEXT,                  -- HH:MM van aanmaken
     total_cents INTEGER NOT NULL DEFAULT 0,
     pdf_path TEXT,
+    vat_rate REAL,              -- btw-voet (%) op het moment van aanmaken
+    net_cents INTEGER,
+    vat_cents INTEGER,
     FOREIGN KEY(client_id) REFERENCES clients(id) ON DELETE SET NULL
 );
+CREATE INDEX IF NOT EXISTS idx_receipts_date ON receipts(date);
+CREATE INDEX IF NOT EXISTS idx_receipts_client_date ON receipts(client_id, date);
 CREATE TABLE IF NOT EXISTS receipt_items (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     receipt_id INTEGER,
     manipulation_id INTEGER,
     qty INTEGER DEFAULT 1,
     price_cents INTEGER NOT NULL,
+    vat_rate REAL,
+    net_cents INTEGER,
+    vat_cents INTEGER,
+    name TEXT,                  -- naam van de manipulatie op het moment van aanmaken
+    date TEXT,                  -- kopie van receipts.date voor de subtotaal-index
     FOREIGN KEY(receipt_id) REFERENCES receipts(id) ON DELETE CASCADE,
     FOREIGN KEY(manipulation_id) REFERENCES manipulations(id)
 );
@@ -379,6 +769,136 @@ def money_to_cents(x: float) -> int:
 def cents_to_money(c: int) -> str:
     return f"{c/100:.2f}"
 
+def month_bounds(d: dt.date) -> tuple[dt.date, dt.date]:
+    start = d.replace(day=1)
+    next_month = (start.replace(day=28) + dt.timedelta(days=4)).replace(day=1)
+    return start, next_month - dt.timedelta(days=1)
+
+def period_dates(period: str, today: dt.date | None = None) -> tuple[dt.date, dt.date]:
+    """Begin en einde van 'day', 'week', 'month' of 'year' rond `today` (jaar: tot vandaag)."""
+    today = today or dt.date.today()
+    if period == "week":
+        start = today - dt.timedelta(days=today.weekday())
+        return start, start + dt.timedelta(days=6)
+    if period == "month":
+        return month_bounds(today)
+    if period == "year":
+        return today.replace(month=1, day=1), today
+    return today, today
+
+def translate(lang: str, key: str) -> str:
+    return T.get(lang, T["nl"]).get(key, key)
+
+def next_job_run(now: dt.datetime, interval_min: int, at_time: str | None = None, first: bool = False) -> dt.datetime:
+    """Volgende beurt van een taak na `now`: om at_time (HH:MM) elke interval_min // 1440
+    dagen, anders elke interval_min minuten. first: een nieuwe intervaltaak loopt meteen."""
+    if at_time:
+        h, m = (int(x) for x in at_time.split(":"))
+        nxt = now.replace(hour=h, minute=m, second=0, microsecond=0)
+        if nxt <= now:
+            nxt += dt.timedelta(days=max(1, interval_min // 1440))
+        return nxt
+    return now if first else now + dt.timedelta(minutes=interval_min)
+
+# PDF's staan in PDF_DIR/<jaar>/<maand>/; receipts.pdf_path bevat het pad relatief t.o.v. PDF_DIR.
+SHARDED_PDF_GLOB = "[0-9][0-9][0-9][0-9]/[0-9][0-9]/*"
+
+def pdf_target(name: str, when: dt.date, monthly: bool = True) -> Path:
+    folder = PDF_DIR / f"{when.year:04d}" / (f"{when.month:02d}" if monthly else "")
+    folder.mkdir(parents=True, exist_ok=True)
+    return folder / name
+
+def legacy_pdf_target(name: str, fallback: dt.date) -> Path:
+    """Doel voor een bestand uit de oude platte map, zoals de schrijvers het nu kiezen:
+    jaardocumenten (belastingdocument, jaarvergelijking) in <jaar>/, andere met een datum
+    in de naam volgens die datum, de rest volgens `fallback` (wijzigingsdatum)."""
+    import re
+    yearly = re.search(r"_(?:tax_declaration_(\d{4})|comparison_\d{4}-(\d{4}))\.pdf$", name)
+    if yearly:
+        return pdf_target(name, dt.date(int(yearly.group(1) or yearly.group(2)), 1, 1), monthly=False)
+    dated = re.search(r"_(\d{4}-\d{2}-\d{2})[_.]", name) or re.search(r"_receipt_(\d{8})-", name)  # nummer JJJJMMDD-NNNN
+    if dated:
+        try:
+            return pdf_target(name, dt.date.fromisoformat(dated.group(1)))
+        except ValueError:
+            pass
+    return pdf_target(name, fallback)
+
+def pdf_rel(path: Path) -> str:
+    try:
+        return Path(path).relative_to(PDF_DIR).as_posix()
+    except ValueError:
+        return str(path)
+
+def resolve_pdf(stored: str | None) -> Path | None:
+    """Absoluut pad voor een opgeslagen pdf_path (relatief of nog oud/absoluut)."""
+    if not stored:
+        return None
+    p = Path(stored)
+    return p if p.is_absolute() else PDF_DIR / p
+
+def expand_rule(rule, start: dt.date, end: dt.date):
+    """Datums van de herhalingen van een afspraakreeks binnen [start, end]."""
+    first = dt.date.fromisoformat(rule['start_date'])
+    step = dt.timedelta(weeks=rule['interval_weeks'])
+    last = end
+    if rule['until_date']:
+        last = min(last, dt.date.fromisoformat(rule['until_date']))
+    n = max(0, -(-(start - first).days // step.days))
+    d = first + n * step
+    while d <= last:
+        yield d
+        d += step
+
+def split_vat(gross_cents: int, vat_rate: float) -> tuple[int, int]:
+    """(netto, btw) in cent voor een bedrag inclusief btw."""
+    vat = int(round(gross_cents * (vat_rate / (100.0 + vat_rate)))) if vat_rate > 0 else 0
+    return gross_cents - vat, vat
+
+def split_vat_lines(line_cents: list[int], vat_rate: float) -> list[tuple[int, int]]:
+    """(netto, btw) per lijn; afrondingsverschil gaat naar de grootste lijn zodat de som klopt met het reçu."""
+    parts = [split_vat(c, vat_rate) for c in line_cents]
+    if parts:
+        diff = split_vat(sum(line_cents), vat_rate)[1] - sum(v for _n, v in parts)
+        if diff:
+            i = max(range(len(line_cents)), key=lambda k: line_cents[k])
+            n, v = parts[i]
+            parts[i] = (n - diff, v + diff)
+    return parts
+
+def _merge_vat_sums(acc: dict, row) -> None:
+    """Telt een rij gross/net/vat/n/min_rate/max_rate op bij `acc`."""
+    for k in ('gross', 'net', 'vat', 'n'):
+        acc[k] += row[k] or 0
+    if row['min_rate'] is not None:
+        acc['min_rate'] = row['min_rate'] if acc['min_rate'] is None else min(acc['min_rate'], row['min_rate'])
+        acc['max_rate'] = row['max_rate'] if acc['max_rate'] is None else max(acc['max_rate'], row['max_rate'])
+
+def vat_rate_label(min_rate, max_rate) -> str:
+    if min_rate is None:
+        return ""
+    if max_rate is None or abs(max_rate - min_rate) < 1e-9:
+        return f"{min_rate:.2f}%"
+    return f"{min_rate:.2f}–{max_rate:.2f}%"
+
+def normalize_email(email: str | None) -> str | None:
+    email = (email or "").strip().lower()
+    if not email or " " in email or email.count("@") != 1 or email.startswith("@") or email.endswith("@"):
+        return None
+    return email
+
+def normalize_phone(phone: str | None, country: str = "32") -> str | None:
+    """Enkel cijfers, internationaal zonder '+' of '00'; nationaal 0... krijgt de landcode."""
+    raw = (phone or "").strip()
+    digits = "".join(ch for ch in raw if ch.isdigit())
+    if raw.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = country + digits[1:]
+    return digits if len(digits) >= 8 else None
+
 @dataclass
 class Company:
     name: str
@@ -386,30 +906,443 @@ class Company:
     base_lang: str = "nl"
 
 # ---- Data Layer -------------------------------------------------------------
+class QueryCache:
+    """LRU-cache voor leesqueries van één Store-verbinding. Alle resultaten horen
+    bij een 'stempel' (PRAGMA data_version + total_changes): schrijft iemand, deze
+    verbinding of een andere, dan verandert de stempel en vervalt de hele cache."""
+    def __init__(self, maxsize: int = 256, max_rows: int = 50_000):
+        self.maxsize = maxsize
+        self.max_rows = max_rows
+        self.entries = OrderedDict()
+        self.stamp = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, conn, key, compute):
+        stamp = (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+        if stamp != self.stamp:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.stamp = stamp
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        value = compute()
+        # compute() kan zelf schrijven (bv. archief koppelen): enkel bewaren bij ongewijzigde stempel.
+        # Zeer grote lijsten (volledige historiek) niet vasthouden.
+        if isinstance(value, list) and len(value) > self.max_rows:
+            return value
+        if (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes) == self.stamp:
+            self.entries[key] = value
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries),
+                "evictions": self.evictions, "invalidations": self.invalidations}
+
+class RecordMixin:
+    """Compacte rij (namedtuple, geen __dict__) die zich gedraagt als sqlite3.Row:
+    r['kolom'], r[0], r.keys(); daarnaast r.kolom en r.get('kolom', standaard)."""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise IndexError(f"No item with that key: {key}") from None
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return list(self._fields)
+
+    def as_dict(self) -> dict:
+        return dict(zip(self._fields, self))
+
+_record_types = {}
+
+def record_type(name: str, columns: tuple):
+    cls = _record_types.get((name, columns))
+    if cls is None:
+        base = namedtuple(name + "Base", columns)
+        cls = _record_types[(name, columns)] = type(name, (RecordMixin, base), {"__slots__": ()})
+    return cls
+
+def record_factory(name: str):
+    """row_factory die rijen als `name`-records teruggeeft; het type volgt de kolommen
+    van de query en wordt per cursorbeschrijving maar één keer opgezocht."""
+    last = [None, None]
+
+    def factory(cursor, row):
+        desc = cursor.description
+        if desc is not last[0]:
+            last[0], last[1] = desc, record_type(name, tuple(d[0] for d in desc))._make
+        return last[1](row)
+    return factory
+
+ReceiptRecord = record_factory("Receipt")
+ClientRecord = record_factory("Client")
+ItemRecord = record_factory("ReceiptItem")
+
+def cached_query(fn):
+    """Leesmethode van Store via de QueryCache, op naam en parameters."""
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if not self._query_cache.maxsize:
+            return fn(self, *args, **kwargs)
+        key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+        return _cache_copy(self._query_cache.get(self.conn, key, lambda: fn(self, *args, **kwargs)))
+    return wrapper
+
+def _cache_copy(value):
+    """Kopie van de containers van een gecachet resultaat, zodat een aanroeper de cache
+    niet kan wijzigen. Records en sqlite3.Row zijn onveranderlijk en worden gedeeld;
+    lijsten zijn homogeen, dus het eerste element beslist of er dieper gekopieerd moet worden."""
+    if isinstance(value, list):
+        if value and (isinstance(value[0], (dict, list)) or type(value[0]) is tuple):
+            return [_cache_copy(v) for v in value]
+        return list(value)
+    if isinstance(value, dict):
+        return {k: _cache_copy(v) for k, v in value.items()}
+    if type(value) is tuple:
+        return tuple(_cache_copy(v) for v in value)
+    return value
+
 class Store:
-    def __init__(self, path=DB_PATH):
-        self.conn = sqlite3.connect(path)
+    def __init__(self, path=DB_PATH, check_same_thread=True, cache_size=256):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=check_same_thread)
         self.conn.row_factory = sqlite3.Row
+        if str(path) != ":memory:":
+            # WAL: back-ups en andere lezers blokkeren de schrijvende balie niet
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        # Verhoogd bij elke wijziging aan afspraken; caches in de UI vergelijken hiermee.
+        self.appointments_rev = 0
+        # Jaararchieven naast de databank; gekoppeld (ATTACH) pas wanneer een range ze raakt
+        self.archive_dir = (Path(path).parent if str(path) != ":memory:" else APP_DIR) / "archive"
+        self._archive_years = None
+        self._attached = OrderedDict()
+        self._query_cache = QueryCache(cache_size)
         self._init_db()
 
+    def cache_stats(self) -> dict:
+        return self._query_cache.stats()
+
     def _init_db(self):
         cur = self.conn.cursor()
         cur.executescript(SCHEMA_SQL)
         self.conn.commit()
+        self._migrate()
+
+    def _ensure_column(self, table, column, decl) -> bool:
+        cols = [r[1] for r in self.conn.execute(f"PRAGMA table_info({table})")]
+        if column in cols:
+            return False
+        self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        return True
+
+    def _migrate(self):
+        """Brengt een bestaande databank op het huidige schema; veilig om telkens te draaien."""
+        for table in ("receipts", "receipt_items"):
+            for col, decl in (("vat_rate", "REAL"), ("net_cents", "INTEGER"), ("vat_cents", "INTEGER")):
+                self._ensure_column(table, col, decl)
+        self._backfill_vat()
+        self._ensure_column("receipt_items", "name", "TEXT")
+        self._ensure_column("receipt_items", "date", "TEXT")
+        self._ensure_column("receipts", "time", "TEXT")
+        # Afgerekende afspraak -> reçu (voor herhalingen op de uitzondering van die dag)
+        self._ensure_column("appointments", "receipt_id", "INTEGER")
+        self._ensure_column("appointment_exceptions", "receipt_id", "INTEGER")
+        self.conn.execute(
+            """
+            UPDATE receipt_items SET
+                name=COALESCE(name, (SELECT m.name FROM manipulations m WHERE m.id=receipt_items.manipulation_id)),
+                date=(SELECT r.date FROM receipts r WHERE r.id=receipt_items.receipt_id)
+            WHERE date IS NULL
+            """
+        )
+        # Indexen op gemigreerde kolommen pas na de ALTERs
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_receipt_items_receipt ON receipt_items(receipt_id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_receipt_items_date_name ON receipt_items(date, name, qty, price_cents)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_receipts_date_totals ON receipts(date, total_cents, net_cents, vat_cents, vat_rate)")
+        self._ensure_column("day_closures", "stale", "INTEGER NOT NULL DEFAULT 0")
+        self._install_change_tracking()
+        self._install_year_locks()
+        self._install_closure_invalidation()
+        if self._ensure_column("clients", "email_norm", "TEXT") | self._ensure_column("clients", "phone_norm", "TEXT"):
+            self._backfill_client_norms()
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_clients_email_norm ON clients(email_norm)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_clients_phone_norm ON clients(phone_norm)")
+        self.conn.commit()
+
+    def _backfill_client_norms(self):
+        # Afgeleide kolommen: niet als wijziging naar andere installaties sturen
+        country = self.get_config("phone_country", "32")
+        cur = self.conn.cursor()
+        cur.execute("INSERT OR IGNORE INTO store_flags(name) VALUES('sync_suppress')")
+        rows = cur.execute("SELECT id, email, phone FROM clients").fetchall()
+        cur.executemany("UPDATE clients SET email_norm=?, phone_norm=? WHERE id=?",
+                        [(normalize_email(e), normalize_phone(p, country), cid) for cid, e, p in rows])
+        cur.execute("DELETE FROM store_flags WHERE name='sync_suppress'")
+
+    def _install_change_tracking(self):
+        """uid-kolom + triggers die elke wijziging in change_log noteren."""
+        skip = "NOT EXISTS (SELECT 1 FROM store_flags WHERE name='sync_suppress')"
+        now = "strftime('%Y-%m-%dT%H:%M:%f','now')"
+        for t in SYNC_TABLES:
+            if self._ensure_column(t, "uid", "TEXT"):
+                self.conn.execute(f"UPDATE {t} SET uid=lower(hex(randomblob(16))) WHERE uid IS NULL")
+            self.conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{t}_uid ON {t}(uid)")
+            self.conn.executescript(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{t}_ins AFTER INSERT ON {t}
+                BEGIN
+                    UPDATE {t} SET uid=lower(hex(randomblob(16))) WHERE id=NEW.id AND uid IS NULL;
+                    INSERT INTO change_log(tbl,row_id,uid,op,ts)
+                    SELECT '{t}', NEW.id, (SELECT uid FROM {t} WHERE id=NEW.id), 'I', {now} WHERE {skip};
+                END;
+                CREATE TRIGGER IF NOT EXISTS trg_{t}_upd AFTER UPDATE ON {t} WHEN OLD.uid IS NOT NULL
+                BEGIN
+                    INSERT INTO change_log(tbl,row_id,uid,op,ts)
+                    SELECT '{t}', NEW.id, NEW.uid, 'U', {now} WHERE {skip};
+                END;
+                CREATE TRIGGER IF NOT EXISTS trg_{t}_del AFTER DELETE ON {t}
+                BEGIN
+                    INSERT INTO change_log(tbl,row_id,uid,op,ts)
+                    SELECT '{t}', OLD.id, OLD.uid, 'D', {now} WHERE {skip};
+                END;
+            """)
+
+    def _install_year_locks(self):
+        """Triggers die reçus in afgesloten jaren en de jaartotalen zelf tegen wijzigen beschermen.
+        archive_year verplaatst rijen onder de vlag 'year_move'."""
+        def closed(col):
+            return f"EXISTS (SELECT 1 FROM closed_years WHERE year=CAST(substr({col},1,4) AS INTEGER))"
+        moving = "EXISTS (SELECT 1 FROM store_flags WHERE name='year_move')"
+        abort = "SELECT RAISE(ABORT, 'Boekjaar is afgesloten');"
+        for t, cols in LOCKED_COLUMNS.items():
+            changed = " OR ".join(f"NEW.{c} IS NOT OLD.{c}" for c in cols)
+            self.conn.executescript(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{t}_closed_ins BEFORE INSERT ON {t}
+                WHEN {closed('NEW.date')}
+                BEGIN {abort} END;
+                CREATE TRIGGER IF NOT EXISTS trg_{t}_closed_upd BEFORE UPDATE ON {t}
+                WHEN ({closed('OLD.date')} OR {closed('NEW.date')}) AND ({changed})
+                BEGIN {abort} END;
+                CREATE TRIGGER IF NOT EXISTS trg_{t}_closed_del BEFORE DELETE ON {t}
+                WHEN {closed('OLD.date')} AND NOT {moving}
+                BEGIN {abort} END;
+            """)
+        self.conn.executescript(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_year_totals_ins BEFORE INSERT ON year_totals
+            WHEN {closed('NEW.month')}
+            BEGIN {abort} END;
+            CREATE TRIGGER IF NOT EXISTS trg_year_totals_upd BEFORE UPDATE ON year_totals
+            BEGIN {abort} END;
+            CREATE TRIGGER IF NOT EXISTS trg_year_totals_del BEFORE DELETE ON year_totals
+            BEGIN {abort} END;
+            CREATE TRIGGER IF NOT EXISTS trg_closed_years_upd BEFORE UPDATE ON closed_years
+            BEGIN {abort} END;
+            CREATE TRIGGER IF NOT EXISTS trg_closed_years_del BEFORE DELETE ON closed_years
+            BEGIN {abort} END;
+        """)
+
+    def _install_closure_invalidation(self):
+        """Triggers die een dagafsluiting als verouderd markeren zodra een reçu of lijn die
+        ze al meetelde (id <= last_id) wijzigt, verdwijnt of erbij komt, bv. via een
+        sync-delta. Verplaatsen naar een jaararchief (vlag 'year_move') telt niet."""
+        moving = "EXISTS (SELECT 1 FROM store_flags WHERE name='year_move')"
+        for t, rid in (("receipts", "id"), ("receipt_items", "receipt_id")):
+            cols = LOCKED_COLUMNS[t] + (("name",) if t == "receipt_items" else ())
+            changed = " OR ".join(f"NEW.{c} IS NOT OLD.{c}" for c in cols)
+            stale = lambda row: f"(date={row}.date AND {row}.{rid}<=last_id)"
+            self.conn.executescript(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{t}_closure_ins AFTER INSERT ON {t}
+                BEGIN UPDATE day_closures SET stale=1 WHERE {stale('NEW')}; END;
+                CREATE TRIGGER IF NOT EXISTS trg_{t}_closure_upd AFTER UPDATE ON {t}
+                WHEN {changed}
+                BEGIN UPDATE day_closures SET stale=1 WHERE {stale('OLD')} OR {stale('NEW')}; END;
+                CREATE TRIGGER IF NOT EXISTS trg_{t}_closure_del AFTER DELETE ON {t}
+                WHEN NOT {moving}
+                BEGIN UPDATE day_closures SET stale=1 WHERE {stale('OLD')}; END;
+            """)
+
+    def _backfill_vat(self):
+        """Oude reçus zonder btw-snapshot krijgen die van de huidige btw-voet."""
+        cur = self.conn.cursor()
+        cur.execute("SELECT id, total_cents FROM receipts WHERE vat_cents IS NULL")
+        todo = cur.fetchall()
+        if not todo:
+            return
+        rate = self.get_vat_rate()
+        cur.execute(
+            """
+            SELECT ri.id, ri.receipt_id, ri.qty*ri.price_cents FROM receipt_items ri
+            JOIN receipts r ON r.id=ri.receipt_id
+            WHERE r.vat_cents IS NULL ORDER BY ri.id
+            """
+        )
+        lines = {}
+        for iid, rid, cents in cur.fetchall():
+            lines.setdefault(rid, []).append((iid, cents))
+        for rid, total in todo:
+            net, vat = split_vat(total, rate)
+            cur.execute("UPDATE receipts SET vat_rate=?, net_cents=?, vat_cents=? WHERE id=?", (rate, net, vat, rid))
+            its = lines.get(rid, [])
+            parts = split_vat_lines([c for _i, c in its], rate)
+            cur.executemany(
+                "UPDATE receipt_items SET vat_rate=?, net_cents=?, vat_cents=? WHERE id=?",
+                [(rate, n, v, iid) for (iid, _c), (n, v) in zip(its, parts)],
+            )
 
     # Config
+    @cached_query
     def get_config(self, key, default=None):
         cur = self.conn.cursor()
         cur.execute("SELECT value FROM config WHERE key=?", (key,))
         row = cur.fetchone()
         return row[0] if row else default
 
+    def all_config(self) -> dict:
+        cur = self.conn.cursor()
+        cur.execute("SELECT key, value FROM config")
+        return dict(cur.fetchall())
+
+    def get_vat_rate(self) -> float:
+        try:
+            return float(self.get_config("vat_rate", "21") or 21)
+        except ValueError:
+            return 21.0
+
     def set_config(self, key, value):
         cur = self.conn.cursor()
+        if key in RENDER_CONFIG_KEYS and self.get_config(key) != value:
+            cur.execute("DELETE FROM render_cache")
         cur.execute("INSERT INTO config(key,value) VALUES(?,?) ON CONFLICT(key) DO UPDATE SET value=excluded.value", (key, value))
         self.conn.commit()
 
+    # Render-cache
+    def get_rendered(self, key: str) -> Path | None:
+        cur = self.conn.cursor()
+        cur.execute("SELECT path FROM render_cache WHERE key=?", (key,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        path = resolve_pdf(row[0])
+        if path is None or not path.exists():
+            cur.execute("DELETE FROM render_cache WHERE key=?", (key,))
+            self.conn.commit()
+            return None
+        return path
+
+    def put_rendered(self, key: str, kind: str, path: Path):
+        # Hetzelfde bestand kan maar bij één invoer horen: oudere sleutels voor dit pad vervallen
+        rel = pdf_rel(Path(path))
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM render_cache WHERE path=?", (rel,))
+        cur.execute("INSERT OR REPLACE INTO render_cache(key,kind,path,created_at) VALUES(?,?,?,?)",
+                    (key, kind, rel, dt.datetime.now().isoformat(timespec="seconds")))
+        self.conn.commit()
+
+    # Geplande taken
+    def ensure_jobs(self, specs):
+        """Legt taken aan of werkt hun rooster bij; specs: (naam, interval_min, at_time).
+        next_run van bestaande taken blijft staan, zodat gemiste beurten na een herstart
+        inhalen. Runs die bij het afsluiten nog liepen worden als onderbroken gemarkeerd."""
+        now = dt.datetime.now()
+        cur = self.conn.cursor()
+        cur.executemany(
+            """
+            INSERT INTO jobs(name,interval_min,at_time,next_run) VALUES(?,?,?,?)
+            ON CONFLICT(name) DO UPDATE SET interval_min=excluded.interval_min, at_time=excluded.at_time
+            """,
+            [(name, interval, at, next_job_run(now, interval, at, first=True).isoformat(timespec="seconds"))
+             for name, interval, at in specs])
+        cur.execute("UPDATE job_runs SET status='error', result='onderbroken' WHERE status='running'")
+        self.conn.commit()
+
+    def list_jobs(self):
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM jobs ORDER BY name")
+        return cur.fetchall()
+
+    def claim_due_job(self, now: dt.datetime):
+        """Neemt de eerstvolgende vervallen taak: next_run schuift meteen door (ook een
+        crash tijdens de taak herhaalt ze dus niet eindeloos) en er komt een job_runs-rij.
+        Geeft (naam, run-id) of None."""
+        ts = now.isoformat(timespec="seconds")
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM jobs WHERE enabled=1 AND next_run<=? ORDER BY next_run LIMIT 1", (ts,))
+        job = cur.fetchone()
+        if job is None:
+            return None
+        nxt = next_job_run(now, job['interval_min'], job['at_time']).isoformat(timespec="seconds")
+        try:
+            cur.execute("UPDATE jobs SET next_run=?, last_run=? WHERE name=? AND next_run=?",
+                        (nxt, ts, job['name'], job['next_run']))
+            if cur.rowcount == 0:   # intussen door een ander proces genomen
+                self.conn.rollback()
+                return None
+            cur.execute("INSERT INTO job_runs(job,started_at,status) VALUES(?,?,'running')", (job['name'], ts))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return job['name'], cur.lastrowid
+
+    def finish_job_run(self, run_id: int, status: str, result: str):
+        cur = self.conn.cursor()
+        cur.execute("UPDATE job_runs SET finished_at=?, status=?, result=? WHERE id=?",
+                    (dt.datetime.now().isoformat(timespec="seconds"), status, result, run_id))
+        self.conn.commit()
+
+    def set_job_due(self, name: str):
+        """Laat een taak bij de volgende controle lopen (knop 'Nu uitvoeren')."""
+        cur = self.conn.cursor()
+        cur.execute("UPDATE jobs SET next_run=? WHERE name=?", (dt.datetime.now().isoformat(timespec="seconds"), name))
+        self.conn.commit()
+
+    def next_job_due(self) -> str | None:
+        cur = self.conn.cursor()
+        cur.execute("SELECT MIN(next_run) FROM jobs WHERE enabled=1")
+        return cur.fetchone()[0]
+
+    def job_runs(self, limit: int = 200):
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM job_runs ORDER BY id DESC LIMIT ?", (limit,))
+        return cur.fetchall()
+
+    # Onderhoud
+    def optimize(self) -> str:
+        """ANALYZE als er nog geen statistieken zijn, anders PRAGMA optimize (herziet
+        alleen tabellen waarvan de statistieken verouderd zijn)."""
+        cur = self.conn.cursor()
+        cur.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'")
+        if cur.fetchone() is None:
+            self.conn.execute("ANALYZE")
+            self.conn.commit()
+            return "ANALYZE"
+        self.conn.execute("PRAGMA optimize")
+        self.conn.commit()
+        return "PRAGMA optimize"
+
+    def wal_checkpoint(self) -> dict:
+        """Zet het WAL-bestand over naar de databank en maakt het weer leeg (TRUNCATE)."""
+        busy, log, done = self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        return {"busy": busy, "wal_pages": log, "checkpointed": done}
+
     # Company
+    @cached_query
     def get_company(self) -> Company | None:
         name = self.get_config("company_name")
         admin = self.get_config("admin_name")
@@ -421,17 +1354,49 @@ class Store:
     # Clients
     def add_client(self, name, email, phone, notes, lang="nl"):
         cur = self.conn.cursor()
-        cur.execute("INSERT INTO clients(name,email,phone,notes,lang) VALUES(?,?,?,?,?)", (name,email,phone,notes,lang))
+        cur.execute("INSERT INTO clients(name,email,phone,notes,lang,email_norm,phone_norm) VALUES(?,?,?,?,?,?,?)",
+                    (name, email, phone, notes, lang, normalize_email(email), normalize_phone(phone, self.get_config("phone_country", "32"))))
         self.conn.commit()
 
+    def add_clients_bulk(self, rows) -> int:
+        """rows: (name, email, phone, notes, lang, email_norm, phone_norm); één transactie."""
+        cur = self.conn.cursor()
+        try:
+            # change_log in één keer bijwerken i.p.v. per rij via de trigger
+            last_id = cur.execute("SELECT COALESCE(MAX(id),0) FROM clients").fetchone()[0]
+            cur.execute("INSERT OR IGNORE INTO store_flags(name) VALUES('sync_suppress')")
+            cur.executemany("INSERT INTO clients(name,email,phone,notes,lang,email_norm,phone_norm,uid) VALUES(?,?,?,?,?,?,?,lower(hex(randomblob(16))))", rows)
+            n = cur.rowcount
+            cur.execute("DELETE FROM store_flags WHERE name='sync_suppress'")
+            cur.execute("INSERT INTO change_log(tbl,row_id,uid,op,ts) SELECT 'clients', id, uid, 'I', strftime('%Y-%m-%dT%H:%M:%f','now') FROM clients WHERE id>? ORDER BY id", (last_id,))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return n
+
+    def existing_client_keys(self, emails, phones) -> tuple[set, set]:
+        """Welke genormaliseerde e-mails en telefoons al bij een cliënt staan."""
+        cur = self.conn.cursor()
+        found = (set(), set())
+        for out, col, values in ((found[0], "email_norm", list(emails)), (found[1], "phone_norm", list(phones))):
+            for k in range(0, len(values), 500):
+                part = values[k:k+500]
+                cur.execute(f"SELECT {col} FROM clients WHERE {col} IN ({','.join('?' * len(part))})", part)
+                out.update(r[0] for r in cur.fetchall())
+        return found
+
+    @cached_query
     def list_clients(self):
         cur = self.conn.cursor()
+        cur.row_factory = ClientRecord
         cur.execute("SELECT * FROM clients ORDER BY name")
         return cur.fetchall()
 
     def update_client(self, cid, name, email, phone, notes, lang):
         cur = self.conn.cursor()
-        cur.execute("UPDATE clients SET name=?, email=?, phone=?, notes=?, lang=? WHERE id=?", (name,email,phone,notes,lang,cid))
+        cur.execute("UPDATE clients SET name=?, email=?, phone=?, notes=?, lang=?, email_norm=?, phone_norm=? WHERE id=?",
+                    (name, email, phone, notes, lang, normalize_email(email), normalize_phone(phone, self.get_config("phone_country", "32")), cid))
         self.conn.commit()
 
     def delete_client(self, cid):
@@ -445,6 +1410,7 @@ class Store:
         cur.execute("INSERT INTO manipulations(name, price_cents) VALUES(?,?)", (name, price_cents))
         self.conn.commit()
 
+    @cached_query
     def list_manips(self):
         cur = self.conn.cursor()
         cur.execute("SELECT * FROM manipulations ORDER BY name")
@@ -461,119 +1427,2578 @@ class Store:
         self.conn.commit()
 
     # Appointments
-    def add_appointment(self, client_id, date, time, duration_min, notes):
+    def add_appointment(self, client_id, date, time, duration_min, notes, items=None):
+        """items: geplande manipulaties als (manipulation_id, qty)"""
         cur = self.conn.cursor()
         cur.execute("INSERT INTO appointments(client_id,date,time,duration_min,notes) VALUES(?,?,?,?,?)", (client_id,date,time,duration_min,notes))
+        aid = cur.lastrowid
+        cur.executemany("INSERT INTO appointment_items(appointment_id, manipulation_id, qty) VALUES(?,?,?)",
+                        [(aid, mid, qty) for mid, qty in items or ()])
         self.conn.commit()
+        self.appointments_rev += 1
+        return aid
 
+    @cached_query
     def list_appointments_in_range(self, start_date: dt.date, end_date: dt.date):
+        parts = self._query_ranged(
+            """
+            SELECT a.*, c.name as client_name, NULL as rule_id FROM {db}.appointments a
+            LEFT JOIN main.clients c ON c.id=a.client_id
+            WHERE date>=? AND date<=? ORDER BY date,time
+            """,
+            (start_date.isoformat(), end_date.isoformat()), start_date, end_date,
+        )
+        occurrences = self._expand_rules_in_range(start_date, end_date)
+        if len(parts) == 1 and not occurrences:
+            return parts[0]
+        rows = [r for rows in parts for r in rows] + occurrences
+        return sorted(rows, key=lambda r: (r['date'], r['time']))
+
+    def _expand_rules_in_range(self, start_date: dt.date, end_date: dt.date) -> list[dict]:
         cur = self.conn.cursor()
         cur.execute(
             """
-            SELECT a.*, c.name as client_name FROM appointments a
-            LEFT JOIN clients c ON c.id=a.client_id
-            WHERE date>=? AND date<=? ORDER BY date,time
+            SELECT r.*, c.name as client_name FROM appointment_rules r
+            LEFT JOIN clients c ON c.id=r.client_id
+            WHERE r.start_date<=? AND (r.until_date IS NULL OR r.until_date>=?)
             """,
+            (end_date.isoformat(), start_date.isoformat()),
+        )
+        rules = cur.fetchall()
+        if not rules:
+            return []
+        cur.execute(
+            "SELECT * FROM appointment_exceptions WHERE date>=? AND date<=?",
             (start_date.isoformat(), end_date.isoformat()),
         )
-        return cur.fetchall()
+        exceptions = {(e['rule_id'], e['date']): e for e in cur.fetchall()}
+        out = []
+        for rule in rules:
+            for d in expand_rule(rule, start_date, end_date):
+                day = d.isoformat()
+                exc = exceptions.get((rule['id'], day))
+                if exc is not None and exc['cancelled']:
+                    continue
+                out.append({
+                    'id': f"R{rule['id']}:{day}",
+                    'rule_id': rule['id'],
+                    'client_id': rule['client_id'],
+                    'client_name': rule['client_name'],
+                    'date': day,
+                    'time': (exc['time'] if exc is not None and exc['time'] else rule['time']),
+                    'duration_min': rule['duration_min'],
+                    'notes': (exc['notes'] if exc is not None and exc['notes'] else rule['notes']),
+                    'receipt_id': exc['receipt_id'] if exc is not None else None,
+                })
+        return out
+
+    def add_appointment_rule(self, client_id, start_date, time, duration_min, notes, interval_weeks, until_date=None, count=None, items=None):
+        """Reeks afspraken elke `interval_weeks` weken, tot `until_date` en/of `count` keer.
+        items: geplande manipulaties (manipulation_id, qty) voor elke herhaling."""
+        if count:
+            last = dt.date.fromisoformat(start_date) + dt.timedelta(weeks=interval_weeks * (count - 1))
+            if not until_date or last.isoformat() < until_date:
+                until_date = last.isoformat()
+        cur = self.conn.cursor()
+        cur.execute(
+            "INSERT INTO appointment_rules(client_id,start_date,time,duration_min,notes,interval_weeks,until_date,count) VALUES(?,?,?,?,?,?,?,?)",
+            (client_id, start_date, time, duration_min, notes, interval_weeks, until_date, count),
+        )
+        rule_id = cur.lastrowid
+        cur.executemany("INSERT INTO appointment_items(rule_id, manipulation_id, qty) VALUES(?,?,?)",
+                        [(rule_id, mid, qty) for mid, qty in items or ()])
+        self.conn.commit()
+        self.appointments_rev += 1
+        return rule_id
+
+    def delete_appointment_rule(self, rule_id):
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM appointment_rules WHERE id=?", (rule_id,))
+        self.conn.commit()
+        self.appointments_rev += 1
+
+    def set_occurrence_exception(self, rule_id, date, cancelled=True, time=None, notes=None):
+        """Annuleer of verzet één herhaling van een reeks (date = oorspronkelijke datum)."""
+        cur = self.conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO appointment_exceptions(rule_id,date,cancelled,time,notes) VALUES(?,?,?,?,?)
+            ON CONFLICT(rule_id,date) DO UPDATE SET cancelled=excluded.cancelled, time=excluded.time, notes=excluded.notes
+            """,
+            (rule_id, date, 1 if cancelled else 0, time, notes),
+        )
+        self.conn.commit()
+        self.appointments_rev += 1
 
     def delete_appointment(self, aid):
         cur = self.conn.cursor()
         cur.execute("DELETE FROM appointments WHERE id=?", (aid,))
         self.conn.commit()
+        self.appointments_rev += 1
+
+    def checkout_day(self, day: dt.date) -> dict:
+        """Rekent alle nog niet afgerekende afspraken van `day` met geplande manipulaties af:
+        één reçu per afspraak (huidige prijzen), in één transactie, met het reçu-id op de
+        afspraak of op de uitzondering van die herhaling.
+        Geeft {'receipts': [(id, nummer, totaal)], 'skipped': afspraken zonder manipulaties}."""
+        d = day.isoformat()
+        cur = self.conn.cursor()
+        cur.execute("SELECT id, client_id, time FROM appointments WHERE date=? AND receipt_id IS NULL", (d,))
+        todo = [(("appointment_id", r['id']), r['client_id'], r['time']) for r in cur.fetchall()]
+        todo += [(("rule_id", o['rule_id']), o['client_id'], o['time'])
+                 for o in self._expand_rules_in_range(day, day) if not o['receipt_id']]
+        todo.sort(key=lambda t: t[2] or "")
+        planned = {}
+        for col in ("appointment_id", "rule_id"):
+            ids = [ref for (c, ref), _cid, _time in todo if c == col]
+            if not ids:
+                continue
+            cur.execute(
+                f"""
+                SELECT ai.{col}, ai.manipulation_id, ai.qty, m.price_cents FROM appointment_items ai
+                JOIN manipulations m ON m.id=ai.manipulation_id
+                WHERE ai.{col} IN ({','.join('?' * len(ids))}) ORDER BY ai.id
+                """, ids)
+            for ref, mid, qty, price in cur.fetchall():
+                planned.setdefault((col, ref), []).append((mid, qty, price))
+        out = {"receipts": [], "skipped": 0}
+        try:
+            for key, client_id, time in todo:
+                items = planned.get(key)
+                if not items:
+                    out["skipped"] += 1
+                    continue
+                rid, number, total = self._insert_receipt(cur, client_id, items, d, time)
+                if key[0] == "appointment_id":
+                    cur.execute("UPDATE appointments SET receipt_id=? WHERE id=?", (rid, key[1]))
+                else:
+                    cur.execute(
+                        """
+                        INSERT INTO appointment_exceptions(rule_id,date,cancelled,receipt_id) VALUES(?,?,0,?)
+                        ON CONFLICT(rule_id,date) DO UPDATE SET receipt_id=excluded.receipt_id
+                        """, (key[1], d, rid))
+                out["receipts"].append((rid, number, total))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.appointments_rev += 1
+        return out
+
+    def reminders_due(self, day: dt.date) -> list[dict]:
+        """Afspraken op `day` (ook herhalingen) van cliënten met een e-mailadres die nog
+        geen herinnering kregen."""
+        d = day.isoformat()
+        cur = self.conn.cursor()
+        cur.execute("SELECT ref FROM appointment_reminders WHERE date=?", (d,))
+        sent = {r[0] for r in cur.fetchall()}
+        clients = {c['id']: c for c in self.list_clients()}
+        out = []
+        for a in self.list_appointments_in_range(day, day):
+            client = clients.get(a['client_id'])
+            if str(a['id']) in sent or client is None or not client['email']:
+                continue
+            out.append({"ref": str(a['id']), "date": d, "time": a['time'], "name": client['name'],
+                        "email": client['email'], "lang": client['lang']})
+        return out
+
+    def mark_reminded(self, refs, day: dt.date):
+        now = dt.datetime.now().isoformat(timespec="seconds")
+        cur = self.conn.cursor()
+        cur.executemany("INSERT OR IGNORE INTO appointment_reminders(ref,date,sent_at) VALUES(?,?,?)",
+                        [(ref, day.isoformat(), now) for ref in refs])
+        self.conn.commit()
 
     # Receipts
     def create_receipt(self, client_id, items: list[tuple[int,int,int]]):
         """items: list of (manipulation_id, qty, price_cents)"""
-        cur = self.conn.cursor()
-        today = dt.date.today().isoformat()
-        cur.execute("SELECT COUNT(*) FROM receipts WHERE date=?", (today,))
+        now = dt.datetime.now()
+        rid, number, total = self._insert_receipt(self.conn.cursor(), client_id, items, now.date().isoformat(), now.strftime("%H:%M"))
+        self.conn.commit()
+        return rid, number, total
+
+    def _insert_receipt(self, cur, client_id, items: list[tuple[int,int,int]], day: str, time: str | None):
+        """Reçu met lijnen en btw-snapshot, zonder commit; nummer JJJJMMDD-NNNN per dag."""
+        cur.execute("SELECT COUNT(*) FROM receipts WHERE date=?", (day,))
         count = cur.fetchone()[0] + 1
-        number = f"{today.replace('-','')}-{count:04d}"
+        number = f"{day.replace('-','')}-{count:04d}"
         total = sum(qty * price for _mid, qty, price in items)
-        cur.execute("INSERT INTO receipts(number,client_id,date,total_cents) VALUES(?,?,?,?)", (number, client_id, today, total))
+        vat_rate = self.get_vat_rate()
+        net, vat = split_vat(total, vat_rate)
+        cur.execute(
+            "INSERT INTO receipts(number,client_id,date,time,total_cents,vat_rate,net_cents,vat_cents) VALUES(?,?,?,?,?,?,?,?)",
+            (number, client_id, day, time, total, vat_rate, net, vat),
+        )
         rid = cur.lastrowid
-        for mid, qty, price in items:
-            cur.execute("INSERT INTO receipt_items(receipt_id, manipulation_id, qty, price_cents) VALUES(?,?,?,?)", (rid, mid, qty, price))
-        self.conn.commit()
+        mids = sorted({mid for mid, _qty, _price in items})
+        cur.execute(f"SELECT id, name FROM manipulations WHERE id IN ({','.join('?' * len(mids))})", mids)
+        names = dict(cur.fetchall())
+        parts = split_vat_lines([qty * price for _mid, qty, price in items], vat_rate)
+        for (mid, qty, price), (line_net, line_vat) in zip(items, parts):
+            cur.execute(
+                "INSERT INTO receipt_items(receipt_id, manipulation_id, qty, price_cents, vat_rate, net_cents, vat_cents, name, date) VALUES(?,?,?,?,?,?,?,?,?)",
+                (rid, mid, qty, price, vat_rate, line_net, line_vat, names.get(mid), day),
+            )
         return rid, number, total
 
+    @cached_query
     def get_receipt(self, rid):
         cur = self.conn.cursor()
-        cur.execute("SELECT * FROM receipts WHERE id=?", (rid,))
+        db = self._receipt_schema(rid)
+        cur.row_factory = ReceiptRecord
+        cur.execute(f"SELECT * FROM {db}.receipts WHERE id=?", (rid,))
         r = cur.fetchone()
+        cur.row_factory = ItemRecord
+        cur.execute(f"SELECT * FROM {db}.receipt_items WHERE receipt_id=? ORDER BY id", (rid,))
+        items = cur.fetchall()
+        return r, items
+
+    def update_receipt_pdf(self, rid, path):
+        cur = self.conn.cursor()
+        cur.execute(f"UPDATE {self._receipt_schema(rid)}.receipts SET pdf_path=? WHERE id=?", (path, rid))
+        self.conn.commit()
+
+    def receipts_with_flat_pdf(self, after_id: int, limit: int = 500):
+        """(id, date, pdf_path) van reçus waarvan de PDF nog niet in de jaar/maand-indeling staat."""
+        parts = self._query_ranged(
+            f"""
+            SELECT id, date, pdf_path FROM {{db}}.receipts
+            WHERE id>? AND pdf_path IS NOT NULL AND pdf_path NOT GLOB '{SHARDED_PDF_GLOB}'
+            ORDER BY id LIMIT ?
+            """,
+            (after_id, limit), dt.date(1, 1, 1), dt.date(9999, 12, 31),
+        )
+        return sorted((r for rows in parts for r in rows), key=lambda r: r['id'])[:limit]
+
+    def set_receipt_pdf_paths(self, pairs: list[tuple[int, str]]):
+        """Zet pdf_path voor een reeks (id, pad) in één transactie."""
+        cur = self.conn.cursor()
+        try:
+            for rid, path in pairs:
+                cur.execute(f"UPDATE {self._receipt_schema(rid)}.receipts SET pdf_path=? WHERE id=?", (path, rid))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    # Maandpakketten met PDF's
+    def unpacked_pdf_receipts(self, before: dt.date):
+        """(id, date, pdf_path) van reçus vóór `before` waarvan de PDF nog los op schijf staat."""
+        parts = self._query_ranged(
+            """
+            SELECT id, date, pdf_path FROM {db}.receipts
+            WHERE date<? AND pdf_path IS NOT NULL
+              AND id NOT IN (SELECT receipt_id FROM main.pdf_pack_index)
+            ORDER BY date, id
+            """,
+            (before.isoformat(),), dt.date(1, 1, 1), before,
+        )
+        return sorted((r for rows in parts for r in rows), key=lambda r: (r['date'], r['id']))
+
+    def get_pdf_pack_entry(self, rid):
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM pdf_pack_index WHERE receipt_id=?", (rid,))
+        return cur.fetchone()
+
+    def add_pdf_pack_entries(self, entries: list[tuple[int, str, int, int]]):
+        """entries: (receipt_id, pack, offset, size)"""
+        cur = self.conn.cursor()
+        cur.executemany("INSERT OR REPLACE INTO pdf_pack_index(receipt_id,pack,offset,size) VALUES(?,?,?,?)", entries)
+        self.conn.commit()
+
+    def list_receipts_in_range(self, start: dt.date, end: dt.date):
+        return self.list_receipts_in_range_by_client(start, end, None)
+
+    @cached_query
+    def list_receipts_in_range_by_client(self, start: dt.date, end: dt.date, client_id: int | None):
+        if client_id:
+            parts = self._query_ranged("SELECT * FROM {db}.receipts WHERE client_id=? AND date>=? AND date<=? ORDER BY date", (client_id, start.isoformat(), end.isoformat()), start, end, ReceiptRecord)
+        else:
+            parts = self._query_ranged("SELECT * FROM {db}.receipts WHERE date>=? AND date<=? ORDER BY date", (start.isoformat(), end.isoformat()), start, end, ReceiptRecord)
+        if len(parts) == 1:
+            return parts[0]
+        return sorted((r for rows in parts for r in rows), key=lambda r: r['date'])
+
+    def iter_receipts_in_range(self, start: dt.date, end: dt.date, client_id: int | None = None,
+                               columns=("id", "number", "date", "client_id", "total_cents", "pdf_path"), batch: int = 5000):
+        """Zoals list_receipts_in_range_by_client, maar als stroom van lijsten met
+        hoogstens `batch` records (enkel `columns`), over archieven en hoofd-db heen
+        gesorteerd op datum. Voor exports van de volledige historiek.
+        Elke batch is een eigen query (verder vanaf de laatste (date, id)) over één
+        jaarsegment: er blijft geen cursor open tussen twee batches en er hoeft nooit
+        meer dan één archief tegelijk gekoppeld te zijn."""
+        columns = tuple(columns) + tuple(c for c in ("id", "date") if c not in columns)
+        cols = ", ".join(columns)
+        where = "date<=?" + (" AND client_id=?" if client_id else "")
+        extra = (client_id,) if client_id else ()
+        # Segmenten: een gearchiveerd jaar (archief + hoofd-db) of wat ertussen ligt (hoofd-db)
+        segments, day = [], start
+        for year in self._archive_years_in(start, end):
+            lo, hi = max(start, dt.date(year, 1, 1)), min(end, dt.date(year, 12, 31))
+            if day < lo:
+                segments.append((day, lo - dt.timedelta(days=1), None))
+            segments.append((lo, hi, year))
+            day = hi + dt.timedelta(days=1)
+        if day <= end:
+            segments.append((day, end, None))
+        cur = self.conn.cursor()
+        cur.row_factory = ReceiptRecord
+        for lo, hi, year in segments:
+            last = ()
+            while True:
+                sources = ([self._attach_archive(year)] if year else []) + ["main"]
+                # Vervolg: enkel (date, id) > laatste, anders begint de indexscan telkens bij lo
+                since = "(date, id) > (?, ?)" if last else "date>=?"
+                sql = " UNION ALL ".join(f"SELECT {cols} FROM {db}.receipts WHERE {since} AND {where}" for db in sources)
+                cur.execute(sql + f" ORDER BY date, id LIMIT {int(batch)}",
+                            ((last or (lo.isoformat(),)) + (hi.isoformat(),) + extra) * len(sources))
+                rows = cur.fetchall()
+                if rows:
+                    yield rows
+                if len(rows) < batch:
+                    break
+                last = (rows[-1]['date'], rows[-1]['id'])
+
+    def iter_receipts_with_items(self, start: dt.date, end: dt.date, client_id: int | None = None, batch: int = 500):
+        """(reçu, lijnen) per reçu in [start, end], op datum. De lijnen van elke batch
+        reçus komen uit één query in plaats van één get_receipt per reçu."""
+        columns = tuple(r[1] for r in self.conn.execute("PRAGMA main.table_info(receipts)"))
+        for rows in self.iter_receipts_in_range(start, end, client_id, columns=columns, batch=batch):
+            ids = [r['id'] for r in rows]
+            sql = f"SELECT * FROM {{db}}.receipt_items WHERE receipt_id IN ({','.join('?' * len(ids))}) ORDER BY receipt_id, id"
+            items = {}
+            # Een batch is op datum gesorteerd: enkel de archieven van haar eigen jaren raken
+            lo, hi = dt.date.fromisoformat(rows[0]['date']), dt.date.fromisoformat(rows[-1]['date'])
+            for part in self._query_ranged(sql, ids, lo, hi, row_factory=ItemRecord):
+                for it in part:
+                    items.setdefault(it['receipt_id'], []).append(it)
+            for r in rows:
+                yield r, items.get(r['id'], [])
+
+    @cached_query
+    def sum_total_in_range(self, start: dt.date, end: dt.date) -> int:
+        months, ranges = self._snapshot_split(start, end)
+        total = sum(row['gross'] for row in self._snapshot_rows(months))
+        for lo, hi in ranges:
+            total += sum(acc['gross'] for acc in self._vat_months(lo, hi).values())
+        return total
+
+    @cached_query
+    def sum_vat_in_range(self, start: dt.date, end: dt.date, client_id: int | None = None) -> dict:
+        """gross/net/vat (cent), n en min_rate/max_rate uit de btw-snapshots."""
+        sql = """
+            SELECT COALESCE(SUM(total_cents),0) as gross, COALESCE(SUM(net_cents),0) as net,
+                   COALESCE(SUM(vat_cents),0) as vat, COUNT(*) as n,
+                   MIN(vat_rate) as min_rate, MAX(vat_rate) as max_rate
+            FROM {db}.receipts WHERE date>=? AND date<=?
+        """
+        out = {'gross': 0, 'net': 0, 'vat': 0, 'n': 0, 'min_rate': None, 'max_rate': None}
+        if client_id:
+            sql += " AND client_id=?"
+            months, ranges = [], [(start, end)]
+        else:
+            months, ranges = self._snapshot_split(start, end)
+        for row in self._snapshot_rows(months):
+            _merge_vat_sums(out, row)
+        for lo, hi in ranges:
+            if not client_id:
+                for acc in self._vat_months(lo, hi).values():
+                    _merge_vat_sums(out, acc)
+                continue
+            # Dagafsluitingen kennen geen cliënten: gefilterd blijft het een scan
+            for rows in self._query_ranged(sql, (lo.isoformat(), hi.isoformat(), client_id), lo, hi):
+                _merge_vat_sums(out, rows[0])
+        return out
+
+    @cached_query
+    def monthly_vat_totals(self, start: dt.date, end: dt.date) -> list[dict]:
+        """Per maand (YYYY-MM): gross/net/vat/n en min_rate/max_rate.
+        Volledige maanden van afgesloten jaren komen uit year_totals, afgesloten dagen
+        uit day_closures."""
+        snapshot, ranges = self._snapshot_split(start, end)
+        parts = [self._snapshot_rows(snapshot)] + [list(self._vat_months(lo, hi).values()) for lo, hi in ranges]
+        months = {}
+        for rows in parts:
+            for row in rows:
+                acc = months.setdefault(row['month'], {'month': row['month'], 'gross': 0, 'net': 0, 'vat': 0, 'n': 0, 'min_rate': None, 'max_rate': None})
+                _merge_vat_sums(acc, row)
+        return [months[m] for m in sorted(months)]
+
+    def _vat_months(self, start: dt.date, end: dt.date) -> dict:
+        """{YYYY-MM: gross/net/vat/n/min_rate/max_rate} over [start, end]: geldige
+        dagafsluitingen tellen mee zoals ze zijn, enkel de rest wordt gescand."""
+        months = {}
+
+        def acc(month):
+            return months.setdefault(month, {'month': month, 'gross': 0, 'net': 0, 'vat': 0, 'n': 0, 'min_rate': None, 'max_rate': None})
+
+        closures, segments = self._closure_segments(start, end)
+        for c in closures:
+            _merge_vat_sums(acc(c['date'][:7]), c)
+        for lo, hi, after in segments:
+            for rows in self._query_ranged(
+                """
+                SELECT substr(date,1,7) as month, SUM(total_cents) as gross, SUM(net_cents) as net,
+                       SUM(vat_cents) as vat, COUNT(*) as n,
+                       MIN(vat_rate) as min_rate, MAX(vat_rate) as max_rate
+                FROM {db}.receipts WHERE date>=? AND date<=? AND id>?
+                GROUP BY month
+                """,
+                (lo.isoformat(), hi.isoformat(), after), lo, hi,
+            ):
+                for row in rows:
+                    _merge_vat_sums(acc(row['month']), row)
+        return months
+
+    @cached_query
+    def sum_by_manipulations_in_range(self, start: dt.date, end: dt.date, client_id: int | None):
+        # Naam en datum staan op receipt_items zelf: zonder cliëntfilter volstaat
+        # één scan over idx_receipt_items_date_name.
+        if client_id:
+            parts = self._query_ranged(
+                """
+                SELECT ri.name, COALESCE(SUM(ri.qty*ri.price_cents),0) as cents
+                FROM {db}.receipts r
+                JOIN {db}.receipt_items ri ON ri.receipt_id=r.id
+                WHERE r.client_id=? AND r.date>=? AND r.date<=?
+                GROUP BY ri.name
+                ORDER BY ri.name
+                """,
+                (client_id, start.isoformat(), end.isoformat()), start, end,
+            )
+        else:
+            parts = self._query_ranged(
+                """
+                SELECT name, COALESCE(SUM(qty*price_cents),0) as cents
+                FROM {db}.receipt_items
+                WHERE date>=? AND date<=?
+                GROUP BY name
+                ORDER BY name
+                """,
+                (start.isoformat(), end.isoformat()), start, end,
+            )
+        if len(parts) == 1:
+            return [(row[0], row[1]) for row in parts[0]]
+        sums = {}
+        for rows in parts:
+            for name, cents in rows:
+                sums[name] = sums.get(name, 0) + cents
+        return sorted(sums.items(), key=lambda kv: (kv[0] is None, kv[0] or ""))
+
+    # Import
+    def start_import_job(self, kind: str, source: str, size: int, mtime: float, options: dict) -> tuple[int, int]:
+        """Hervat een onafgewerkte job voor hetzelfde (ongewijzigde) bestand of start een nieuwe.
+        Geeft (job_id, rows_done) terug."""
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT id, rows_done FROM import_jobs WHERE kind=? AND source=? AND size=? AND mtime=? AND options=? AND status='running' ORDER BY id DESC LIMIT 1",
+            (kind, source, size, mtime, json.dumps(options, sort_keys=True)),
+        )
+        row = cur.fetchone()
+        if row:
+            return row[0], row[1]
+        now = dt.datetime.now().isoformat(timespec="seconds")
         cur.execute(
+            "INSERT INTO import_jobs(kind,source,size,mtime,options,started_at,updated_at) VALUES(?,?,?,?,?,?,?)",
+            (kind, source, size, mtime, json.dumps(options, sort_keys=True), now, now),
+        )
+        self.conn.commit()
+        return cur.lastrowid, 0
+
+    def finish_import_job(self, job_id: int, stats: dict):
+        self.conn.execute("UPDATE import_jobs SET status='done', stats=?, updated_at=? WHERE id=?",
+                          (json.dumps(stats), dt.datetime.now().isoformat(timespec="seconds"), job_id))
+        self.conn.commit()
+
+    def import_receipt_chunk(self, job_id: int, rows_done: int, receipts: list[dict], keep_numbers: bool = True) -> dict:
+        """Schrijft geïmporteerde reçus met hun lijnen en de jobvoortgang in één transactie.
+        receipt: {line, number, date, time, client_id, client_name, vat_rate, pdf_path,
+                  items: [(manipulation_id, name, qty, price_cents)]}
+        client_name zonder client_id maakt de cliënt aan. Bij keep_numbers worden reçus met
+        een bestaand nummer overgeslagen; anders (of zonder nummer) volgt JJJJMMDD-NNNN.
+        Reçus in een afgesloten jaar worden overgeslagen (closed)."""
+        cur = self.conn.cursor()
+        closed_years = set(self.closed_years())
+        closed = [r["line"] for r in receipts if int(r["date"][:4]) in closed_years]
+        receipts = [r for r in receipts if int(r["date"][:4]) not in closed_years]
+        if not receipts:
+            cur.execute("UPDATE import_jobs SET rows_done=?, updated_at=? WHERE id=?",
+                        (rows_done, dt.datetime.now().isoformat(timespec="seconds"), job_id))
+            self.conn.commit()
+            return {"inserted": 0, "duplicates": [], "closed": closed, "clients": {}}
+        dates = sorted(r["date"] for r in receipts)
+        start, end = dt.date.fromisoformat(dates[0]), dt.date.fromisoformat(dates[-1])
+        taken = set()
+        if keep_numbers:
+            numbers = [r["number"] for r in receipts if r["number"]]
+            for k in range(0, len(numbers), 500):
+                part = numbers[k:k+500]
+                sql = f"SELECT number FROM {{db}}.receipts WHERE number IN ({','.join('?' * len(part))})"
+                for rows in self._query_ranged(sql, part, start, end):
+                    taken.update(r[0] for r in rows)
+        # Dagtellers vooraf: een archief koppelen commit, dus niet meer na de eerste INSERT
+        day_count = {}
+        days = sorted({r["date"] for r in receipts if not (keep_numbers and r["number"])})
+        for k in range(0, len(days), 500):
+            part = days[k:k+500]
+            sql = f"SELECT date, COUNT(*) FROM {{db}}.receipts WHERE date IN ({','.join('?' * len(part))}) GROUP BY date"
+            for rows in self._query_ranged(sql, part, dt.date.fromisoformat(part[0]), dt.date.fromisoformat(part[-1])):
+                for day, n in rows:
+                    day_count[day] = day_count.get(day, 0) + n
+        created, duplicates, inserted = {}, [], 0
+        try:
+            for r in receipts:
+                number = r["number"] if keep_numbers else None
+                if number and number in taken:
+                    duplicates.append(r["line"])
+                    continue
+                if not number:
+                    day_count.setdefault(r["date"], 0)
+                    while True:
+                        day_count[r["date"]] += 1
+                        number = f"{r['date'].replace('-', '')}-{day_count[r['date']]:04d}"
+                        if number not in taken:
+                            break
+                taken.add(number)
+                client_id = r["client_id"]
+                if client_id is None and r["client_name"]:
+                    key = r["client_name"].strip().lower()
+                    client_id = created.get(key)
+                    if client_id is None:
+                        cur.execute("INSERT INTO clients(name) VALUES(?)", (r["client_name"].strip(),))
+                        client_id = created[key] = cur.lastrowid
+                lines = [qty * price for _mid, _name, qty, price in r["items"]]
+                total = sum(lines)
+                net, vat = split_vat(total, r["vat_rate"])
+                cur.execute(
+                    "INSERT INTO receipts(number,client_id,date,time,total_cents,pdf_path,vat_rate,net_cents,vat_cents) VALUES(?,?,?,?,?,?,?,?,?)",
+                    (number, client_id, r["date"], r["time"], total, r["pdf_path"], r["vat_rate"], net, vat),
+                )
+                rid = cur.lastrowid
+                parts = split_vat_lines(lines, r["vat_rate"])
+                cur.executemany(
+                    "INSERT INTO receipt_items(receipt_id, manipulation_id, qty, price_cents, vat_rate, net_cents, vat_cents, name, date) VALUES(?,?,?,?,?,?,?,?,?)",
+                    [(rid, mid, qty, price, r["vat_rate"], ln, lv, name, r["date"])
+                     for (mid, name, qty, price), (ln, lv) in zip(r["items"], parts)],
+                )
+                inserted += 1
+            cur.execute("UPDATE import_jobs SET rows_done=?, updated_at=? WHERE id=?",
+                        (rows_done, dt.datetime.now().isoformat(timespec="seconds"), job_id))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return {"inserted": inserted, "duplicates": duplicates, "closed": closed, "clients": created}
+
+    # Analyse
+    def analytics_rows(self, after_id: int = 0) -> list[list]:
+        """Reçulijnen (receipt_id, date, time, client_id, manipulation_id, qty, cents) met
+        receipt_id > after_id, per bron. after_id=0 leest ook alle jaararchieven."""
+        sql = """
+            SELECT r.id, r.date, r.time, r.client_id, ri.manipulation_id, ri.qty, ri.qty*ri.price_cents
+            FROM {db}.receipts r
+            JOIN {db}.receipt_items ri ON ri.receipt_id=r.id
+            WHERE r.id>?
+            ORDER BY r.id
+        """
+        if after_id:
+            parts = [self.conn.execute(sql.format(db="main"), (after_id,)).fetchall()]
+        else:
+            parts = self._query_ranged(sql, (0,), dt.date.min, dt.date.max)
+        return [[tuple(r) for r in rows] for rows in parts]  # tuples: ook over RemoteStore
+
+    def receipt_fingerprint(self, upto_id: int) -> tuple[int, int]:
+        """(aantal, som) van de reçus in de hoofd-db tot en met id upto_id."""
+        cur = self.conn.cursor()
+        cur.execute("SELECT COUNT(*), COALESCE(SUM(total_cents),0) FROM receipts WHERE id<=?", (upto_id,))
+        n, cents = cur.fetchone()
+        return n, cents
+
+    # Dagafsluiting
+    def close_day(self, day: dt.date) -> dict:
+        """Z-afsluiting van `day`. Alleen reçus van die dag met een id boven last_id van
+        de vorige afsluiting worden gelezen en bij de bestaande totalen opgeteld; is die
+        afsluiting verouderd (stale), dan wordt de hele dag opnieuw geteld."""
+        if day > dt.date.today():
+            raise ValueError(f"{day} ligt in de toekomst")
+        d = day.isoformat()
+        cur = self.conn.cursor()
+        prev = cur.execute("SELECT * FROM day_closures WHERE date=?", (d,)).fetchone()
+        acc = {'gross': 0, 'net': 0, 'vat': 0, 'n': 0, 'min_rate': None, 'max_rate': None}
+        manips, last_id = {}, 0
+        if prev and not prev['stale']:
+            _merge_vat_sums(acc, prev)
+            manips = {name: [qty, cents] for name, qty, cents in json.loads(prev['manipulations'] or "[]")}
+            last_id = prev['last_id']
+        new_last, before = last_id, acc['n']
+        sql = """
+            SELECT COALESCE(SUM(total_cents),0) as gross, COALESCE(SUM(net_cents),0) as net,
+                   COALESCE(SUM(vat_cents),0) as vat, COUNT(*) as n,
+                   MIN(vat_rate) as min_rate, MAX(vat_rate) as max_rate, MAX(id) as last_id
+            FROM {db}.receipts WHERE date=? AND id>?
+        """
+        for rows in self._query_ranged(sql, (d, last_id), day, day):
+            _merge_vat_sums(acc, rows[0])
+            new_last = max(new_last, rows[0]['last_id'] or 0)
+        if new_last > last_id:
+            sql = """
+                SELECT name, COALESCE(SUM(qty),0), COALESCE(SUM(qty*price_cents),0) FROM {db}.receipt_items
+                WHERE date=? AND receipt_id>? AND receipt_id<=? GROUP BY name
             """
-            SELECT ri.*, m.name FROM receipt_items ri
-            LEFT JOIN manipulations m ON m.id=ri.manipulation_id
-            WHERE ri.receipt_id=?
+            for rows in self._query_ranged(sql, (d, last_id, new_last), day, day):
+                for name, qty, cents in rows:
+                    m = manips.setdefault(name, [0, 0])
+                    m[0] += qty; m[1] += cents
+        lines = sorted(([name, qty, cents] for name, (qty, cents) in manips.items()), key=lambda m: (m[0] is None, m[0] or ""))
+        now = dt.datetime.now().isoformat(timespec="seconds")
+        cur.execute(
+            """
+            INSERT INTO day_closures(date,last_id,n,gross,net,vat,min_rate,max_rate,manipulations,runs,closed_at)
+            VALUES(?,?,?,?,?,?,?,?,?,1,?)
+            ON CONFLICT(date) DO UPDATE SET last_id=excluded.last_id, n=excluded.n, gross=excluded.gross,
+                net=excluded.net, vat=excluded.vat, min_rate=excluded.min_rate, max_rate=excluded.max_rate,
+                manipulations=excluded.manipulations, runs=runs+1, closed_at=excluded.closed_at, stale=0
             """,
-            (rid,),
+            (d, new_last, acc['n'], acc['gross'], acc['net'], acc['vat'], acc['min_rate'], acc['max_rate'], json.dumps(lines), now),
         )
-        items = cur.fetchall()
-        return r, items
+        self.conn.commit()
+        runs = prev['runs'] + 1 if prev else 1
+        return dict(acc, date=d, last_id=new_last, manipulations=lines, added=acc['n'] - before, runs=runs, closed_at=now)
 
-    def update_receipt_pdf(self, rid, path):
+    @cached_query
+    def day_closures_in_range(self, start: dt.date, end: dt.date) -> list[dict]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM day_closures WHERE date>=? AND date<=? ORDER BY date", (start.isoformat(), end.isoformat()))
+        return [dict(row, manipulations=json.loads(row['manipulations'] or "[]")) for row in cur.fetchall()]
+
+    def _closure_segments(self, start: dt.date, end: dt.date):
+        """(geldige dagafsluitingen, stukken (van, tot, na_id) die nog gescand moeten worden):
+        dagen zonder afsluiting en reçus van na de laatste afsluiting van hun dag."""
+        closures = [c for c in self.day_closures_in_range(start, end) if not c['stale']]  # stale: live tellen
+        if not closures:
+            return [], [(start, end, 0)]
+        closed = {c['date']: c['last_id'] for c in closures}
+        # Hoogste id per dag komt uit idx_receipts_date, zonder de reçus zelf te lezen
+        last = {}
+        for rows in self._query_ranged("SELECT date, MAX(id) FROM {db}.receipts WHERE date>=? AND date<=? GROUP BY date",
+                                       (start.isoformat(), end.isoformat()), start, end):
+            for d, max_id in rows:
+                last[d] = max(last.get(d, 0), max_id)
+        segments = []  # aaneengesloten dagen zonder afsluiting delen één scan
+        for d in sorted(last):
+            after = closed.get(d, 0)
+            if last[d] <= after:
+                continue
+            day = dt.date.fromisoformat(d)
+            if after == 0 and segments and segments[-1][2] == 0 and segments[-1][1] + dt.timedelta(days=1) == day:
+                segments[-1] = (segments[-1][0], day, 0)
+            else:
+                segments.append((day, day, after))
+        return closures, segments
+
+    @cached_query
+    def period_totals(self, start: dt.date, end: dt.date) -> dict:
+        """gross/net/vat/n/min_rate/max_rate en manipulations [(naam, cent)] over [start, end],
+        samengesteld uit de dagafsluitingen. Alleen dagen zonder (geldige) afsluiting en
+        reçus van na de laatste afsluiting van hun dag worden nog gescand."""
+        out = {'gross': 0, 'net': 0, 'vat': 0, 'n': 0, 'min_rate': None, 'max_rate': None}
+        manips = {}
+        closures, segments = self._closure_segments(start, end)
+        for c in closures:
+            _merge_vat_sums(out, c)
+            for name, _qty, cents in c['manipulations']:
+                manips[name] = manips.get(name, 0) + cents
+        for lo, hi, after in segments:
+            params = (lo.isoformat(), hi.isoformat(), after)
+            for rows in self._query_ranged(
+                """
+                SELECT COALESCE(SUM(total_cents),0) as gross, COALESCE(SUM(net_cents),0) as net,
+                       COALESCE(SUM(vat_cents),0) as vat, COUNT(*) as n,
+                       MIN(vat_rate) as min_rate, MAX(vat_rate) as max_rate
+                FROM {db}.receipts WHERE date>=? AND date<=? AND id>?
+                """, params, lo, hi):
+                _merge_vat_sums(out, rows[0])
+            for rows in self._query_ranged(
+                "SELECT name, COALESCE(SUM(qty*price_cents),0) FROM {db}.receipt_items WHERE date>=? AND date<=? AND receipt_id>? GROUP BY name",
+                params, lo, hi):
+                for name, cents in rows:
+                    manips[name] = manips.get(name, 0) + cents
+        out['manipulations'] = sorted(manips.items(), key=lambda kv: (kv[0] is None, kv[0] or ""))
+        return out
+
+    def monthly_totals_by_year(self, years) -> list[dict]:
+        """[{year, month (1-12), gross, net, vat, n}] voor de gevraagde jaren. Afgesloten jaren
+        komen uit year_totals; aaneengesloten jaren in de hoofd-db delen één gegroepeerde query;
+        jaararchieven worden parallel gelezen, elk met een eigen alleen-lezen verbinding."""
+        from concurrent.futures import ThreadPoolExecutor
+        years = sorted({int(y) for y in years})
+        closed = set(self.closed_years())
+        archived = set(self._archive_years_cached())
+        totals = {}
+
+        def add(month, gross, net, vat, n):
+            acc = totals.setdefault((int(month[:4]), int(month[5:7])), {'gross': 0, 'net': 0, 'vat': 0, 'n': 0})
+            acc['gross'] += gross or 0; acc['net'] += net or 0; acc['vat'] += vat or 0; acc['n'] += n or 0
+
+        if closed & set(years):
+            cur = self.conn.cursor()
+            cur.execute("SELECT month, gross, net, vat, n FROM year_totals WHERE month>=? AND month<=?",
+                        (f"{years[0]:04d}-01", f"{years[-1]:04d}-12"))
+            for row in cur.fetchall():
+                if int(row[0][:4]) in years:
+                    add(*row)
+        open_years = [y for y in years if y not in closed]
+        sql = """
+            SELECT substr(date,1,7) as month, SUM(total_cents), SUM(net_cents), SUM(vat_cents), COUNT(*)
+            FROM receipts {hint} WHERE date>=? AND date<=? GROUP BY month
+        """
+        runs = []
+        for y in open_years:
+            if runs and runs[-1][1] == y - 1:
+                runs[-1][1] = y
+            else:
+                runs.append([y, y])
+        for lo, hi in runs:
+            # idx_receipts_date_totals dekt de query: alleen de index wordt gelezen
+            for row in self.conn.execute(sql.format(hint=""), (f"{lo:04d}-01-01", f"{hi:04d}-12-31")):
+                add(*row)
+
+        def scan_archive(year):
+            path = self.archive_dir / f"pedicure_{year}.db"
+            conn = sqlite3.connect(path.as_uri() + "?mode=ro", uri=True)
+            try:
+                # Een archief bevat alleen dit jaar: gewoon de hele tabel lezen
+                return conn.execute(sql.format(hint="NOT INDEXED"), (f"{year:04d}-01-01", f"{year:04d}-12-31")).fetchall()
+            finally:
+                conn.close()
+
+        todo = [y for y in open_years if y in archived and (self.archive_dir / f"pedicure_{y}.db").exists()]
+        if todo:
+            with ThreadPoolExecutor(max_workers=min(4, len(todo)), thread_name_prefix="archive-scan") as pool:
+                for rows in pool.map(scan_archive, todo):
+                    for row in rows:
+                        add(*row)
+        return [dict(v, year=y, month=m) for (y, m), v in sorted(totals.items())]
+
+    # Jaarafsluiting
+    @cached_query
+    def closed_years(self) -> list[int]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT year FROM closed_years ORDER BY year")
+        return [row[0] for row in cur.fetchall()]
+
+    def close_year(self, year: int) -> dict:
+        """Berekent de maandtotalen van `year` één keer en legt ze vast in year_totals.
+        Daarna weigeren triggers elke wijziging aan reçus van dat jaar."""
+        if year >= dt.date.today().year:
+            raise ValueError(f"{year} is nog geen afgesloten jaar")
+        if year in self.closed_years():
+            raise ValueError(f"{year} is al afgesloten")
+        months = self.monthly_vat_totals(dt.date(year, 1, 1), dt.date(year, 12, 31))
+        cur = self.conn.cursor()
+        try:
+            cur.executemany(
+                "INSERT INTO year_totals(month,gross,net,vat,n,min_rate,max_rate) VALUES(?,?,?,?,?,?,?)",
+                [(m['month'], m['gross'], m['net'], m['vat'], m['n'], m['min_rate'], m['max_rate']) for m in months],
+            )
+            cur.execute("INSERT INTO closed_years(year,closed_at) VALUES(?,?)",
+                        (year, dt.datetime.now().isoformat(timespec="seconds")))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        out = {'year': year, 'gross': 0, 'net': 0, 'vat': 0, 'n': 0, 'min_rate': None, 'max_rate': None}
+        for m in months:
+            _merge_vat_sums(out, m)
+        return out
+
+    def _snapshot_split(self, start: dt.date, end: dt.date) -> tuple[list[str], list[tuple[dt.date, dt.date]]]:
+        """Splitst [start, end] in volledige maanden van afgesloten jaren (uit year_totals)
+        en de datumbereiken die nog over de reçus gescand moeten worden."""
+        closed = [y for y in self.closed_years() if start.year <= y <= end.year]
+        if not closed:
+            return [], [(start, end)]
+        months, ranges = [], []
+
+        def scan(lo, hi):
+            if ranges and ranges[-1][1] + dt.timedelta(days=1) == lo:
+                ranges[-1] = (ranges[-1][0], hi)
+            else:
+                ranges.append((lo, hi))
+
+        d = start
+        while d <= end:
+            if d.year not in closed:
+                hi = min(end, dt.date(d.year, 12, 31))
+                scan(d, hi)
+                d = hi + dt.timedelta(days=1)
+                continue
+            m_start, m_end = month_bounds(d)
+            if d == m_start and m_end <= end:
+                months.append(d.strftime("%Y-%m"))
+            else:
+                scan(d, min(end, m_end))
+            d = m_end + dt.timedelta(days=1)
+        return months, ranges
+
+    def _snapshot_rows(self, months: list[str]) -> list:
+        if not months:
+            return []
         cur = self.conn.cursor()
-        cur.execute("UPDATE receipts SET pdf_path=? WHERE id=?", (path, rid))
+        cur.execute("SELECT * FROM year_totals WHERE month>=? AND month<=? ORDER BY month", (months[0], months[-1]))
+        wanted = set(months)
+        return [row for row in cur.fetchall() if row['month'] in wanted]
+
+    # Jaararchieven
+    def archived_years(self) -> list[int]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT year FROM archives ORDER BY year")
+        return [row[0] for row in cur.fetchall()]
+
+    def _query_ranged(self, sql, params, start: dt.date, end: dt.date, row_factory=None) -> list[list]:
+        """Voert `sql` (met {db} als schema) uit op de hoofd-db en op elk jaararchief
+        dat [start, end] raakt. Geeft per bron de rijen terug; archieven eerst."""
+        cur = self.conn.cursor()
+        if row_factory:
+            cur.row_factory = row_factory
+        parts = []
+        # Telkens vlak voor de query koppelen: bij meer dan MAX_ATTACHED_ARCHIVES jaren
+        # zou een later jaar een eerder anders al loskoppelen.
+        for year in self._archive_years_in(start, end):
+            cur.execute(sql.format(db=self._attach_archive(year)), params)
+            parts.append(cur.fetchall())
+        cur.execute(sql.format(db="main"), params)
+        parts.append(cur.fetchall())
+        return parts
+
+    def _archive_years_in(self, start: dt.date, end: dt.date) -> list[int]:
+        return [y for y in self._archive_years_cached() if start.year <= y <= end.year]
+
+    def _archive_years_cached(self) -> list[int]:
+        if self._archive_years is None:
+            self._archive_years = self.archived_years()
+        return self._archive_years
+
+    def _receipt_schema(self, rid) -> str:
+        """Schema waarin reçu `rid` zit: 'main' of het jaararchief."""
+        cur = self.conn.cursor()
+        cur.execute("SELECT 1 FROM main.receipts WHERE id=?", (rid,))
+        if cur.fetchone() or not self._archive_years_cached():
+            return "main"
+        for year in reversed(self._archive_years_cached()):
+            db = self._attach_archive(year)
+            cur.execute(f"SELECT 1 FROM {db}.receipts WHERE id=?", (rid,))
+            if cur.fetchone():
+                return db
+        return "main"
+
+    def _attach_archive(self, year: int) -> str:
+        """Koppelt het jaararchief (ATTACH) indien nodig en geeft de schemanaam terug."""
+        db = f"arch_{year}"
+        if db in self._attached:
+            self._attached.move_to_end(db)
+            return db
+        while len(self._attached) >= MAX_ATTACHED_ARCHIVES:
+            old, _ = self._attached.popitem(last=False)
+            self.conn.execute(f"DETACH DATABASE {old}")
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self.conn.execute(f"ATTACH DATABASE ? AS {db}", (str(self.archive_dir / f"pedicure_{year}.db"),))
+        self._attached[db] = year
+        for table in ARCHIVED_TABLES:
+            self._sync_archive_table(db, table)
         self.conn.commit()
+        return db
+
+    def _sync_archive_table(self, db, table) -> list[str]:
+        """Zorgt dat {db}.{table} dezelfde kolommen heeft als main.{table}."""
+        main_cols = [(r[1], r[2]) for r in self.conn.execute(f"PRAGMA main.table_info({table})")]
+        have = {r[1] for r in self.conn.execute(f"PRAGMA {db}.table_info({table})")}
+        if not have:
+            self.conn.execute(f"CREATE TABLE {db}.{table} AS SELECT * FROM main.{table} WHERE 0")
+            for name, cols in ARCHIVE_INDEXES.get(table, ()):
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {db}.{name} ON {table}({cols})")
+        else:
+            for name, decl in main_cols:
+                if name not in have:
+                    self.conn.execute(f"ALTER TABLE {db}.{table} ADD COLUMN {name} {decl}")
+        return [name for name, _decl in main_cols]
+
+    def archive_year(self, year: int, vacuum: bool = True) -> Path:
+        """Verplaatst reçus, reçulijnen en afspraken van een afgesloten jaar naar
+        archive/pedicure_<jaar>.db. Range-queries koppelen dat bestand daarna zelf."""
+        if year >= dt.date.today().year:
+            raise ValueError(f"{year} is nog geen afgesloten jaar")
+        db = self._attach_archive(year)
+        lo, hi = f"{year:04d}-01-01", f"{year:04d}-12-31"
+        selections = (
+            ("receipts", "date>=? AND date<=?"),
+            ("receipt_items", "receipt_id IN (SELECT id FROM main.receipts WHERE date>=? AND date<=?)"),
+            ("appointments", "date>=? AND date<=?"),
+        )
+        cur = self.conn.cursor()
+        try:
+            # Archiveren is geen verwijdering: niet naar andere installaties doorgeven,
+            # en ook in een afgesloten jaar toegestaan
+            cur.execute("INSERT OR IGNORE INTO store_flags(name) VALUES('sync_suppress'), ('year_move')")
+            for table, where in selections:
+                cols = ",".join(self._sync_archive_table(db, table))
+                cur.execute(f"INSERT INTO {db}.{table}({cols}) SELECT {cols} FROM main.{table} WHERE {where}", (lo, hi))
+            for table, where in reversed(selections):
+                cur.execute(f"DELETE FROM main.{table} WHERE {where}", (lo, hi))
+            cur.execute(
+                "INSERT INTO archives(year,file,archived_at) VALUES(?,?,?) ON CONFLICT(year) DO UPDATE SET archived_at=excluded.archived_at",
+                (year, f"pedicure_{year}.db", dt.datetime.now().isoformat(timespec="seconds")),
+            )
+            cur.execute("DELETE FROM store_flags WHERE name IN ('sync_suppress', 'year_move')")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self._archive_years = None
+        self.appointments_rev += 1
+        if vacuum:
+            self.conn.execute("VACUUM")
+        return self.archive_dir / f"pedicure_{year}.db"
+
+    # Synchronisatie tussen installaties (winkel <-> laptop)
+    def node_id(self) -> str:
+        nid = self.get_config("sync_node_id")
+        if not nid:
+            nid = os.urandom(8).hex()
+            self.set_config("sync_node_id", nid)
+        return nid
+
+    def last_change_seq(self) -> int:
+        cur = self.conn.cursor()
+        cur.execute("SELECT COALESCE(MAX(seq),0) FROM change_log")
+        return cur.fetchone()[0]
+
+    def export_changes(self, path, since_seq: int | None = None) -> dict:
+        """Schrijft alle wijzigingen na `since_seq` (standaard: sinds de vorige export)
+        als gzip-JSON-lijnen: per rij enkel de laatste toestand of een verwijdering."""
+        import gzip
+        if since_seq is None:
+            since_seq = int(self.get_config("sync_exported_seq", "0") or 0)
+        cur = self.conn.cursor()
+        cur.execute(
+            """
+            SELECT tbl, row_id, uid, op, MAX(seq) as seq, ts FROM change_log
+            WHERE seq>? GROUP BY tbl, row_id ORDER BY seq
+            """,
+            (since_seq,),
+        )
+        latest = cur.fetchall()
+        to_seq = max([r['seq'] for r in latest], default=since_seq)
+        uid_of = {}
+
+        def ref_uid(table, rid):
+            if rid is None:
+                return None
+            if (table, rid) not in uid_of:
+                row = cur.execute(f"SELECT uid FROM {table} WHERE id=?", (rid,)).fetchone()
+                uid_of[(table, rid)] = row[0] if row else None
+            return uid_of[(table, rid)]
+
+        records = []
+        for ch in latest:
+            t = ch['tbl']
+            row = cur.execute(f"SELECT * FROM {t} WHERE id=?", (ch['row_id'],)).fetchone()
+            if row is None or ch['op'] == 'D':
+                if ch['uid']:
+                    records.append({"t": t, "op": "D", "uid": ch['uid'], "ts": ch['ts'], "seq": ch['seq']})
+                continue
+            if t == "appointment_items" and row['appointment_id'] is None:
+                continue    # hoort bij een reeks: die blijft lokaal
+            data = {k: row[k] for k in row.keys() if k not in ("id", "uid")}
+            for col, parent in SYNC_REFS.get(t, {}).items():
+                data[col] = ref_uid(parent, data[col])
+            records.append({"t": t, "op": "U", "uid": row['uid'], "ts": ch['ts'], "seq": ch['seq'], "row": data})
+        # Ouders vóór kinderen bij upserts, kinderen vóór ouders bij verwijderingen
+        order = {t: i for i, t in enumerate(SYNC_TABLES)}
+        records.sort(key=lambda r: (r["op"] == "D", order[r["t"]] if r["op"] == "U" else -order[r["t"]], r["seq"]))
+        header = {"node": self.node_id(), "from_seq": since_seq, "to_seq": to_seq, "count": len(records)}
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            for rec in records:
+                f.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.set_config("sync_exported_seq", str(to_seq))
+        return header
+
+    def import_changes(self, path) -> dict:
+        """Past een delta van een andere installatie toe in één transactie.
+        Conflictregels: de recentste wijziging wint (lokale change_log-tijd vs. delta-tijd);
+        een reçunummer dat hier al door een ander reçu gebruikt wordt krijgt het
+        knooppunt als achtervoegsel. Reeds geïmporteerde sequenties worden overgeslagen."""
+        import gzip
+        stats = {"applied": 0, "skipped": 0, "conflicts": 0, "renumbered": 0, "deleted": 0, "closed": 0}
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            records = [json.loads(line) for line in f if line.strip()]
+        node = header["node"]
+        if node == self.node_id():
+            raise ValueError("Deze delta komt van deze installatie zelf")
+        cur = self.conn.cursor()
+        cur.execute("SELECT last_imported_seq FROM sync_peers WHERE node_id=?", (node,))
+        row = cur.fetchone()
+        done_seq = row[0] if row else 0
+        local_cols = {t: [r[1] for r in self.conn.execute(f"PRAGMA table_info({t})")] for t in SYNC_TABLES}
+        closed_years = set(self.closed_years())
+
+        def local_id(table, uid):
+            if uid is None:
+                return None
+            r = cur.execute(f"SELECT id FROM {table} WHERE uid=?", (uid,)).fetchone()
+            return r[0] if r else None
+
+        def local_is_newer(uid, ts):
+            r = cur.execute("SELECT MAX(ts) FROM change_log WHERE uid=?", (uid,)).fetchone()
+            return r[0] is not None and r[0] > ts
+
+        def in_closed_year(table, lid, row):
+            # Reçus van een afgesloten jaar liggen vast, ook voor andere installaties
+            if table not in LOCKED_COLUMNS or not closed_years:
+                return False
+            dates = [(row or {}).get("date")]
+            if lid is not None:
+                dates.append(cur.execute(f"SELECT date FROM {table} WHERE id=?", (lid,)).fetchone()[0])
+            return any(d and int(d[:4]) in closed_years for d in dates)
+
+        try:
+            cur.execute("INSERT OR IGNORE INTO store_flags(name) VALUES('sync_suppress')")
+            for rec in records:
+                if rec["seq"] <= done_seq:
+                    stats["skipped"] += 1
+                    continue
+                t, uid = rec["t"], rec["uid"]
+                lid = local_id(t, uid)
+                if lid is not None and local_is_newer(uid, rec["ts"]):
+                    stats["conflicts"] += 1
+                    continue
+                if in_closed_year(t, lid, rec.get("row")):
+                    stats["closed"] += 1
+                    continue
+                if rec["op"] == "D":
+                    if lid is not None:
+                        cur.execute(f"DELETE FROM {t} WHERE id=?", (lid,))
+                        stats["deleted"] += 1
+                    continue
+                data = dict(rec["row"])
+                for col, parent in SYNC_REFS.get(t, {}).items():
+                    data[col] = local_id(parent, data.get(col))
+                if (t == "receipt_items" and data.get("receipt_id") is None) or \
+                        (t == "appointment_items" and data.get("appointment_id") is None):
+                    stats["skipped"] += 1
+                    continue
+                if t == "receipts" and data.get("number"):
+                    clash = cur.execute("SELECT uid FROM receipts WHERE number=?", (data["number"],)).fetchone()
+                    if clash and clash[0] != uid:
+                        data["number"] = f"{data['number']}-{node[:4]}"
+                        stats["renumbered"] += 1
+                cols = [c for c in data if c in local_cols[t]]
+                if lid is None:
+                    cur.execute(
+                        f"INSERT INTO {t}({','.join(cols)}, uid) VALUES({','.join('?' * len(cols))}, ?)",
+                        [data[c] for c in cols] + [uid],
+                    )
+                else:
+                    cur.execute(f"UPDATE {t} SET {', '.join(c + '=?' for c in cols)} WHERE id=?", [data[c] for c in cols] + [lid])
+                stats["applied"] += 1
+            cur.execute(
+                """
+                INSERT INTO sync_peers(node_id,last_imported_seq,imported_at) VALUES(?,?,?)
+                ON CONFLICT(node_id) DO UPDATE SET last_imported_seq=MAX(last_imported_seq, excluded.last_imported_seq), imported_at=excluded.imported_at
+                """,
+                (node, header["to_seq"], dt.datetime.now().isoformat(timespec="seconds")),
+            )
+            cur.execute("DELETE FROM store_flags WHERE name='sync_suppress'")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.appointments_rev += 1
+        return stats
+
+# ---- Backups ----------------------------------------------------------------
+
+def backup_database(src_path: Path, dest: Path, pages: int = 256, pause: float = 0.002):
+    """Online kopie via de SQLite backup-API, telkens `pages` pagina's per stap.
+    Tussen de stappen is de databank vrij, dus de balie kan gewoon verder schrijven."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".part")
+    src = sqlite3.connect(str(src_path), isolation_level=None)
+    dst = sqlite3.connect(str(tmp))
+    try:
+        # Open leestransactie: in WAL-modus blijft de momentopname vast en herstart
+        # de backup niet telkens iemand anders iets wegschrijft.
+        src.execute("BEGIN")
+        src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        src.backup(dst, pages=pages, progress=lambda status, remaining, total: time.sleep(pause))
+        src.execute("COMMIT")
+    finally:
+        dst.close()
+        src.close()
+    os.replace(tmp, dest)
+
+def rotate_backups(backup_dir: Path, keep: int):
+    backups = sorted(p for p in backup_dir.glob("backup_*") if p.is_dir())
+    for old in backups[:-keep] if keep > 0 else []:
+        shutil.rmtree(old, ignore_errors=True)
+
+def run_backup(db_path: Path = DB_PATH, backup_dir: Path = BACKUP_DIR, keep: int = 7,
+               include_pdfs: bool = False, pdf_dir: Path = PDF_DIR) -> Path:
+    """Maakt backups/backup_<tijdstip>/ met de databank, de jaararchieven en
+    optioneel receipts.zip; houdt de `keep` recentste back-ups over."""
+    stamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+    target = backup_dir / f"backup_{stamp}"
+    n = 1
+    while target.exists():
+        n += 1
+        target = backup_dir / f"backup_{stamp}_{n}"
+    work = backup_dir / f".{target.name}.part"
+    work.mkdir(parents=True, exist_ok=True)
+    try:
+        backup_database(db_path, work / db_path.name)
+        for arch in sorted((db_path.parent / "archive").glob("pedicure_*.db")):
+            backup_database(arch, work / "archive" / arch.name)
+        if include_pdfs and pdf_dir.exists():
+            # PDF's zijn al gecomprimeerd: ZIP_STORED is even klein en veel sneller
+            with zipfile.ZipFile(work / "receipts.zip", "w", zipfile.ZIP_STORED) as zf:
+                for f in sorted(pdf_dir.rglob("*")):
+                    if f.is_file():
+                        zf.write(f, f.relative_to(pdf_dir))
+                        time.sleep(0)
+        os.replace(work, target)
+    except Exception:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    rotate_backups(backup_dir, keep)
+    return target
+
+class BackupRunner:
+    """Draait run_backup in een achtergrondthread; de UI leest `result`/`error` via after()."""
+    def __init__(self):
+        self.thread = None
+        self.result = None
+        self.error = None
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, **kwargs) -> bool:
+        if self.running:
+            return False
+        self.result = self.error = None
+
+        def work():
+            try:
+                self.result = run_backup(**kwargs)
+            except Exception as e:
+                self.error = e
+
+        self.thread = threading.Thread(target=work, name="backup", daemon=True)
+        self.thread.start()
+        return True
+
+# ---- Geplande taken ----------------------------------------------------------
+
+REMINDER_MAILS = {
+    'nl': ("Herinnering: afspraak op {date} om {time}",
+           "Beste {name},\nWe verwachten u op {date} om {time}.\nKan u niet komen, laat het ons dan weten.\n{company}"),
+    'fr': ("Rappel : rendez-vous le {date} à {time}",
+           "Cher/Chère {name},\nNous vous attendons le {date} à {time}.\nSi vous ne pouvez pas venir, merci de nous prévenir.\n{company}"),
+    'en': ("Reminder: appointment on {date} at {time}",
+           "Dear {name},\nWe look forward to seeing you on {date} at {time}.\nIf you cannot make it, please let us know.\n{company}"),
+    'ar': ("تذكير: موعد يوم {date} الساعة {time}",
+           "{name} العزيز/العزيزة،\nننتظرك يوم {date} الساعة {time}.\nإذا لم تتمكن من الحضور، يرجى إعلامنا.\n{company}"),
+}
+REMINDER_HOURS = (8, 20)   # alleen tussen 8 en 20 uur mailen
+
+def job_reminders(store) -> str:
+    """Herinnering voor de afspraken van morgen, in de taal van de cliënt. Wat al
+    verstuurd is staat in appointment_reminders, dus elk uur lopen kan geen kwaad."""
+    from email.message import EmailMessage
+    if not REMINDER_HOURS[0] <= dt.datetime.now().hour < REMINDER_HOURS[1]:
+        return "buiten de verzenduren"
+    smtp = smtp_settings()
+    if smtp is None:
+        return "overgeslagen: SMTP instellingen ontbreken"
+    company = Settings(store).company()
+    if company is None:
+        return "overgeslagen: geen firma ingesteld"
+    day = dt.date.today() + dt.timedelta(days=1)
+    due = store.reminders_due(day)
+    messages = []
+    for a in due:
+        subject, body = REMINDER_MAILS.get(a['lang'] or company.base_lang, REMINDER_MAILS['en'])
+        fields = {"name": a['name'], "date": a['date'], "time": a['time'], "company": company.name}
+        msg = EmailMessage(); msg['Subject'] = subject.format(**fields); msg['From'] = smtp["from"]; msg['To'] = a['email']
+        msg.set_content(body.format(**fields))
+        messages.append((a['ref'], msg))
+    sent = []
+    try:
+        for ref in smtp_send(smtp, messages) if messages else ():
+            sent.append(ref)
+    finally:
+        store.mark_reminded(sent, day)
+    return f"{len(sent)}/{len(due)} herinneringen voor {day}"
+
+def job_nightly_reports(store) -> str:
+    """Vult de render-cache met het maand- en jaaroverzicht en het belastingdocument,
+    zodat afdrukken overdag meteen het klaarstaande bestand geeft."""
+    if pdfcanvas is None:
+        return "overgeslagen: reportlab ontbreekt"
+    settings = Settings(store)
+    company = settings.company()
+    if company is None:
+        return "overgeslagen: geen firma ingesteld"
+    lang, vat_rate, today = settings["base_lang"], settings["vat_rate"], dt.date.today()
+    made = [period for period in ("month", "year")
+            if period_report_pdf(store, company, lang, vat_rate, *period_dates(period, today))]
+    if tax_doc_pdf(store, company, lang, vat_rate, today):
+        made.append("tax_doc")
+    return ", ".join(made) or "geen reçus"
+
+def job_optimize(store) -> str:
+    return store.optimize()
+
+def job_wal_checkpoint(store) -> str:
+    return ", ".join(f"{k}={v}" for k, v in store.wal_checkpoint().items())
+
+# naam -> (functie store -> samenvatting, interval in minuten, tijdstip voor dagelijkse taken)
+SCHEDULED_JOBS = {
+    "reminders": (job_reminders, 60, None),
+    "nightly_reports": (job_nightly_reports, 1440, "02:00"),
+    "optimize": (job_optimize, 1440, "03:00"),
+    "wal_checkpoint": (job_wal_checkpoint, 60, None),
+}
+
+class Scheduler:
+    """Voert SCHEDULED_JOBS uit in een eigen thread met een eigen Store-verbinding, dus
+    nooit in de Tk-lus. Het rooster staat in de tabel jobs: wat verviel terwijl de app
+    dicht was, loopt bij de start één keer (niet één keer per gemiste beurt)."""
+    POLL_S = 60     # ook taken die een ander proces vervallen zet (set_job_due) worden zo opgepikt
+
+    def __init__(self, path=DB_PATH, jobs=None):
+        self.path = path
+        self.jobs = SCHEDULED_JOBS if jobs is None else jobs
+        self.thread = None
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def wake(self):
+        """Meteen opnieuw kijken, bv. na set_job_due."""
+        self._wake.set()
+
+    def _run(self):
+        store = Store(self.path)
+        store.ensure_jobs([(name, interval, at) for name, (_fn, interval, at) in self.jobs.items()])
+        while not self._stopped:
+            self.run_due(store)
+            due = store.next_job_due()
+            wait = self.POLL_S
+            if due:
+                wait = min(wait, max(1.0, (dt.datetime.fromisoformat(due) - dt.datetime.now()).total_seconds()))
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def run_due(self, store, now: dt.datetime | None = None) -> int:
+        """Alle vervallen taken na elkaar; geeft het aantal gelopen taken terug."""
+        n = 0
+        while not self._stopped:
+            claimed = store.claim_due_job(now or dt.datetime.now())
+            if claimed is None:
+                break
+            name, run_id = claimed
+            try:
+                result, status = self.jobs[name][0](store), "ok"
+            except Exception as e:
+                result, status = f"{type(e).__name__}: {e}", "error"
+            store.finish_job_run(run_id, status, str(result)[:1000])
+            n += 1
+        return n
+
+# ---- PDF-indeling ------------------------------------------------------------
+
+def migrate_pdf_layout(store, batch: int = 500, progress=None) -> dict:
+    """Verhuist PDF's uit de platte PDF_DIR naar PDF_DIR/<jaar>/<maand>/ en zet
+    receipts.pdf_path relatief, per `batch` reçus in één transactie.
+    Hervatbaar: verplaatste bestanden en bijgewerkte rijen worden overgeslagen."""
+    stats = {"moved": 0, "missing": 0, "rows": 0, "other_files": 0}
+    last_id = 0
+    while True:
+        rows = store.receipts_with_flat_pdf(last_id, batch)
+        if not rows:
+            break
+        pairs = []
+        for r in rows:
+            src = resolve_pdf(r['pdf_path'])
+            target = pdf_target(src.name, dt.date.fromisoformat(r['date']))
+            if src.exists() and src != target:
+                if not target.exists():
+                    shutil.move(str(src), str(target))
+                    stats["moved"] += 1
+                else:
+                    src.unlink()
+            elif not target.exists():
+                stats["missing"] += 1
+            pairs.append((r['id'], pdf_rel(target)))
+        store.set_receipt_pdf_paths(pairs)
+        stats["rows"] += len(pairs)
+        last_id = rows[-1]['id']
+        if progress:
+            progress(stats)
+    # Overige platte bestanden (overzichten, exports, belastingdocumenten) naar dezelfde map als een nieuw exemplaar
+    for f in sorted(PDF_DIR.iterdir()):
+        if f.is_file() and f.suffix.lower() in (".pdf", ".csv", ".xlsx"):
+            target = legacy_pdf_target(f.name, dt.date.fromtimestamp(f.stat().st_mtime))
+            if not target.exists():
+                shutil.move(str(f), str(target))
+                stats["other_files"] += 1
+    store.set_config("pdf_layout", "sharded")
+    return stats
+
+# ---- PDF-maandpakketten ------------------------------------------------------
+
+def _zip_data_offset(f, info: zipfile.ZipInfo) -> int:
+    """Begin van de data van `info` in de zip: na de lokale header (30 bytes + naam + extra)."""
+    f.seek(info.header_offset)
+    header = f.read(30)
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    return info.header_offset + 30 + name_len + extra_len
+
+def pack_month_pdfs(store, year: int, month: int, rows=None) -> dict:
+    """Bundelt de reçu-PDF's van een afgesloten maand in PDF_DIR/<jaar>/<maand>/receipts_<jaar>-<maand>.zip
+    (ZIP_STORED) en bewaart per reçu offset en grootte in pdf_pack_index.
+    Losse bestanden worden pas verwijderd nadat de index vastligt; opnieuw draaien vult aan."""
+    first = dt.date(year, month, 1)
+    if first >= dt.date.today().replace(day=1):
+        raise ValueError(f"{year}-{month:02d} is nog geen afgesloten maand")
+    if rows is None:
+        rows = [r for r in store.unpacked_pdf_receipts(month_bounds(first)[1] + dt.timedelta(days=1)) if r['date'] >= first.isoformat()]
+    stats = {"packed": 0, "missing": 0}
+    if not rows:
+        return stats
+    pack = pdf_target(f"receipts_{year:04d}-{month:02d}.zip", first)
+    indexed = []  # (reçu, lid in de zip, los bestand dat na het indexeren weg mag of None)
+    with zipfile.ZipFile(pack, "a", zipfile.ZIP_STORED) as zf:
+        members = {i.filename: i for i in zf.infolist()}
+        for r in rows:
+            src = resolve_pdf(r['pdf_path'])
+            if not src.exists():
+                if store.get_pdf_pack_entry(r['id']) is not None:
+                    continue  # al ingepakt en geïndexeerd
+                if src.name in members:
+                    indexed.append((r, src.name, None))  # eerder ingepakt, index ontbrak nog
+                else:
+                    stats["missing"] += 1
+                continue
+            # Bestaand lid enkel hergebruiken als het los bestand (niet opnieuw aangemaakt) identiek is
+            info = members.get(src.name)
+            if info is not None and info.file_size == src.stat().st_size and info.CRC == zlib.crc32(src.read_bytes()):
+                indexed.append((r, src.name, src))
+                continue
+            name, n = src.name, 1
+            while name in members:
+                name = f"{src.stem}~{n}{src.suffix}"
+                n += 1
+            zf.write(src, name)
+            members[name] = zf.getinfo(name)
+            indexed.append((r, name, src))
+    entries = []
+    with zipfile.ZipFile(pack) as zf, open(pack, "rb") as f:
+        infos = {i.filename: i for i in zf.infolist()}
+        for r, name, _src in indexed:
+            info = infos[name]
+            entries.append((r['id'], pdf_rel(pack), _zip_data_offset(f, info), info.file_size))
+    store.add_pdf_pack_entries(entries)
+    for _r, _name, src in indexed:
+        if src is not None and src.exists():
+            src.unlink()
+    stats["packed"] = len(entries)
+    return stats
+
+def pack_closed_months(store) -> dict:
+    """Pakt alle afgesloten maanden in die nog losse reçu-PDF's hebben."""
+    rows = store.unpacked_pdf_receipts(dt.date.today().replace(day=1))
+    by_month = {}
+    for r in rows:
+        by_month.setdefault(r['date'][:7], []).append(r)
+    total = {"months": 0, "packed": 0, "missing": 0}
+    for key, month_rows in sorted(by_month.items()):
+        stats = pack_month_pdfs(store, int(key[:4]), int(key[5:7]), month_rows)
+        total["months"] += 1
+        total["packed"] += stats["packed"]
+        total["missing"] += stats["missing"]
+    return total
+
+def load_receipt_pdf(store, r) -> bytes | None:
+    """PDF-bytes van één reçu: rechtstreeks uit het maandpakket (seek + read) of van schijf."""
+    entry = store.get_pdf_pack_entry(r['id'])
+    if entry is not None:
+        with open(PDF_DIR / entry['pack'], "rb") as f:
+            f.seek(entry['offset'])
+            return f.read(entry['size'])
+    path = resolve_pdf(r['pdf_path'])
+    if path and path.exists():
+        return path.read_bytes()
+    return None
+
+def open_with_system(path: Path):
+    import subprocess
+    import sys
+    if sys.platform.startswith("win"):
+        os.startfile(str(path))  # type: ignore[attr-defined]
+    elif sys.platform == "darwin":
+        subprocess.Popen(["open", str(path)])
+    else:
+        subprocess.Popen(["xdg-open", str(path)])
+
+# ---- Analyse ----------------------------------------------------------------
+ANALYTICS_KEYS = ("client", "weekday", "hour", "manipulation", "month")
+
+class AnalyticsEngine:
+    """Kolomsgewijze NumPy-snapshot van alle reçulijnen. refresh() laadt enkel reçus
+    boven het hoogste geladen id; wijkt de vingerafdruk van het geladen deel af
+    (bv. na archiveren of een sync), dan wordt alles opnieuw geladen."""
+    def __init__(self, store):
+        if np is None:
+            raise RuntimeError("Pakket 'numpy' ontbreekt. Installeer met: pip install numpy")
+        self.store = store
+        self._reset()
+
+    def _reset(self):
+        self.receipt = np.zeros(0, dtype=np.int64)
+        self.day = np.zeros(0, dtype=np.int32)       # date.toordinal()
+        self.month = np.zeros(0, dtype=np.int32)     # jaar*12 + maand-1
+        self.hour = np.zeros(0, dtype=np.int16)      # -1 = onbekend
+        self.client = np.zeros(0, dtype=np.int32)    # -1 = geen cliënt
+        self.manip = np.zeros(0, dtype=np.int32)
+        self.qty = np.zeros(0, dtype=np.int32)
+        self.cents = np.zeros(0, dtype=np.int64)
+        self.max_id = 0
+        self._fingerprint = (0, 0)
+
+    def __len__(self):
+        return len(self.cents)
+
+    def refresh(self) -> int:
+        """Werkt de snapshot bij; geeft het aantal nieuw geladen lijnen terug."""
+        if self.max_id and self.store.receipt_fingerprint(self.max_id) != self._fingerprint:
+            self._reset()
+        parts = self.store.analytics_rows(self.max_id)
+        rows = [r for part in parts for r in part]
+        if rows:
+            self._append(rows)
+            self._fingerprint = self.store.receipt_fingerprint(self.max_id)
+        return len(rows)
+
+    def _append(self, rows):
+        rid, dates, times, clients, manips, qty, cents = zip(*rows)
+        ordinals = {}
+        for d in set(dates):
+            ordinals[d] = dt.date.fromisoformat(d).toordinal()
+        day = np.fromiter((ordinals[d] for d in dates), dtype=np.int32, count=len(dates))
+        months = {d: int(d[:4]) * 12 + int(d[5:7]) - 1 for d in ordinals}
+        cols = {
+            "receipt": np.array(rid, dtype=np.int64),
+            "day": day,
+            "month": np.fromiter((months[d] for d in dates), dtype=np.int32, count=len(dates)),
+            "hour": np.array([int(t[:2]) if t else -1 for t in times], dtype=np.int16),
+            "client": np.array([c if c is not None else -1 for c in clients], dtype=np.int32),
+            "manip": np.array([m if m is not None else -1 for m in manips], dtype=np.int32),
+            "qty": np.array([q or 0 for q in qty], dtype=np.int32),
+            "cents": np.array([c or 0 for c in cents], dtype=np.int64),
+        }
+        for name, col in cols.items():
+            setattr(self, name, np.concatenate([getattr(self, name), col]))
+        self.max_id = max(self.max_id, int(cols["receipt"].max()))
+
+    def _mask(self, start: dt.date | None, end: dt.date | None, client_id=None):
+        mask = np.ones(len(self.cents), dtype=bool)
+        if start:
+            mask &= self.day >= start.toordinal()
+        if end:
+            mask &= self.day <= end.toordinal()
+        if client_id:
+            mask &= self.client == client_id
+        return mask
+
+    def _key_column(self, key: str):
+        if key == "client":
+            return self.client
+        if key == "weekday":
+            return (self.day + 6) % 7   # 0 = maandag, zoals date.weekday()
+        if key == "hour":
+            return self.hour
+        if key == "manipulation":
+            return self.manip
+        if key == "month":
+            return self.month
+        raise ValueError(f"Onbekende groepering: {key}")
+
+    @staticmethod
+    def _decode(key: str, value: int):
+        value = int(value)
+        if key == "month":
+            return f"{value // 12:04d}-{value % 12 + 1:02d}"
+        if key in ("client", "manipulation", "hour") and value < 0:
+            return None
+        return value
+
+    def group_by(self, key: str, start=None, end=None, client_id=None) -> list[tuple]:
+        """[(sleutel, cents, aantal)] per waarde van `key`, gesorteerd op sleutel."""
+        mask = self._mask(start, end, client_id)
+        col = self._key_column(key)[mask]
+        if not len(col):
+            return []
+        keys, inv = np.unique(col, return_inverse=True)
+        cents = np.bincount(inv, weights=self.cents[mask], minlength=len(keys))
+        qty = np.bincount(inv, weights=self.qty[mask], minlength=len(keys))
+        return [(self._decode(key, k), int(c), int(q)) for k, c, q in zip(keys, cents, qty)]
+
+    def top(self, key: str, n: int = 10, start=None, end=None, client_id=None) -> list[tuple]:
+        """De n grootste groepen op omzet."""
+        groups = self.group_by(key, start, end, client_id)
+        if not groups:
+            return []
+        order = np.argsort(-np.array([g[1] for g in groups], dtype=np.int64), kind="stable")[:n]
+        return [groups[i] for i in order]
+
+    def month_over_month(self, start: dt.date, end: dt.date, client_id=None) -> list[dict]:
+        """Omzet per maand in [start, end], ook lege maanden, met % verschil t.o.v. de vorige."""
+        if end < start:
+            return []
+        m0 = start.year * 12 + start.month - 1
+        m1 = end.year * 12 + end.month - 1
+        mask = self._mask(start, end, client_id)
+        idx = self.month[mask] - m0
+        cents = np.bincount(idx, weights=self.cents[mask], minlength=m1 - m0 + 1)
+        qty = np.bincount(idx, weights=self.qty[mask], minlength=m1 - m0 + 1)
+        out, prev = [], None
+        for i, (c, q) in enumerate(zip(cents, qty)):
+            c = int(c)
+            change = round((c - prev) * 100.0 / prev, 1) if prev else None
+            out.append({"month": self._decode("month", m0 + i), "cents": c, "qty": int(q), "change_pct": change})
+            prev = c
+        return out
+
+def analytics_report(store, start: dt.date, end: dt.date, top_n: int = 10, engine=None) -> dict:
+    """Alle analyses voor [start, end] in één dict; bruikbaar zonder UI."""
+    engine = engine or AnalyticsEngine(store)
+    engine.refresh()
+    weekdays = dict((k, (c, q)) for k, c, q in engine.group_by("weekday", start, end))
+    return {
+        "by_client": engine.top("client", top_n, start, end),
+        "by_manipulation": engine.top("manipulation", top_n, start, end),
+        "by_weekday": [(d,) + weekdays.get(d, (0, 0)) for d in range(7)],
+        "by_hour": engine.group_by("hour", start, end),
+        "month_over_month": engine.month_over_month(start, end),
+    }
+
+# ---- Jaarvergelijking ---------------------------------------------------------
+
+def parse_years(text: str) -> list[int]:
+    """'2022-2025', '2023, 2025' of een mengeling daarvan -> gesorteerde jaren."""
+    years = set()
+    for part in text.replace(";", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        lo, hi = int(lo), int(hi or lo)
+        if not (1900 <= lo <= hi <= 9999):
+            raise ValueError(f"Ongeldig jaar: {part}")
+        years.update(range(lo, hi + 1))
+    return sorted(years)
+
+def comparative_report(store, years) -> dict:
+    """Maandomzet per jaar met het verschil t.o.v. het vorige gevraagde jaar.
+    rows: 12 maanden + totaal, elk {month, cells: [{year, gross, net, vat, n, delta, pct}]}."""
+    years = sorted({int(y) for y in years})
+    data = {(r['year'], r['month']): r for r in store.monthly_totals_by_year(years)}
+    empty = {'gross': 0, 'net': 0, 'vat': 0, 'n': 0}
+
+    def cells(values):
+        out, prev = [], None
+        for y, v in zip(years, values):
+            delta = v['gross'] - prev['gross'] if prev is not None else None
+            pct = delta / prev['gross'] * 100 if delta is not None and prev['gross'] else None
+            out.append({'year': y, 'gross': v['gross'], 'net': v['net'], 'vat': v['vat'], 'n': v['n'], 'delta': delta, 'pct': pct})
+            prev = v
+        return out
+
+    rows = [{'month': m, 'cells': cells([data.get((y, m), empty) for y in years])} for m in range(1, 13)]
+    totals = []
+    for y in years:
+        acc = dict(empty)
+        for m in range(1, 13):
+            for k in acc:
+                acc[k] += data.get((y, m), empty)[k]
+        totals.append(acc)
+    return {'years': years, 'rows': rows, 'total': {'month': None, 'cells': cells(totals)}, 'empty': not data}
+
+def _delta_label(cell) -> str:
+    if cell['delta'] is None:
+        return ""
+    sign = "+" if cell['delta'] >= 0 else "−"
+    pct = f" ({cell['pct']:+.1f}%)" if cell['pct'] is not None else ""
+    return f"{sign}{cents_to_money(abs(cell['delta']))}{pct}"
+
+def write_comparative_xlsx(fname: Path, report: dict, month_names: list[str]) -> Path:
+    import xlsxwriter  # type: ignore
+    wb = xlsxwriter.Workbook(str(fname))
+    money = wb.add_format({'num_format': '#,##0.00'})
+    pct = wb.add_format({'num_format': '+0.0%;-0.0%'})
+    bold = wb.add_format({'bold': True})
+    ws = wb.add_worksheet('Vergelijking')
+    ws.write(0, 0, 'Maand', bold)
+    col = 1
+    for i, y in enumerate(report['years']):
+        ws.write(0, col, str(y), bold); col += 1
+        if i:
+            ws.write(0, col, f"Δ {y}", bold); ws.write(0, col + 1, f"Δ% {y}", bold); col += 2
+    for r, row in enumerate(report['rows'] + [report['total']], start=1):
+        ws.write(r, 0, month_names[row['month'] - 1] if row['month'] else 'Totaal', bold if not row['month'] else None)
+        col = 1
+        for i, cell in enumerate(row['cells']):
+            ws.write_number(r, col, cell['gross'] / 100, money); col += 1
+            if i:
+                ws.write_number(r, col, cell['delta'] / 100, money)
+                if cell['pct'] is not None:
+                    ws.write_number(r, col + 1, cell['pct'] / 100, pct)
+                col += 2
+    ws.set_column(0, 0, 14); ws.set_column(1, col, 14)
+    ws.freeze_panes(1, 1)
+    detail = wb.add_worksheet('Detail')
+    for c, h in enumerate(('year', 'month', 'n', 'gross_eur', 'net_eur', 'vat_eur')):
+        detail.write(0, c, h, bold)
+    r = 1
+    for row in report['rows']:
+        for cell in row['cells']:
+            detail.write_row(r, 0, (cell['year'], row['month'], cell['n']))
+            for c, k in ((3, 'gross'), (4, 'net'), (5, 'vat')):
+                detail.write_number(r, c, cell[k] / 100, money)
+            r += 1
+    detail.autofilter(0, 0, r - 1, 5)
+    wb.close()
+    return fname
+
+# ---- Cliëntenimport -------------------------------------------------------------
+# Kolomnamen uit oude systemen -> ons veld (kleine letters, zonder spaties)
+CLIENT_IMPORT_ALIASES = {
+    "name": "name", "naam": "name", "nom": "name", "fullname": "name", "volledigenaam": "name",
+    "firstname": "first", "voornaam": "first", "prenom": "first", "prénom": "first",
+    "lastname": "last", "achternaam": "last", "familienaam": "last", "nomdefamille": "last",
+    "email": "email", "e-mail": "email", "mail": "email", "courriel": "email",
+    "phone": "phone", "telefoon": "phone", "tel": "phone", "gsm": "phone", "mobile": "phone",
+    "téléphone": "phone", "telephone": "phone",
+    "notes": "notes", "notities": "notes", "opmerkingen": "notes", "remarques": "notes",
+    "lang": "lang", "taal": "lang", "langue": "lang", "language": "lang",
+}
+
+class _CountingReader(io.RawIOBase):
+    """Binaire bestandswrapper die bijhoudt hoeveel bytes gelezen zijn (voortgang)."""
+    def __init__(self, f):
+        self.f = f
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self.f.readinto(b)
+        self.pos += n or 0
+        return n
+
+def iter_csv_clients(text):
+    """Leest cliënten uit een CSV-stroom; scheidingsteken wordt uit het begin afgeleid."""
+    import csv
+    head = text.readline()
+    try:
+        dialect = csv.Sniffer().sniff(head, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    fields = [CLIENT_IMPORT_ALIASES.get(h.strip().lower().replace(" ", "").replace("_", ""), h.strip().lower())
+              for h in next(csv.reader([head], dialect))]
+    for line_no, values in enumerate(csv.reader(text, dialect), start=2):
+        if not any(values):
+            continue
+        rec = {f: (v.strip() if v else "") for f, v in zip(fields, values)}
+        name = rec.get("name") or " ".join(p for p in (rec.get("first"), rec.get("last")) if p)
+        yield line_no, {"name": name, "email": rec.get("email", ""), "phone": rec.get("phone", ""),
+                        "notes": rec.get("notes", ""), "lang": rec.get("lang", "")}
+
+def iter_vcard_clients(text):
+    """Leest cliënten uit een vCard-stroom (2.1/3.0/4.0), regel per regel."""
+    def unfolded():
+        prev, start = None, 0
+        for n, line in enumerate(text, start=1):
+            line = line.rstrip("\r\n")
+            if line[:1] in (" ", "\t") and prev is not None:
+                prev += line[1:]
+                continue
+            if prev is not None:
+                yield start, prev
+            prev, start = line, n
+        if prev is not None:
+            yield start, prev
+
+    def unescape(v):
+        return v.replace("\\n", "\n").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\").strip()
+
+    card = None
+    for line_no, line in unfolded():
+        key, _, value = line.partition(":")
+        prop = key.split(";")[0].split(".")[-1].upper()
+        if prop == "BEGIN":
+            card, first_line = {}, line_no
+        elif card is None:
+            continue
+        elif prop == "END":
+            name = card.get("fn") or card.get("n", "")
+            yield first_line, {"name": name, "email": card.get("email", ""), "phone": card.get("tel", ""),
+                               "notes": card.get("note", ""), "lang": card.get("lang", "")}
+            card = None
+        elif prop == "N":
+            parts = [unescape(p) for p in value.split(";")]
+            card.setdefault("n", " ".join(p for p in (parts[1] if len(parts) > 1 else "", parts[0]) if p))
+        elif prop in ("FN", "EMAIL", "TEL", "NOTE", "LANG"):
+            card.setdefault(prop.lower(), unescape(value))
+
+def import_clients(store, path, chunk: int = 5000, progress=None, reject_path=None) -> dict:
+    """Importeert cliënten uit CSV of vCard (.vcf) in stukken van `chunk` per transactie.
+    Dubbels (zelfde genormaliseerde e-mail of telefoon, in de databank of eerder in het
+    bestand) en onbruikbare regels gaan met reden naar het afkeurbestand.
+    progress(rijen, fractie) wordt na elk stuk aangeroepen."""
+    import csv
+    path = Path(path)
+    reject_path = Path(reject_path) if reject_path else path.with_name(path.name + ".afgekeurd.csv")
+    country = store.get_config("phone_country", "32")
+    default_lang = store.get_config("base_lang", "nl") or "nl"
+    size = max(path.stat().st_size, 1)
+    stats = {"read": 0, "imported": 0, "duplicates": 0, "rejected": 0, "reject_file": None}
+    seen_emails, seen_phones = set(), set()
+    rejects = None
+    reject_file = None
+
+    def reject(line_no, rec, reason):
+        nonlocal rejects, reject_file
+        if rejects is None:
+            reject_file = open(reject_path, "w", newline="", encoding="utf-8")
+            rejects = csv.writer(reject_file)
+            rejects.writerow(["line", "name", "email", "phone", "notes", "lang", "reason"])
+            stats["reject_file"] = str(reject_path)
+        rejects.writerow([line_no, rec["name"], rec["email"], rec["phone"], rec["notes"], rec["lang"], reason])
+
+    def flush(batch):
+        existing_emails, existing_phones = map(set, store.existing_client_keys(
+            list({r[1][5] for r in batch if r[1][5]}), list({r[1][6] for r in batch if r[1][6]})))
+        rows = []
+        for line_no, row, rec in batch:
+            if row[5] and (row[5] in existing_emails or row[5] in seen_emails):
+                stats["duplicates"] += 1
+                reject(line_no, rec, "dubbel e-mailadres")
+            elif row[6] and (row[6] in existing_phones or row[6] in seen_phones):
+                stats["duplicates"] += 1
+                reject(line_no, rec, "dubbel telefoonnummer")
+            else:
+                rows.append(row)
+                if row[5]:
+                    seen_emails.add(row[5])
+                if row[6]:
+                    seen_phones.add(row[6])
+        if rows:
+            store.add_clients_bulk(rows)
+            stats["imported"] += len(rows)
+
+    with open(path, "rb") as raw:
+        counter = _CountingReader(raw)
+        text = io.TextIOWrapper(io.BufferedReader(counter), encoding="utf-8-sig", errors="replace", newline="")
+        records = iter_vcard_clients(text) if path.suffix.lower() in (".vcf", ".vcard") else iter_csv_clients(text)
+        batch = []
+        try:
+            for line_no, rec in records:
+                stats["read"] += 1
+                email_norm = normalize_email(rec["email"])
+                phone_norm = normalize_phone(rec["phone"], country)
+                if not rec["name"]:
+                    stats["rejected"] += 1
+                    reject(line_no, rec, "geen naam")
+                    continue
+                if rec["email"] and not email_norm:
+                    stats["rejected"] += 1
+                    reject(line_no, rec, "ongeldig e-mailadres")
+                    continue
+                lang = (rec["lang"] or "").lower()[:2]
+                row = (rec["name"], rec["email"].strip() or None, rec["phone"] or None, rec["notes"] or None,
+                       lang if lang in SUPPORTED_LANGS else default_lang, email_norm, phone_norm)
+                batch.append((line_no, row, rec))
+                if len(batch) >= chunk:
+                    flush(batch)
+                    batch = []
+                    if progress:
+                        progress(stats["read"], min(counter.pos / size, 1.0))
+            if batch:
+                flush(batch)
+        finally:
+            if reject_file:
+                reject_file.close()
+    if progress:
+        progress(stats["read"], 1.0)
+    return stats
+
+# ---- Reçu-import ----------------------------------------------------------------
+RECEIPT_IMPORT_ALIASES = {
+    "number": "number", "nummer": "number", "numero": "number", "numéro": "number", "nr": "number", "#": "number",
+    "date": "date", "datum": "date",
+    "time": "time", "tijd": "time", "uur": "time", "heure": "time",
+    "client": "client", "cliënt": "client", "klant": "client", "name": "client", "naam": "client", "nom": "client",
+    "manipulation": "manipulation", "manipulatie": "manipulation", "behandeling": "manipulation",
+    "soin": "manipulation", "item": "manipulation", "omschrijving": "manipulation",
+    "qty": "qty", "aantal": "qty", "quantity": "qty", "quantité": "qty",
+    "price": "price", "priceeur": "price", "prijs": "price", "prix": "price", "eenheidsprijs": "price",
+    "total": "total", "totaleur": "total", "totaal": "total", "bedrag": "total", "montant": "total",
+    "vat": "vat_rate", "vatrate": "vat_rate", "btw": "vat_rate", "tva": "vat_rate",
+    "pdf": "pdf_path", "pdfpath": "pdf_path",
+}
+
+def parse_import_date(value) -> dt.date | None:
+    if isinstance(value, dt.datetime):
+        return value.date()
+    if isinstance(value, dt.date):
+        return value
+    text = str(value or "").strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y%m%d"):
+        try:
+            return dt.datetime.strptime(text[:10], fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def parse_import_cents(value) -> int | None:
+    """'12,50', '€ 1.234,50', '1,234.50' of een getal -> cent."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return money_to_cents(value)
+    text = str(value).replace("€", "").replace("EUR", "").replace(" ", "").replace("\xa0", "")
+    if "," in text and "." in text:
+        text = text.replace(".", "").replace(",", ".") if text.rfind(",") > text.rfind(".") else text.replace(",", "")
+    else:
+        text = text.replace(",", ".")
+    try:
+        return money_to_cents(text)
+    except ValueError:
+        return None
+
+def parse_import_percent(value) -> float | None:
+    """'21', '21%', '21,0' of een getal -> 21.0; leeg -> None. ValueError buiten 0-100."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return _setting_percent(value)
+    return _setting_percent(str(value).replace("%", "").replace(" ", "").replace("\xa0", "").replace(",", "."))
+
+def iter_table_rows(path: Path, aliases: dict):
+    """(regelnummer, {veld: waarde}, fractie) per gegevensrij van een CSV- of xlsx-bestand."""
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        try:
+            import openpyxl  # type: ignore
+        except Exception:
+            raise RuntimeError("Pakket 'openpyxl' ontbreekt. Installeer met: pip install openpyxl")
+        wb = openpyxl.load_workbook(str(path), read_only=True, data_only=True)
+        try:
+            ws = wb.worksheets[0]
+            total = max(ws.max_row or 1, 1)
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None) or ()
+            fields = [aliases.get(str(h or "").strip().lower().replace(" ", "").replace("_", ""), str(h or "").strip().lower()) for h in header]
+            for line_no, values in enumerate(rows, start=2):
+                if not any(v not in (None, "") for v in values):
+                    continue
+                yield line_no, dict(zip(fields, values)), line_no / total
+        finally:
+            wb.close()
+        return
+    import csv
+    size = max(path.stat().st_size, 1)
+    with open(path, "rb") as raw:
+        counter = _CountingReader(raw)
+        text = io.TextIOWrapper(io.BufferedReader(counter), encoding="utf-8-sig", errors="replace", newline="")
+        head = text.readline()
+        try:
+            dialect = csv.Sniffer().sniff(head, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        fields = [aliases.get(h.strip().lower().replace(" ", "").replace("_", ""), h.strip().lower())
+                  for h in next(csv.reader([head], dialect))]
+        for line_no, values in enumerate(csv.reader(text, dialect), start=2):
+            if not any(values):
+                continue
+            yield line_no, {f: v.strip() for f, v in zip(fields, values)}, min(counter.pos / size, 1.0)
+
+def import_receipts(store, path, numbering: str = "keep", chunk: int = 1000, progress=None, reject_path=None) -> dict:
+    """Importeert historische reçus uit CSV of xlsx: één rij per reçulijn (nummer, datum,
+    cliënt, manipulatie, aantal, prijs) of per reçu (zoals export_csv: nummer, datum,
+    cliënt, total_eur, pdf_path). Rijen met hetzelfde nummer na elkaar vormen één reçu.
+    numbering: 'keep' (bestaande nummers overslaan) of 'reassign' (JJJJMMDD-NNNN).
+    Elk stuk van `chunk` reçus wordt samen met de voortgang gecommit; na een onderbreking
+    hervat een nieuwe oproep met hetzelfde bestand na het laatste gecommitte stuk."""
+    import csv
+    path = Path(path)
+    reject_path = Path(reject_path) if reject_path else path.with_name(path.name + ".afgekeurd.csv")
+    st = path.stat()
+    job_id, skip = store.start_import_job("receipts", str(path.resolve()), st.st_size, st.st_mtime, {"numbering": numbering})
+    clients = {c['name'].strip().lower(): c['id'] for c in store.list_clients()}
+    manips = {m['name'].strip().lower(): (m['id'], m['name']) for m in store.list_manips()}
+    default_rate = store.get_vat_rate()
+    stats = {"job_id": job_id, "resumed_at": skip, "receipts": 0, "duplicates": 0, "closed": 0, "rejected": 0, "reject_file": None}
+    pending_rejects = []
+
+    def write_rejects():
+        if not pending_rejects:
+            return
+        fresh = stats["reject_file"] is None and (not skip or not reject_path.exists())
+        with open(reject_path, "w" if fresh else "a", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            if fresh:
+                w.writerow(["line", "number", "date", "client", "reason"])
+            w.writerows(pending_rejects)
+        stats["reject_file"] = str(reject_path)
+        pending_rejects.clear()
+
+    done = 0            # gegevensrijen tot en met de laatste afgesloten reçu
+    groups, current = [], None
+    frac = 0.0
+
+    def flush():
+        res = store.import_receipt_chunk(job_id, done, groups, keep_numbers=(numbering == "keep"))
+        clients.update(res["clients"])
+        stats["receipts"] += res["inserted"]
+        stats["duplicates"] += len(res["duplicates"])
+        stats["closed"] += len(res["closed"])
+        by_line = {g["line"]: g for g in groups}
+        for lines, reason in ((res["duplicates"], "bestaand nummer"), (res["closed"], "boekjaar afgesloten")):
+            for line in lines:
+                g = by_line[line]
+                pending_rejects.append([line, g["number"], g["date"], g["client_name"] or "", reason])
+        write_rejects()
+        groups.clear()
+        if progress:
+            progress(stats["receipts"], frac)
+
+    def close_current():
+        nonlocal current
+        if current is not None and current["items"]:
+            groups.append(current)
+        current = None
+
+    index = -1
+    for index, (line_no, rec, frac) in enumerate(iter_table_rows(path, RECEIPT_IMPORT_ALIASES)):
+        if index < skip:
+            continue
+        number = str(rec.get("number") or "").strip() or None
+        if current is not None and (number is None or number != current["number"]):
+            close_current()
+            done = index
+            if len(groups) >= chunk:
+                flush()
+        day = parse_import_date(rec.get("date"))
+        qty = rec.get("qty")
+        try:
+            qty = int(float(str(qty).replace(",", "."))) if qty not in (None, "") else 1
+        except ValueError:
+            qty = None
+        price = parse_import_cents(rec.get("price"))
+        if price is None:
+            price = parse_import_cents(rec.get("total"))
+            qty = 1 if qty is not None else None
+        try:
+            rate, rate_ok = parse_import_percent(rec.get("vat_rate")), True
+        except ValueError:
+            rate, rate_ok = None, False
+        reason = ("ongeldige datum" if day is None else
+                  "ongeldig bedrag" if price is None else
+                  "ongeldig aantal" if qty is None else
+                  "ongeldig btw-tarief" if not rate_ok else None)
+        client_name = str(rec.get("client") or "").strip() or None
+        if reason:
+            stats["rejected"] += 1
+            pending_rejects.append([line_no, number or "", rec.get("date") or "", client_name or "", reason])
+            continue
+        if current is None:
+            current = {
+                "line": line_no, "number": number, "date": day.isoformat(),
+                "time": str(rec.get("time") or "").strip()[:5] or None,
+                "client_id": clients.get(client_name.lower()) if client_name else None,
+                "client_name": client_name,
+                "vat_rate": rate if rate is not None else default_rate,
+                "pdf_path": str(rec.get("pdf_path") or "").strip() or None,
+                "items": [],
+            }
+        mname = str(rec.get("manipulation") or "").strip()
+        mid, canonical = manips.get(mname.lower(), (None, mname or None))
+        current["items"].append((mid, canonical, qty, price))
+    close_current()
+    done = index + 1
+    if groups:
+        flush()
+    write_rejects()
+    store.finish_import_job(job_id, stats)
+    if progress:
+        progress(stats["receipts"], 1.0)
+    return stats
+
+# ---- Servermodus --------------------------------------------------------------
+# Meerdere werkposten (behandelkamers, balie) delen één databank via een lokale
+# HTTP/JSON-API: POST /call/<methode> met {"args": [...], "kwargs": {...}}.
+
+STORE_READ_METHODS = frozenset({
+    "get_config", "all_config", "get_vat_rate", "get_company", "list_clients", "list_manips",
+    "list_appointments_in_range", "get_receipt", "list_receipts_in_range",
+    "list_receipts_in_range_by_client", "sum_total_in_range", "sum_vat_in_range",
+    "monthly_vat_totals", "sum_by_manipulations_in_range", "archived_years", "cache_stats",
+    "analytics_rows", "receipt_fingerprint", "existing_client_keys", "closed_years",
+    "day_closures_in_range", "period_totals", "monthly_totals_by_year", "list_jobs", "job_runs",
+})
+STORE_WRITE_METHODS = frozenset({
+    "set_config", "add_client", "update_client", "delete_client", "add_manip",
+    "update_manip", "delete_manip", "add_appointment", "add_appointment_rule",
+    "delete_appointment_rule", "set_occurrence_exception", "delete_appointment",
+    "create_receipt", "update_receipt_pdf", "archive_year", "close_year", "close_day", "add_clients_bulk",
+    "start_import_job", "finish_import_job", "import_receipt_chunk",
+    "get_rendered", "put_rendered", "checkout_day", "set_receipt_pdf_paths",
+    "set_job_due",
+})
+
+def _json_default(obj):
+    if isinstance(obj, sqlite3.Row):
+        return dict(obj)
+    if isinstance(obj, (dt.date, dt.datetime)):
+        return {"__date__": obj.isoformat()}
+    if isinstance(obj, Company):
+        return {"__company__": [obj.name, obj.admin, obj.base_lang]}
+    if isinstance(obj, Path):
+        return str(obj)
+    raise TypeError(f"niet serialiseerbaar: {type(obj).__name__}")
+
+def _json_object_hook(d):
+    if "__date__" in d:
+        v = d["__date__"]
+        return dt.datetime.fromisoformat(v) if "T" in v else dt.date.fromisoformat(v)
+    if "__company__" in d:
+        return Company(*d["__company__"])
+    return d
+
+def _records_to_dicts(obj):
+    # Records zijn tuples: json zou er lijsten van maken zonder _json_default te raadplegen.
+    # Ook binnen dicts en lijsten, want de server verpakt ze in {"result": ...}.
+    if isinstance(obj, RecordMixin):
+        return obj.as_dict()
+    if isinstance(obj, dict):
+        return {k: _records_to_dicts(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_records_to_dicts(x) for x in obj]
+    return obj
+
+def json_dumps(obj) -> bytes:
+    return json.dumps(_records_to_dicts(obj), default=_json_default, ensure_ascii=False).encode("utf-8")
+
+def json_loads(data: bytes):
+    return json.loads(data.decode("utf-8"), object_hook=_json_object_hook)
+
+class StoreServer:
+    """Eén schrijvende Store-verbinding (geserialiseerd) en een pool lezers."""
+    def __init__(self, path=DB_PATH, readers: int = 4, token: str | None = None):
+        self.writer = Store(path, check_same_thread=False)
+        self.write_lock = threading.Lock()
+        self.readers = queue.Queue()
+        for _ in range(max(1, readers)):
+            self.readers.put(Store(path, check_same_thread=False))
+        self.token = token
+        # Verhoogd per schrijfopdracht; clients gebruiken het als cache-revisie.
+        self.revision = 0
+
+    def call(self, method: str, args, kwargs):
+        if method in STORE_WRITE_METHODS:
+            with self.write_lock:
+                result = getattr(self.writer, method)(*args, **kwargs)
+                self.revision += 1
+            return result
+        if method in STORE_READ_METHODS:
+            store = self.readers.get()
+            try:
+                store._archive_years = None  # archiveren gebeurt via de schrijver
+                return getattr(store, method)(*args, **kwargs)
+            finally:
+                self.readers.put(store)
+        raise KeyError(method)
+
+    def close(self):
+        self.writer.conn.close()
+        while not self.readers.empty():
+            self.readers.get_nowait().conn.close()
+
+    def make_httpd(self, host="127.0.0.1", port=8765):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                pass
+
+            def _reply(self, status, payload):
+                body = json_dumps(payload)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if server.token and self.headers.get("X-Pedicure-Token") != server.token:
+                    return self._reply(403, {"ok": False, "error": "forbidden"})
+                if not self.path.startswith("/call/"):
+                    return self._reply(404, {"ok": False, "error": "not found"})
+                method = self.path[len("/call/"):]
+                try:
+                    req = json_loads(self.rfile.read(int(self.headers.get("Content-Length", 0) or 0)) or b"{}")
+                    result = server.call(method, req.get("args", []), req.get("kwargs", {}))
+                except KeyError:
+                    return self._reply(404, {"ok": False, "error": f"onbekende methode: {method}"})
+                except Exception as e:
+                    return self._reply(500, {"ok": False, "error": f"{type(e).__name__}: {e}", "rev": server.revision})
+                self._reply(200, {"ok": True, "result": result, "rev": server.revision})
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        httpd.daemon_threads = True
+        return httpd
+
+    def serve_forever(self, host="127.0.0.1", port=8765):
+        httpd = self.make_httpd(host, port)
+        print(f"Pedicure server op http://{host}:{httpd.server_address[1]}")
+        try:
+            httpd.serve_forever()
+        finally:
+            httpd.server_close()
 
-    def list_receipts_in_range(self, start: dt.date, end: dt.date):
-        cur = self.conn.cursor()
-        cur.execute("SELECT * FROM receipts WHERE date>=? AND date<=? ORDER BY date", (start.isoformat(), end.isoformat()))
-        return cur.fetchall()
+class RemoteStoreError(Exception):
+    pass
 
-    def list_receipts_in_range_by_client(self, start: dt.date, end: dt.date, client_id: int | None):
-        cur = self.conn.cursor()
-        if client_id:
-            cur.execute("SELECT * FROM receipts WHERE date>=? AND date<=? AND client_id=? ORDER BY date", (start.isoformat(), end.isoformat(), client_id))
+class RemoteStore:
+    """Zelfde interface als Store, maar elke oproep gaat naar een StoreServer.
+    Rijen komen terug als dicts (r['kolom'] werkt zoals bij sqlite3.Row)."""
+    def __init__(self, url: str, token: str | None = None, timeout: float = 30.0):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        # Laatst geziene serverrevisie; de agenda-cache vergelijkt hiermee.
+        self.appointments_rev = 0
+
+    def _call(self, method, *args, **kwargs):
+        import urllib.request
+        import urllib.error
+        req = urllib.request.Request(
+            f"{self.url}/call/{method}", data=json_dumps({"args": args, "kwargs": kwargs}),
+            headers={"Content-Type": "application/json", **({"X-Pedicure-Token": self.token} if self.token else {})},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                payload = json_loads(resp.read())
+        except urllib.error.HTTPError as e:
+            try:
+                payload = json_loads(e.read())
+            except Exception:
+                raise RemoteStoreError(f"{method}: HTTP {e.code}") from e
+        if "rev" in payload:
+            self.appointments_rev = payload["rev"]
+        if not payload.get("ok"):
+            raise RemoteStoreError(f"{method}: {payload.get('error')}")
+        return payload["result"]
+
+    def __getattr__(self, name):
+        if name in STORE_READ_METHODS or name in STORE_WRITE_METHODS:
+            return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+        raise AttributeError(name)
+
+def check_remote_records(store: RemoteStore) -> list[str]:
+    """Controleert dat records de rondreis overleven als dicts (r['kolom']), niet als lijsten."""
+    problems = []
+    today = dt.date.today()
+    checks = (
+        ("list_clients", lambda: store.list_clients()[:1], ("id", "name", "email")),
+        ("list_receipts_in_range_by_client",
+         lambda: store.list_receipts_in_range_by_client(dt.date(1970, 1, 1), today, None)[:1], ("id", "number", "total_cents")),
+    )
+    for name, fetch, cols in checks:
+        for row in fetch():
+            if not isinstance(row, dict) or any(c not in row for c in cols):
+                problems.append(f"{name}: {row!r}")
+            elif name == "list_receipts_in_range_by_client":
+                r, items = store.get_receipt(row['id'])
+                if not isinstance(r, dict) or r.get('number') != row['number'] or \
+                        any(not isinstance(it, dict) or "price_cents" not in it for it in items):
+                    problems.append(f"get_receipt: {r!r}, {items!r}")
+    return problems
+
+def run_load_test(desks: int = 4, rounds: int = 50, readers: int = 4) -> dict:
+    """Simuleert `desks` werkposten die tegelijk boeken en afrekenen. Draait altijd tegen
+    een eigen StoreServer op een tijdelijke databank: de test maakt echte reçus aan en
+    mag dus nooit nummers van een echte databank verbruiken."""
+    import tempfile
+    with tempfile.TemporaryDirectory(prefix="pedicure_load_") as tmp:
+        server = StoreServer(Path(tmp) / "loadtest.db", readers=readers)
+        httpd = server.make_httpd("127.0.0.1", 0)
+        threading.Thread(target=httpd.serve_forever, name="load-test-server", daemon=True).start()
+        try:
+            return _load_test_desks(f"http://127.0.0.1:{httpd.server_address[1]}", desks, rounds)
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            server.close()
+
+def _load_test_desks(url: str, desks: int, rounds: int, token: str | None = None) -> dict:
+    import random
+    seed = RemoteStore(url, token)
+    if not seed.list_manips():
+        seed.add_manip("Basis pedicure", 3500)
+    manips = seed.list_manips()
+    latencies, errors, numbers = [], [], []
+    lock = threading.Lock()
+    today = dt.date.today()
+
+    def desk(n):
+        store = RemoteStore(url, token)
+        rnd = random.Random(n)
+        store.add_client(f"Loadtest {n}", "", "", "loadtest", "nl")
+        cid = [c for c in store.list_clients() if c['name'] == f"Loadtest {n}"][-1]['id']
+        for i in range(rounds):
+            steps = (
+                lambda: store.list_appointments_in_range(today, today),
+                lambda: store.add_appointment(cid, today.isoformat(), f"{8 + i % 10:02d}:{rnd.choice(('00', '30'))}", 30, "loadtest"),
+                lambda: store.create_receipt(cid, [(m['id'], 1, m['price_cents']) for m in rnd.sample(manips, 1)]),
+                lambda: store.sum_total_in_range(today, today),
+            )
+            for step in steps:
+                t0 = time.perf_counter()
+                try:
+                    result = step()
+                except Exception as e:
+                    with lock:
+                        errors.append(str(e))
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - t0)
+                    if isinstance(result, list) and len(result) == 3 and isinstance(result[1], str):
+                        numbers.append(result[1])
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=desk, args=(n,)) for n in range(desks)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+    return {
+        "desks": desks, "calls": len(latencies), "errors": len(errors), "seconds": round(wall, 2),
+        "calls_per_s": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(pick(0.50), 1), "p95_ms": round(pick(0.95), 1), "max_ms": round(pick(1.0), 1),
+        "duplicate_numbers": len(numbers) - len(set(numbers)),
+        "record_errors": check_remote_records(seed),
+    }
+
+# ---- Achtergrondqueries ---------------------------------------------------------
+class DbWorker:
+    """Eén achtergrondthread met een eigen Store-verbinding. submit() zet een opdracht
+    (functie store -> resultaat) in de wachtrij; callback/errback lopen via after() in de
+    Tk-thread. Een nieuwere opdracht met dezelfde sleutel vervangt de oudere: die wordt
+    overgeslagen als ze nog niet liep, anders wordt haar resultaat genegeerd."""
+    def __init__(self, root, store):
+        self.root = root
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.latest = {}        # sleutel -> generatie van de laatste opdracht
+        self.pending = 0
+        self._gen = 0
+        self._polling = False
+        if isinstance(store, Store) and str(store.path) == ":memory:":
+            self.thread = None  # geen tweede verbinding mogelijk: opdrachten lopen in de Tk-thread
+            self.store = store
+            return
+        self.store = None
+        opener = (lambda: Store(store.path)) if isinstance(store, Store) else (lambda: store)
+        self.thread = threading.Thread(target=self._run, args=(opener,), name="db-worker", daemon=True)
+        self.thread.start()
+
+    def submit(self, key, fn, callback=None, errback=None) -> int:
+        self._gen += 1
+        gen = self._gen
+        if key is not None:
+            self.latest[key] = gen
+        self.pending += 1
+        if self.thread is None:
+            self.results.put(self._execute(self.store, key, gen, fn, callback, errback))
         else:
-            cur.execute("SELECT * FROM receipts WHERE date>=? AND date<=? ORDER BY date", (start.isoformat(), end.isoformat()))
-        return cur.fetchall()
+            self.jobs.put((key, gen, fn, callback, errback))
+        if not self._polling:
+            self._polling = True
+            self.root.after(10, self._poll)
+        return gen
 
-    def sum_total_in_range(self, start: dt.date, end: dt.date) -> int:
-        cur = self.conn.cursor()
-        cur.execute("SELECT COALESCE(SUM(total_cents),0) FROM receipts WHERE date>=? AND date<=?", (start.isoformat(), end.isoformat()))
-        return cur.fetchone()[0] or 0
+    def cancel(self, key):
+        self.latest.pop(key, None)
 
-    def sum_by_manipulations_in_range(self, start: dt.date, end: dt.date, client_id: int | None):
-        cur = self.conn.cursor()
-        if client_id:
-            cur.execute(
-                """
-                SELECT m.name, COALESCE(SUM(ri.qty*ri.price_cents),0) as cents
-                FROM receipts r
-                JOIN receipt_items ri ON ri.receipt_id=r.id
-                JOIN manipulations m ON m.id=ri.manipulation_id
-                WHERE r.date>=? AND r.date<=? AND r.client_id=?
-                GROUP BY m.name
-                ORDER BY m.name
-                """,
-                (start.isoformat(), end.isoformat(), client_id),
-            )
+    def stop(self):
+        if self.thread is not None:
+            self.jobs.put(None)
+
+    def _current(self, key, gen) -> bool:
+        return key is None or self.latest.get(key) == gen
+
+    def _execute(self, store, key, gen, fn, callback, errback):
+        if not self._current(key, gen):
+            return key, gen, None, None, None, None
+        try:
+            return key, gen, callback, errback, fn(store), None
+        except Exception as e:
+            return key, gen, callback, errback, None, e
+
+    def _run(self, opener):
+        store = opener()
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            self.results.put(self._execute(store, *job))
+
+    def _poll(self):
+        while True:
+            try:
+                key, gen, callback, errback, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            if not self._current(key, gen):
+                continue
+            if key is not None:
+                del self.latest[key]
+            if error is not None:
+                if errback:
+                    errback(error)
+                else:
+                    messagebox.showerror("Database", f"Opvragen mislukt: {error}")
+            elif callback:
+                callback(result)
+        if self.pending:
+            self.root.after(30, self._poll)
         else:
-            cur.execute(
-                """
-                SELECT m.name, COALESCE(SUM(ri.qty*ri.price_cents),0) as cents
-                FROM receipts r
-                JOIN receipt_items ri ON ri.receipt_id=r.id
-                JOIN manipulations m ON m.id=ri.manipulation_id
-                WHERE r.date>=? AND r.date<=?
-                GROUP BY m.name
-                ORDER BY m.name
-                """,
-                (start.isoformat(), end.isoformat()),
-            )
-        return [(row[0], row[1]) for row in cur.fetchall()]
+            self._polling = False
+
+# ---- Treeview-model -----------------------------------------------------------
+class TreeModel:
+    """Onthoudt wat een Treeview toont (iid -> values) en past bij set_rows() enkel
+    de verschillen toe: nieuwe rijen invoegen, gewijzigde bijwerken, verdwenen rijen
+    wissen. Selectie en scrollpositie blijven zo behouden."""
+    def __init__(self, tree):
+        self.tree = tree
+        self.rows = {}
+        self.order = []
+
+    def set_rows(self, rows) -> tuple[int, int, int]:
+        """rows: iterable van (iid, values) in weergavevolgorde.
+        Geeft (ingevoegd, bijgewerkt, gewist) terug."""
+        new = {}
+        for iid, values in rows:
+            values = tuple(values)
+            if None in values:
+                values = tuple("" if v is None else v for v in values)
+            new[str(iid)] = values
+        tree = self.tree
+        top = tree.yview()[0] if self.order else None
+        gone = [iid for iid in self.order if iid not in new]
+        if gone:
+            tree.delete(*gone)
+        kept = [iid for iid in self.order if iid in new]
+        order = list(new)
+        if kept != [iid for iid in order if iid in self.rows]:
+            # Volgorde van bestaande rijen gewijzigd: eerst herschikken
+            pos = 0
+            for iid in order:
+                if iid in self.rows:
+                    tree.move(iid, "", pos)
+                    pos += 1
+        inserted = updated = 0
+        remaining = len(kept)   # bestaande rijen die nog na de huidige positie komen
+        old_rows = self.rows
+        for index, (iid, values) in enumerate(new.items()):
+            old = old_rows.get(iid)
+            if old is None:
+                tree.insert("", "end" if not remaining else index, iid=iid, values=values)
+                inserted += 1
+            else:
+                remaining -= 1
+                if old != values:
+                    tree.item(iid, values=values)
+                    updated += 1
+        self.rows = new
+        self.order = order
+        if top is not None and (gone or inserted):
+            tree.yview_moveto(top)
+        return inserted, updated, len(gone)
+
+    def clear(self):
+        self.set_rows(())
+
+# ---- Instellingen -------------------------------------------------------------
+
+def _setting_percent(value) -> float:
+    v = float(value)
+    if not 0 <= v <= 100:
+        raise ValueError(f"{v} ligt niet tussen 0 en 100")
+    return v
+
+def _setting_lang(value) -> str:
+    if value not in SUPPORTED_LANGS:
+        raise ValueError(f"Onbekende taal: {value}")
+    return value
+
+def _setting_count(value) -> int:
+    v = int(value)
+    if v < 1:
+        raise ValueError(f"{v} moet minstens 1 zijn")
+    return v
+
+def _setting_bool(value) -> bool:
+    return str(value).strip().lower() in ("1", "true", "yes", "ja")
+
+# Gebruikersinstellingen: sleutel -> (parser/validator, standaard). Interne sleutels
+# (sync_*, pdf_layout) schrijft de Store zelf; die blijven via Store.get_config lopen.
+SETTINGS_SPEC = {
+    "company_name": (str, None),
+    "admin_name": (str, None),
+    "base_lang": (_setting_lang, "nl"),
+    "vat_rate": (_setting_percent, 21.0),
+    "phone_country": (str, "32"),
+    "backup_interval_h": (float, 24.0),
+    "backup_keep": (_setting_count, 7),
+    "backup_include_pdfs": (_setting_bool, False),
+    "last_backup_at": (str, None),
+}
+
+class Settings:
+    """Getypeerde instellingen: de config-tabel wordt één keer gelezen, daarna kost
+    lezen niets. set() valideert, schrijft meteen door naar de Store en verwittigt
+    alleen wie op die sleutel geabonneerd is. refresh() leest opnieuw in als een
+    andere werkpost intussen geschreven heeft."""
+    def __init__(self, store):
+        self.store = store
+        self._values = {}
+        self._subscribers = {}
+        self._stamp = None
+        self.reload()
+
+    def _current_stamp(self):
+        if isinstance(self.store, RemoteStore):
+            return self.store.appointments_rev  # serverrevisie, komt mee met elk antwoord
+        # Zoals QueryCache: data_version wijzigt enkel door commits van andere verbindingen
+        return self.store.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def reload(self):
+        self._stamp = self._current_stamp()
+        raw = self.store.all_config()
+        self._values = {key: self._parse(key, raw.get(key)) for key in SETTINGS_SPEC}
+
+    def refresh(self) -> bool:
+        """Herleest de config als de databank sinds de vorige lezing gewijzigd is en
+        verwittigt abonnees van de sleutels die anders zijn. True als er iets wijzigde."""
+        if self._current_stamp() == self._stamp:
+            return False
+        old = self._values
+        self.reload()
+        changed = [key for key in SETTINGS_SPEC if self._values[key] != old.get(key)]
+        for key in changed:
+            for callback in list(self._subscribers.get(key, ())):
+                callback(key, self._values[key])
+        return bool(changed)
+
+    @staticmethod
+    def _parse(key, raw):
+        parse, default = SETTINGS_SPEC[key]
+        if raw is None or raw == "":
+            return default
+        try:
+            return parse(raw)
+        except (TypeError, ValueError):
+            return default  # ongeldige waarde in de databank: standaard gebruiken
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def get(self, key, default=None):
+        value = self._values.get(key)
+        return default if value is None else value
+
+    def set(self, key, value):
+        """Valideert en bewaart `value`; ValueError bij een ongeldige waarde."""
+        parse, _default = SETTINGS_SPEC[key]
+        value = parse(value) if value is not None else None
+        if value == self._values.get(key):
+            return value
+        raw = None if value is None else ("1" if value else "0") if isinstance(value, bool) else str(value)
+        self.store.set_config(key, raw)
+        self._values[key] = value
+        for callback in list(self._subscribers.get(key, ())):
+            callback(key, value)
+        return value
+
+    def update(self, **values):
+        """Meerdere sleutels tegelijk: eerst alles valideren, dan schrijven."""
+        for key, value in values.items():
+            if value is not None:
+                SETTINGS_SPEC[key][0](value)
+        for key, value in values.items():
+            self.set(key, value)
+
+    def subscribe(self, keys, callback):
+        """callback(key, value) bij elke wijziging van een van `keys`; geeft een afmeldfunctie terug."""
+        for key in keys:
+            self._subscribers.setdefault(key, []).append(callback)
+
+        def unsubscribe():
+            for key in keys:
+                if callback in self._subscribers.get(key, ()):
+                    self._subscribers[key].remove(callback)
+        return unsubscribe
+
+    def company(self) -> Company | None:
+        name, admin = self["company_name"], self["admin_name"]
+        if name and admin:
+            return Company(name=name, admin=admin, base_lang=self["base_lang"])
+        return None
 
 # ---- UI ---------------------------------------------------------------------
 class App(tk.Tk):
-    def __init__(self):
+    def __init__(self, store=None):
         super().__init__()
-        self.store = Store()
-        self.company = self.store.get_company()
+        self.store = store or Store()
+        self.db = DbWorker(self, self.store)
+        self.settings = Settings(self.store)
+        self.company = self.settings.company()
         self.lang = self.company.base_lang if self.company else "nl"
+        self.settings.subscribe(("base_lang",), self._on_lang_changed)
+        self.settings.subscribe(("company_name", "admin_name"), lambda key, value: setattr(self, "company", self.settings.company()))
         self.title(self.tr("app_title"))
         self.geometry("1120x780")
         self.minsize(1000, 680)
@@ -585,8 +4010,24 @@ class App(tk.Tk):
         self._build_tabs()
         self.refresh_totals()
 
+        self.backups = BackupRunner()
+        self.after(60_000, self._backup_tick)
+        self.after(5_000, self._settings_tick)
+        self.scheduler = None
+        if isinstance(self.store, Store) and str(self.store.path) != ":memory:":
+            self.scheduler = Scheduler(self.store.path)
+            self.scheduler.start()
+        if not isinstance(self.store, RemoteStore) and self.store.get_config("pdf_layout") != "sharded":
+            self._start_pdf_migration()
+
+    def destroy(self):
+        self.db.stop()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        super().destroy()
+
     def tr(self, key):
-        return T.get(self.lang, T["nl"]).get(key, key)
+        return translate(self.lang, key)
 
     def _build_menu(self):
         menubar = tk.Menu(self)
@@ -598,31 +4039,184 @@ class App(tk.Tk):
         # Settings
         settings = tk.Menu(menubar, tearoff=0)
         settings.add_command(label=self.tr("set_vat"), command=self.set_vat_dialog)
+        settings.add_command(label=self.tr("close_year"), command=self.close_year_dialog)
+        settings.add_command(label=self.tr("archive_year"), command=self.archive_year_dialog)
+        settings.add_command(label=self.tr("backup_now"), command=lambda: self.start_backup(manual=True))
+        settings.add_command(label=self.tr("pack_pdfs"), command=self.pack_pdfs)
+        settings.add_command(label=self.tr("job_history"), command=lambda: JobHistoryDialog(self))
+        settings.add_separator()
+        settings.add_command(label=self.tr("sync_export"), command=self.sync_export_dialog)
+        settings.add_command(label=self.tr("sync_import"), command=self.sync_import_dialog)
         menubar.add_cascade(label=self.tr("settings"), menu=settings)
         self.config(menu=menubar)
 
     def set_lang(self, code):
         if code in SUPPORTED_LANGS:
-            self.lang = code
-            self.store.set_config("base_lang", code)
-            self.title(self.tr("app_title"))
-            for tab in (self.tab_dashboard, self.tab_agenda, self.tab_clients, self.tab_prices, self.tab_receipts):
-                if hasattr(tab, 'refresh_labels'):
-                    tab.refresh_labels()
-            self._build_menu()
+            self.settings.set("base_lang", code)
+
+    def _on_lang_changed(self, key, code):
+        # Alleen teksten: tabs abonneren zelf op base_lang en vragen niets opnieuw op
+        self.lang = code
+        if self.company:
+            self.company.base_lang = code
+        self.title(self.tr("app_title"))
+        self._build_menu()
+        if hasattr(self, "nb"):
+            for tab, label in zip(self.nb.tabs(), ("dashboard", "agenda", "clients", "pricelist", "receipts", "analytics")):
+                self.nb.tab(tab, text=self.tr(label))
 
     def set_vat_dialog(self):
-        cur = self.store.get_config("vat_rate", "21")
-        val = simpledialog.askstring(self.tr("set_vat"), f"{self.tr('vat')} %:", initialvalue=str(cur))
+        val = simpledialog.askstring(self.tr("set_vat"), f"{self.tr('vat')} %:", initialvalue=f"{self.settings['vat_rate']:g}")
         try:
             if val is not None:
-                nv = float(val)
-                if nv < 0 or nv > 100:
-                    raise ValueError
-                self.store.set_config("vat_rate", val)
-        except Exception:
+                self.settings.set("vat_rate", val.replace(",", "."))
+        except ValueError:
             messagebox.showerror(self.tr("set_vat"), "Ongeldige waarde")
 
+    # Back-ups: config backup_interval_h (standaard 24), backup_keep (7), backup_include_pdfs (0/1)
+    def _backup_tick(self):
+        if isinstance(self.store, RemoteStore):
+            return  # back-ups gebeuren op de server
+        interval = self.settings["backup_interval_h"]
+        last = self.settings["last_backup_at"]
+        due = True
+        if last:
+            try:
+                due = dt.datetime.now() - dt.datetime.fromisoformat(last) >= dt.timedelta(hours=interval)
+            except ValueError:
+                pass
+        if interval > 0 and due:
+            self.start_backup()
+        self.after(30 * 60_000, self._backup_tick)
+
+    def _settings_tick(self):
+        # Instellingen die op een andere werkpost gewijzigd zijn, hier ook doorvoeren
+        self.settings.refresh()
+        self.after(5_000, self._settings_tick)
+
+    def start_backup(self, manual=False):
+        if self.backups.start(keep=self.settings["backup_keep"], include_pdfs=self.settings["backup_include_pdfs"]):
+            self.after(500, lambda: self._poll_backup(manual))
+        elif manual:
+            messagebox.showinfo(self.tr("backup_now"), "Er loopt al een back-up.")
+
+    def _poll_backup(self, manual):
+        if self.backups.running:
+            self.after(500, lambda: self._poll_backup(manual))
+            return
+        if self.backups.error is not None:
+            messagebox.showerror(self.tr("backup_now"), f"Back-up mislukt: {self.backups.error}")
+            return
+        self.settings.set("last_backup_at", dt.datetime.now().isoformat(timespec="seconds"))
+        if manual:
+            messagebox.showinfo(self.tr("backup_now"), f"Back-up opgeslagen: {self.backups.result}")
+
+    def sync_export_dialog(self):
+        since = simpledialog.askinteger(self.tr("sync_export"), "Sinds volgnummer:", initialvalue=int(self.store.get_config("sync_exported_seq", "0") or 0), minvalue=0)
+        if since is None:
+            return
+        path = filedialog.asksaveasfilename(title=self.tr("sync_export"), defaultextension=".pedsync",
+                                            initialfile=f"delta_{dt.date.today():%Y%m%d}.pedsync", filetypes=[("Delta", "*.pedsync")])
+        if not path:
+            return
+        header = self.store.export_changes(path, since)
+        messagebox.showinfo(self.tr("sync_export"), f"{header['count']} wijzigingen ({header['from_seq']} → {header['to_seq']}) opgeslagen: {path}")
+
+    def sync_import_dialog(self):
+        path = filedialog.askopenfilename(title=self.tr("sync_import"), filetypes=[("Delta", "*.pedsync"), ("*", "*")])
+        if not path:
+            return
+        try:
+            stats = self.store.import_changes(path)
+        except Exception as e:
+            messagebox.showerror(self.tr("sync_import"), f"Import mislukt: {e}")
+            return
+        messagebox.showinfo(self.tr("sync_import"), ", ".join(f"{k}: {v}" for k, v in stats.items()))
+        for tab in (self.tab_agenda, self.tab_clients, self.tab_prices, self.tab_receipts):
+            for name in ("refresh", "refresh_list"):
+                if hasattr(tab, name):
+                    getattr(tab, name)()
+        self.refresh_totals()
+
+    def pack_pdfs(self):
+        """Maandpakketten maken in de achtergrond (eigen verbinding)."""
+        if isinstance(self.store, RemoteStore):
+            messagebox.showinfo(self.tr("pack_pdfs"), "PDF's inpakken kan enkel op de computer met de databank.")
+            return
+        path = self.store.path
+        result = {}
+
+        def work():
+            try:
+                result.update(pack_closed_months(Store(path)))
+            except Exception as e:
+                result["error"] = e
+
+        t = threading.Thread(target=work, name="pdf-pack", daemon=True)
+        t.start()
+
+        def poll():
+            if t.is_alive():
+                self.after(300, poll)
+            elif "error" in result:
+                messagebox.showerror(self.tr("pack_pdfs"), f"Inpakken mislukt: {result['error']}")
+            else:
+                messagebox.showinfo(self.tr("pack_pdfs"), f"{result['packed']} PDF's in {result['months']} maandpakket(ten)")
+
+        self.after(300, poll)
+
+    def _start_pdf_migration(self):
+        """Oude platte PDF-map in de achtergrond naar jaar/maand verhuizen (eigen verbinding)."""
+        path = self.store.path
+        result = {}
+
+        def work():
+            try:
+                migrate_pdf_layout(Store(path))
+            except Exception as e:
+                result["error"] = e
+
+        t = threading.Thread(target=work, name="pdf-migration", daemon=True)
+        t.start()
+
+        def poll():
+            if t.is_alive():
+                self.after(1000, poll)
+            elif "error" in result:
+                messagebox.showwarning("PDF's", f"PDF-migratie onderbroken (wordt bij volgende start hervat): {result['error']}")
+
+        self.after(1000, poll)
+
+    def close_year_dialog(self):
+        last_closed = dt.date.today().year - 1
+        year = simpledialog.askinteger(self.tr("close_year"), self.tr("close_year_prompt"), initialvalue=last_closed, maxvalue=last_closed)
+        if year is None:
+            return
+        if not messagebox.askyesno(self.tr("confirm"), f"Boekjaar {year} afsluiten? Reçus van {year} kunnen daarna niet meer gewijzigd worden."):
+            return
+        try:
+            totals = self.store.close_year(year)
+        except Exception as e:
+            messagebox.showerror(self.tr("close_year"), f"Afsluiten mislukt: {e}")
+            return
+        messagebox.showinfo(self.tr("close_year"),
+                            f"Boekjaar {year} afgesloten.\nReçus: {totals['n']}\nBruto: € {cents_to_money(totals['gross'])}\n"
+                            f"Netto: € {cents_to_money(totals['net'])}\nBtw: € {cents_to_money(totals['vat'])}")
+
+    def archive_year_dialog(self):
+        last_closed = dt.date.today().year - 1
+        year = simpledialog.askinteger(self.tr("archive_year"), self.tr("archive_year_prompt"), initialvalue=last_closed, maxvalue=last_closed)
+        if year is None:
+            return
+        if not messagebox.askyesno(self.tr("confirm"), self.tr("are_you_sure")):
+            return
+        try:
+            path = self.store.archive_year(year)
+        except Exception as e:
+            messagebox.showerror(self.tr("archive_year"), f"Archiveren mislukt: {e}")
+            return
+        messagebox.showinfo(self.tr("archive_year"), f"Archief opgeslagen: {path}")
+
     def first_run_wizard(self):
         messagebox.showinfo(self.tr("first_run_title"), self.tr("enter_company"))
         cname = simpledialog.askstring(self.tr("company"), self.tr("enter_company")) or "Mijn Pedicure"
@@ -630,12 +4224,8 @@ class App(tk.Tk):
         blang = simpledialog.askstring(self.tr("language"), self.tr("choose_lang")) or "nl"
         if blang not in SUPPORTED_LANGS:
             blang = "nl"
-        self.store.set_config("company_name", cname)
-        self.store.set_config("admin_name", aname)
-        self.store.set_config("base_lang", blang)
-        self.store.set_config("vat_rate", "21")
-        self.company = self.store.get_company()
         self.lang = blang
+        self.settings.update(company_name=cname, admin_name=aname, base_lang=blang, vat_rate=21)
 
         messagebox.showinfo(self.tr("first_run_title"), self.tr("enter_manip_list"))
         defaults = [
@@ -655,16 +4245,71 @@ class App(tk.Tk):
         self.tab_clients = ClientsTab(self)
         self.tab_prices = PricesTab(self)
         self.tab_receipts = ReceiptsTab(self)
+        self.tab_analytics = AnalyticsTab(self)
 
         self.nb.add(self.tab_dashboard, text=self.tr("dashboard"))
         self.nb.add(self.tab_agenda, text=self.tr("agenda"))
         self.nb.add(self.tab_clients, text=self.tr("clients"))
         self.nb.add(self.tab_prices, text=self.tr("pricelist"))
         self.nb.add(self.tab_receipts, text=self.tr("receipts"))
+        self.nb.add(self.tab_analytics, text=self.tr("analytics"))
 
     def refresh_totals(self):
         self.tab_dashboard.update_totals()
 
+class JobHistoryDialog(tk.Toplevel):
+    """Rooster en laatste runs van de geplande taken (zie Scheduler)."""
+    def __init__(self, app: App):
+        super().__init__(app)
+        self.app = app
+        self.title(app.tr("job_history"))
+        self.geometry("900x520")
+
+        top = ttk.Frame(self)
+        top.pack(fill=tk.X, padx=8, pady=6)
+        ttk.Button(top, text=app.tr("run_now"), command=self.run_now).pack(side=tk.LEFT)
+        ttk.Button(top, text=app.tr("refresh"), command=self.refresh).pack(side=tk.LEFT, padx=4)
+
+        self.jobs = ttk.Treeview(self, columns=("job", "next_run", "last_run"), show="headings", height=5)
+        for col, w in (("job", 260), ("next_run", 200), ("last_run", 200)):
+            self.jobs.heading(col, text=app.tr(col))
+            self.jobs.column(col, width=w)
+        self.jobs.pack(fill=tk.X, padx=8)
+        self.runs = ttk.Treeview(self, columns=("job", "started", "duration", "status", "result"), show="headings")
+        for col, key, w in (("job", "job", 200), ("started", "job_started", 160), ("duration", "job_duration", 70),
+                            ("status", "job_status", 70), ("result", "job_result", 380)):
+            self.runs.heading(col, text=app.tr(key))
+            self.runs.column(col, width=w)
+        self.runs.pack(fill=tk.BOTH, expand=True, padx=8, pady=6)
+        self.jobs_model, self.runs_model = TreeModel(self.jobs), TreeModel(self.runs)
+        self.refresh()
+
+    def refresh(self):
+        def fill(result):
+            jobs, runs = result
+            self.jobs_model.set_rows((j['name'], (self.app.tr("job_" + j['name']), j['next_run'], j['last_run'] or ""))
+                                     for j in jobs)
+            self.runs_model.set_rows((r['id'], (self.app.tr("job_" + r['job']), r['started_at'], self._duration(r),
+                                                r['status'], r['result'] or "")) for r in runs)
+        self.app.db.submit("job-history", lambda store: (store.list_jobs(), store.job_runs()), fill)
+
+    @staticmethod
+    def _duration(run) -> str:
+        if not run['finished_at']:
+            return ""
+        secs = (dt.datetime.fromisoformat(run['finished_at']) - dt.datetime.fromisoformat(run['started_at'])).total_seconds()
+        return f"{secs:.0f} s"
+
+    def run_now(self):
+        sel = self.jobs.selection()
+        if not sel:
+            return
+        for name in sel:
+            self.app.store.set_job_due(name)
+        if self.app.scheduler is not None:
+            self.app.scheduler.wake()
+        self.after(2000, self.refresh)
+
 # ---- Dashboard ---------------------------------------------------------------
 class DashboardTab(ttk.Frame):
     def __init__(self, app: App):
@@ -683,20 +4328,30 @@ class DashboardTab(ttk.Frame):
         self.btn_week = ttk.Button(btn_frame, text=self.app.tr("print_week"), command=self.print_week)
         self.btn_month = ttk.Button(btn_frame, text=self.app.tr("print_month"), command=self.print_month)
         self.btn_year = ttk.Button(btn_frame, text=self.app.tr("print_year"), command=self.print_year)
-        for b in (self.btn_day, self.btn_week, self.btn_month, self.btn_year):
+        self.btn_close_day = ttk.Button(btn_frame, text=self.app.tr("close_day"), command=self.close_day)
+        for b in (self.btn_day, self.btn_week, self.btn_month, self.btn_year, self.btn_close_day):
             b.pack(side=tk.LEFT, padx=6)
+        self._totals = None
 
         self.refresh_labels()
+        app.settings.subscribe(("base_lang",), lambda key, value: self.refresh_labels())
 
     def refresh_labels(self):
         self.btn_day.config(text=self.app.tr("print_day"))
         self.btn_week.config(text=self.app.tr("print_week"))
         self.btn_month.config(text=self.app.tr("print_month"))
         self.btn_year.config(text=self.app.tr("print_year"))
-        self.update_totals()
+        self.btn_close_day.config(text=self.app.tr("close_day"))
+        if self._totals is None:
+            self.update_totals()
+        else:
+            self._show_totals(self._totals)  # taalwissel: laatste totalen opnieuw tonen
 
     def update_totals(self):
-        store = self.app.store
+        self.app.db.submit("dashboard-totals", self._load_totals, self._show_totals)
+
+    @staticmethod
+    def _load_totals(store):
         today = dt.date.today()
         start_week = today - dt.timedelta(days=today.weekday())
         end_week = start_week + dt.timedelta(days=6)
@@ -709,44 +4364,71 @@ class DashboardTab(ttk.Frame):
         t_week = store.sum_total_in_range(start_week, end_week)
         t_month = store.sum_total_in_range(start_month, end_month)
         t_year = store.sum_total_in_range(start_year, today)
+        return t_day, t_week, t_month, t_year
 
+    def _show_totals(self, totals):
+        self._totals = totals
+        t_day, t_week, t_month, t_year = totals
         self.lbl_today.config(text=f"{self.app.tr('totals_today')}: € {cents_to_money(t_day)}")
         self.lbl_week.config(text=f"{self.app.tr('totals_week')}: € {cents_to_money(t_week)}")
         self.lbl_month.config(text=f"{self.app.tr('totals_month')}: € {cents_to_money(t_month)}")
         self.lbl_year.config(text=f"{self.app.tr('totals_year')}: € {cents_to_money(t_year)}")
 
     def _print_range(self, start: dt.date, end: dt.date, title: str):
-        receipts = self.app.store.list_receipts_in_range(start, end)
-        if not receipts:
-            messagebox.showinfo(title, "Geen reçus in deze periode.")
-            return
         if pdfcanvas is None:
             messagebox.showerror(title, self.app.tr("no_pdf"))
             return
         comp_slug = (self.app.company.name or "firma").lower().replace(" ", "_")
-        fname = PDF_DIR / f"{comp_slug}_summary_{title.replace(' ', '_')}_{start}_{end}.pdf"
-        c = pdfcanvas.Canvas(str(fname), pagesize=A4)
-        width, height = A4
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(25*mm, height-25*mm, f"{self.app.company.name} – {title}")
-        c.setFont("Helvetica", 10)
-        y = height-35*mm
-        total = 0
-        for r in receipts:
-            c.drawString(25*mm, y, f"{r['date']}  #{r['number']}  € {cents_to_money(r['total_cents'])}")
-            y -= 6*mm
-            total += r['total_cents']
-            if y < 25*mm:
-                c.showPage(); y = height-25*mm
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(25*mm, 20*mm, f"Totaal: € {cents_to_money(total)}")
-        c.save()
-        messagebox.showinfo(title, f"PDF opgeslagen: {fname}")
+        fname = pdf_target(f"{comp_slug}_summary_{title.replace(' ', '_')}_{start}_{end}.pdf", start)
+        heading = f"{self.app.company.name} – {title}"
+        context = (self.app.company.name, self.app.company.admin, self.app.lang)
+        vat_rate = self.app.settings["vat_rate"]
+
+        def work(store):
+            receipts = store.list_receipts_in_range(start, end)
+            if not receipts:
+                return None
+            inputs = (context, vat_rate, heading, [(r['date'], r['number'], r['total_cents']) for r in receipts])
+            return cached_render(store, "summary", inputs, lambda: render_receipt_list_pdf(fname, heading, receipts))
+
+        def done(path):
+            if path is None:
+                messagebox.showinfo(title, "Geen reçus in deze periode.")
+            else:
+                messagebox.showinfo(title, f"PDF opgeslagen: {path}")
+
+        self.app.db.submit(None, work, done)
 
     def print_day(self):
         d = dt.date.today()
         self._print_range(d, d, self.app.tr("print_day"))
 
+    def close_day(self):
+        """Dagafsluiting: legt de totalen van vandaag vast en maakt het Z-rapport."""
+        if pdfcanvas is None:
+            messagebox.showerror(self.app.tr("close_day"), self.app.tr("no_pdf"))
+            return
+        today = dt.date.today()
+        company = self.app.company
+        labels = {"title": self.app.tr("z_report"), "subtotal": self.app.tr("subtotal_by_manip"), "vat": self.app.tr("vat")}
+        comp_slug = (company.name or "firma").lower().replace(" ", "_")
+
+        def work(store):
+            closure = store.close_day(today)
+            if not closure['n']:
+                return None
+            fname = pdf_target(f"{comp_slug}_z_report_{today}_{closure['runs']}.pdf", today)
+            inputs = ((company.name, company.admin, self.app.lang), labels, closure)
+            return cached_render(store, "z_report", inputs, lambda: render_z_report_pdf(fname, company, closure, labels))
+
+        def done(path):
+            if path is None:
+                messagebox.showinfo(self.app.tr("close_day"), "Geen reçus vandaag.")
+            else:
+                messagebox.showinfo(self.app.tr("close_day"), f"PDF opgeslagen: {path}")
+
+        self.app.db.submit(None, work, done)
+
     def print_week(self):
         today = dt.date.today()
         start = today - dt.timedelta(days=today.weekday())
@@ -778,6 +4460,8 @@ class AgendaTab(ttk.Frame):
         top = ttk.Frame(self)
         top.pack(fill=tk.X, padx=8, pady=6)
         ttk.Button(top, text=self.app.tr("new_appointment"), command=self.new_appointment).pack(side=tk.LEFT)
+        self.btn_checkout = ttk.Button(top, text=self.app.tr("checkout_day"), command=self.checkout_day)
+        self.btn_checkout.pack(side=tk.LEFT, padx=4)
 
         body = ttk.Frame(self)
         body.pack(fill=tk.BOTH, expand=True)
@@ -786,15 +4470,24 @@ class AgendaTab(ttk.Frame):
 
         right = ttk.Frame(body)
         right.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.tree = ttk.Treeview(right, columns=("date","time","client","notes"), show="headings")
-        for col, w in (("date",140),("time",80),("client",220),("notes",400)):
+        self.tree = ttk.Treeview(right, columns=("date","time","client","notes","billed"), show="headings")
+        for col, w in (("date",140),("time",80),("client",220),("notes",400),("billed",70)):
             self.tree.heading(col, text=col.capitalize())
             self.tree.column(col, width=w)
         self.tree.pack(fill=tk.BOTH, expand=True)
+        self.model = TreeModel(self.tree)
+
+        # Per-dag cache van de zichtbare maand(en): {(jaar, maand): {"YYYY-MM-DD": [rijen]}}
+        self._month_cache = {}
+        self._month_waiters = {}    # (jaar, maand) -> callbacks terwijl de maand laadt
+        self._cache_rev = None
+        self.cal.tag_config("busy", background="#f4a261", foreground="black")
 
         self.cal.bind("<<CalendarSelected>>", lambda e: self.refresh_list())
+        self.cal.bind("<<CalendarMonthChanged>>", self._on_month_changed)
         self.tree.bind("<Delete>", self.delete_selected)
         self.refresh_labels()
+        app.settings.subscribe(("base_lang",), lambda key, value: self.refresh_labels())
         self.refresh_list()
 
     def refresh_labels(self):
@@ -802,15 +4495,102 @@ class AgendaTab(ttk.Frame):
         self.tree.heading("time", text=self.app.tr("time"))
         self.tree.heading("client", text=self.app.tr("name"))
         self.tree.heading("notes", text=self.app.tr("notes"))
+        self.tree.heading("billed", text=self.app.tr("billed"))
+        self.btn_checkout.config(text=self.app.tr("checkout_day"))
+
+    def _month_rows(self, year: int, month: int, then=None) -> dict | None:
+        """Afspraken van een hele maand, per dag gegroepeerd; één query per maand.
+        Staat de maand nog niet in de cache, dan wordt ze op de achtergrond geladen,
+        geeft dit None terug en volgt then() zodra ze er is."""
+        if self._cache_rev != self.app.store.appointments_rev:
+            self._month_cache.clear()
+            self._cache_rev = self.app.store.appointments_rev
+        key = (year, month)
+        if key in self._month_cache:
+            return self._month_cache[key]
+        waiters = self._month_waiters.get(key)
+        if waiters is not None:     # wordt al geladen
+            if then:
+                waiters.append(then)
+            return None
+        self._month_waiters[key] = [then] if then else []
+        rev = self._cache_rev
+
+        def work(store):
+            start, end = month_bounds(dt.date(year, month, 1))
+            by_day = {}
+            for r in store.list_appointments_in_range(start, end):
+                by_day.setdefault(r['date'], []).append(r)
+            return by_day
+
+        def done(by_day):
+            if rev == self._cache_rev:
+                self._month_cache[key] = by_day
+                self._mark_busy_days()
+            for fn in self._month_waiters.pop(key, []):
+                fn()
+
+        def failed(error):
+            self._month_waiters.pop(key, None)
+            messagebox.showerror("Database", f"Opvragen mislukt: {error}")
+
+        self.app.db.submit(None, work, done, failed)
+        return None
 
-    def refresh_list(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
+    def _mark_busy_days(self):
+        self.cal.calevent_remove('all')
+        for by_day in self._month_cache.values():
+            for day, rows in by_day.items():
+                try:
+                    d = dt.date.fromisoformat(day)
+                except ValueError:
+                    continue
+                self.cal.calevent_create(d, f"{len(rows)}", tags="busy")
+
+    def _on_month_changed(self, event=None):
+        month, year = self.cal.get_displayed_month()
+        self._month_rows(year, month)
+
+    def _selected_day(self) -> dt.date:
         sel = self.cal.selection_get() if hasattr(self.cal,"selection_get") else dt.date.today()
-        day = sel if isinstance(sel, dt.date) else dt.date.today()
-        rows = self.app.store.list_appointments_in_range(day, day)
-        for r in rows:
-            self.tree.insert('', 'end', iid=r['id'], values=(r['date'], r['time'], r['client_name'] or "", r['notes'] or ""))
+        return sel if isinstance(sel, dt.date) else dt.date.today()
+
+    def refresh_list(self):
+        day = self._selected_day()
+        by_day = self._month_rows(day.year, day.month, then=self.refresh_list)
+        if by_day is None:
+            return
+        rows = by_day.get(day.isoformat(), [])
+        self.model.set_rows((r['id'], (r['date'], r['time'], r['client_name'], r['notes'],
+                                       "\u2713" if r['receipt_id'] else "")) for r in rows)
+
+    def checkout_day(self):
+        """Rekent alle nog open afspraken van de gekozen dag af: één reçu per afspraak
+        met de geplande manipulaties. De PDF's worden daarna op de achtergrond gemaakt."""
+        day = self._selected_day()
+        if day > dt.date.today():
+            messagebox.showerror(self.app.tr("checkout_day"), "Afspraken in de toekomst kunnen nog niet afgerekend worden.")
+            return
+        if not messagebox.askyesno(self.app.tr("confirm"), f"Alle open afspraken van {day.isoformat()} afrekenen?"):
+            return
+        company, lang, vat_rate = self.app.company, self.app.lang, self.app.settings["vat_rate"]
+        labels = {k: self.app.tr(k) for k in RECEIPT_LABEL_KEYS}
+
+        def done(result):
+            receipts = result["receipts"]
+            self.refresh_list()
+            self.app.refresh_totals()
+            total = sum(t for _rid, _n, t in receipts)
+            msg = f"{len(receipts)} reçus aangemaakt, totaal € {cents_to_money(total)}."
+            if result["skipped"]:
+                msg += f"\n{result['skipped']} afspraken zonder geplande manipulaties overgeslagen."
+            messagebox.showinfo(self.app.tr("checkout_day"), msg)
+            if receipts and pdfcanvas is not None:
+                rids = [rid for rid, _n, _t in receipts]
+                self.app.db.submit(None, lambda store: render_receipt_pdfs(store, rids, company, lang, labels, vat_rate))
+
+        self.app.db.submit(None, lambda store: store.checkout_day(day), done,
+                           lambda error: messagebox.showerror(self.app.tr("checkout_day"), f"Afrekenen mislukt: {error}"))
 
     def new_appointment(self):
         dlg = AppointmentDialog(self.app, self)
@@ -824,7 +4604,17 @@ class AgendaTab(ttk.Frame):
         if not messagebox.askyesno(self.app.tr("confirm"), self.app.tr("are_you_sure")):
             return
         for iid in sel:
-            self.app.store.delete_appointment(int(iid))
+            if iid.startswith("R"):
+                rule_id, day = iid[1:].split(":", 1)
+                only_this = messagebox.askyesnocancel(self.app.tr("confirm"), self.app.tr("delete_occurrence_only"))
+                if only_this is None:
+                    continue
+                if only_this:
+                    self.app.store.set_occurrence_exception(int(rule_id), day)
+                else:
+                    self.app.store.delete_appointment_rule(int(rule_id))
+            else:
+                self.app.store.delete_appointment(int(iid))
         self.refresh_list()
 
 class AppointmentDialog(tk.Toplevel):
@@ -863,8 +4653,27 @@ class AppointmentDialog(tk.Toplevel):
         self.e_notes = ttk.Entry(frm, width=40)
         self.e_notes.grid(row=4, column=1, sticky="w")
 
+        # Herhaling (leeg = eenmalige afspraak)
+        ttk.Label(frm, text=app.tr("repeat_weeks")).grid(row=5, column=0, sticky="e", padx=6, pady=4)
+        self.e_repeat = ttk.Entry(frm, width=6)
+        self.e_repeat.grid(row=5, column=1, sticky="w")
+        ttk.Label(frm, text=app.tr("repeat_until")).grid(row=6, column=0, sticky="e", padx=6, pady=4)
+        self.e_until = ttk.Entry(frm, width=12)
+        self.e_until.grid(row=6, column=1, sticky="w")
+        ttk.Label(frm, text=app.tr("repeat_count")).grid(row=7, column=0, sticky="e", padx=6, pady=4)
+        self.e_count = ttk.Entry(frm, width=6)
+        self.e_count.grid(row=7, column=1, sticky="w")
+
+        # Geplande manipulaties; checkout_day maakt hiermee de reçu
+        ttk.Label(frm, text=app.tr("select_manips")).grid(row=8, column=0, sticky="ne", padx=6, pady=4)
+        self.manips = app.store.list_manips()
+        self.lb_manips = tk.Listbox(frm, selectmode=tk.MULTIPLE, width=50, height=6, exportselection=False)
+        for m in self.manips:
+            self.lb_manips.insert(tk.END, f"{m['id']} | {m['name']} | € {cents_to_money(m['price_cents'])}")
+        self.lb_manips.grid(row=8, column=1, sticky="w")
+
         btns = ttk.Frame(frm)
-        btns.grid(row=5, column=0, columnspan=2, pady=10)
+        btns.grid(row=9, column=0, columnspan=2, pady=10)
         ttk.Button(btns, text=app.tr("save"), command=self.save).pack(side=tk.LEFT, padx=6)
         ttk.Button(btns, text=app.tr("cancel"), command=self.destroy).pack(side=tk.LEFT, padx=6)
 
@@ -879,7 +4688,22 @@ class AppointmentDialog(tk.Toplevel):
                 cid = int(self.cb_client.get().split(":",1)[0])
             except:
                 cid = None
-        self.app.store.add_appointment(cid, date, time, dur, notes)
+        try:
+            weeks = int(self.e_repeat.get().strip() or 0)
+            count = int(self.e_count.get().strip() or 0) or None
+            until = self.e_until.get().strip() or None
+            if until:
+                until = dt.date.fromisoformat(until).isoformat()
+            if weeks > 0:
+                dt.date.fromisoformat(date)
+        except ValueError:
+            messagebox.showerror(self.app.tr("new_appointment"), "Ongeldige herhaling")
+            return
+        items = [(self.manips[idx]['id'], 1) for idx in self.lb_manips.curselection()]
+        if weeks > 0:
+            self.app.store.add_appointment_rule(cid, date, time, dur, notes, weeks, until, count, items=items)
+        else:
+            self.app.store.add_appointment(cid, date, time, dur, notes, items=items)
         self.destroy()
 
 # ---- Clients ----------------------------------------------------------------
@@ -892,14 +4716,21 @@ class ClientsTab(ttk.Frame):
         ttk.Button(top, text=self.app.tr("add"), command=self.add).pack(side=tk.LEFT)
         ttk.Button(top, text=self.app.tr("edit"), command=self.edit).pack(side=tk.LEFT, padx=4)
         ttk.Button(top, text=self.app.tr("delete"), command=self.delete).pack(side=tk.LEFT, padx=4)
+        self.btn_import = ttk.Button(top, text=self.app.tr("import_clients"), command=self.import_file)
+        self.btn_import.pack(side=tk.LEFT, padx=(16,4))
+        self.lbl_import = ttk.Label(top)
+        self.lbl_import.pack(side=tk.LEFT, padx=4)
+        self._import = None
 
         self.tree = ttk.Treeview(self, columns=("name","email","phone","lang","notes"), show="headings")
         for col, w in (("name",200),("email",200),("phone",120),("lang",60),("notes",360)):
             self.tree.heading(col, text=col.capitalize())
             self.tree.column(col, width=w)
         self.tree.pack(fill=tk.BOTH, expand=True)
+        self.model = TreeModel(self.tree)
 
         self.refresh_labels()
+        app.settings.subscribe(("base_lang",), lambda key, value: self.refresh_labels())
         self.refresh()
 
     def refresh_labels(self):
@@ -910,10 +4741,8 @@ class ClientsTab(ttk.Frame):
         self.tree.heading("notes", text=self.app.tr("notes"))
 
     def refresh(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        for c in self.app.store.list_clients():
-            self.tree.insert('', 'end', iid=c['id'], values=(c['name'], c['email'] or "", c['phone'] or "", c['lang'], c['notes'] or ""))
+        self.app.db.submit("clients-tab", lambda store: store.list_clients(), lambda rows: self.model.set_rows(
+            (c['id'], (c['name'], c['email'], c['phone'], c['lang'], c['notes'])) for c in rows))
 
     def add(self):
         dlg = ClientDialog(self.app, self)
@@ -940,6 +4769,48 @@ class ClientsTab(ttk.Frame):
             self.app.store.delete_client(int(iid))
         self.refresh()
 
+    def import_file(self):
+        if self._import is not None:
+            return
+        path = filedialog.askopenfilename(title=self.app.tr("import_clients"),
+                                          filetypes=[("CSV / vCard", "*.csv *.vcf"), ("*", "*")])
+        if not path:
+            return
+        state = self._import = {"progress": (0, 0.0), "result": None, "error": None}
+        local = isinstance(self.app.store, Store)
+        db_path = self.app.store.path if local else None
+
+        def work():
+            try:
+                store = Store(db_path) if local else self.app.store
+                state["result"] = import_clients(store, path, progress=lambda n, f: state.update(progress=(n, f)))
+            except Exception as e:
+                state["error"] = e
+
+        self.btn_import.state(["disabled"])
+        threading.Thread(target=work, name="client-import", daemon=True).start()
+        self.after(200, self._poll_import)
+
+    def _poll_import(self):
+        state = self._import
+        if state["result"] is None and state["error"] is None:
+            n, frac = state["progress"]
+            self.lbl_import.config(text=f"{n} ({frac:.0%})")
+            self.after(200, self._poll_import)
+            return
+        self._import = None
+        self.btn_import.state(["!disabled"])
+        self.lbl_import.config(text="")
+        if state["error"] is not None:
+            messagebox.showerror(self.app.tr("import_clients"), f"Import mislukt: {state['error']}")
+            return
+        st = state["result"]
+        msg = f"Gelezen: {st['read']}\nGeïmporteerd: {st['imported']}\nDubbels: {st['duplicates']}\nAfgekeurd: {st['rejected']}"
+        if st["reject_file"]:
+            msg += f"\n\nAfgekeurde regels: {st['reject_file']}"
+        messagebox.showinfo(self.app.tr("import_clients"), msg)
+        self.refresh()
+
 class ClientDialog(tk.Toplevel):
     def __init__(self, app: App, parent, existing=None):
         super().__init__(parent)
@@ -1006,6 +4877,7 @@ class PricesTab(ttk.Frame):
         self.tree.column("name", width=300)
         self.tree.column("price", width=100)
         self.tree.pack(fill=tk.BOTH, expand=True)
+        self.model = TreeModel(self.tree)
 
         btns = ttk.Frame(self)
         btns.pack(fill=tk.X, padx=8, pady=8)
@@ -1013,6 +4885,7 @@ class PricesTab(ttk.Frame):
         ttk.Button(btns, text=self.app.tr("change_price"), command=self.edit).pack(side=tk.LEFT, padx=6)
 
         self.refresh_labels()
+        app.settings.subscribe(("base_lang",), lambda key, value: self.refresh_labels())
         self.refresh()
 
     def refresh_labels(self):
@@ -1020,10 +4893,8 @@ class PricesTab(ttk.Frame):
         self.tree.heading("price", text=self.app.tr("price"))
 
     def refresh(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        for m in self.app.store.list_manips():
-            self.tree.insert('', 'end', iid=m['id'], values=(m['name'], f"€ {cents_to_money(m['price_cents'])}"))
+        self.app.db.submit("prices-tab", lambda store: store.list_manips(), lambda rows: self.model.set_rows(
+            (m['id'], (m['name'], f"€ {cents_to_money(m['price_cents'])}")) for m in rows))
 
     def add(self):
         dlg = ManipDialog(self.app, self)
@@ -1093,7 +4964,9 @@ class ReceiptsTab(ttk.Frame):
         top.pack(fill=tk.X, padx=8, pady=6)
         ttk.Button(top, text=self.app.tr("print_receipt"), command=self.new_receipt).pack(side=tk.LEFT)
         ttk.Button(top, text=self.app.tr("email_receipt"), command=self.email_selected).pack(side=tk.LEFT, padx=6)
+        ttk.Button(top, text=self.app.tr("open_pdf"), command=self.open_selected).pack(side=tk.LEFT)
         ttk.Button(top, text=self.app.tr("tax_doc"), command=self.print_tax_doc).pack(side=tk.LEFT, padx=12)
+        ttk.Button(top, text=self.app.tr("compare_years"), command=self.print_comparison).pack(side=tk.LEFT)
 
         # Client filter + periodeknoppen
         ttk.Label(top, text=self.app.tr("filter_client")).pack(side=tk.LEFT, padx=(16,4))
@@ -1132,15 +5005,23 @@ class ReceiptsTab(ttk.Frame):
         self.e_to.pack(side=tk.LEFT, padx=(4,12))
 
         ttk.Button(custom, text=self.app.tr("print_period"), command=self.print_custom).pack(side=tk.LEFT, padx=4)
+        ttk.Button(custom, text=self.app.tr("print_batch"), command=self.print_batch).pack(side=tk.LEFT, padx=4)
         ttk.Button(custom, text=self.app.tr("export_csv"), command=self.export_csv).pack(side=tk.LEFT, padx=4)
         ttk.Button(custom, text=self.app.tr("export_excel"), command=self.export_excel).pack(side=tk.LEFT, padx=4)
+        self.btn_import = ttk.Button(custom, text=self.app.tr("import_receipts"), command=self.import_file)
+        self.btn_import.pack(side=tk.LEFT, padx=(16,4))
+        self.lbl_import = ttk.Label(custom)
+        self.lbl_import.pack(side=tk.LEFT, padx=4)
+        self._import = None
 
         self.tree = ttk.Treeview(self, columns=("number","date","client","total","pdf"), show="headings")
         for col, w in (("number",160),("date",120),("client",240),("total",100),("pdf",380)):
             self.tree.heading(col, text=col.capitalize()); self.tree.column(col, width=w)
         self.tree.pack(fill=tk.BOTH, expand=True)
+        self.model = TreeModel(self.tree)
 
         self.refresh_labels()
+        app.settings.subscribe(("base_lang",), lambda key, value: self.refresh_labels())
         self.refresh()
 
     def refresh_labels(self):
@@ -1159,31 +5040,18 @@ class ReceiptsTab(ttk.Frame):
             return None
 
     def refresh(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        clients = {c['id']: c for c in self.app.store.list_clients()}
-        rows = self.app.store.list_receipts_in_range_by_client(dt.date(1970,1,1), dt.date.today(), self._selected_client_id())
-        for r in rows:
-            cname = clients.get(r['client_id'], {}).get('name', '')
-            self.tree.insert('', 'end', iid=r['id'], values=(r['number'], r['date'], cname, f"€ {cents_to_money(r['total_cents'])}", r['pdf_path'] or ""))
+        client_id = self._selected_client_id()
+
+        def work(store):
+            clients = {c['id']: c['name'] for c in store.list_clients()}
+            rows = store.list_receipts_in_range_by_client(dt.date(1970,1,1), dt.date.today(), client_id)
+            return [(r['id'], (r['number'], r['date'], clients.get(r['client_id'], ''),
+                               f"€ {cents_to_money(r['total_cents'])}", r['pdf_path'])) for r in rows]
+
+        self.app.db.submit("receipts-tab", work, self.model.set_rows)
 
     def _period_dates(self, period: str):
-        today = dt.date.today()
-        if period == "day":
-            return today, today
-        if period == "week":
-            start = today - dt.timedelta(days=today.weekday())
-            end = start + dt.timedelta(days=6)
-            return start, end
-        if period == "month":
-            start = today.replace(day=1)
-            next_month = (start.replace(day=28) + dt.timedelta(days=4)).replace(day=1)
-            end = next_month - dt.timedelta(days=1)
-            return start, end
-        if period == "year":
-            start = today.replace(month=1, day=1)
-            return start, today
-        return today, today
+        return period_dates(period)
 
     def _parse_date_or(self, s: str, default: dt.date) -> dt.date:
         try:
@@ -1192,60 +5060,21 @@ class ReceiptsTab(ttk.Frame):
             return default
 
     def _print_range_receipts(self, start: dt.date, end: dt.date, client_id: int | None):
-        receipts = self.app.store.list_receipts_in_range_by_client(start, end, client_id)
-        if not receipts:
-            messagebox.showinfo(self.app.tr("print_period"), "Geen reçus in deze periode.")
-            return
         if pdfcanvas is None:
             messagebox.showerror(self.app.tr("print_period"), self.app.tr("no_pdf"))
             return
-        # Bestandsnaam met firmanaam
-        comp_slug = (self.app.company.name or "firma").lower().replace(" ", "_")
-        cname = None
-        if client_id:
-            for c in self.app.store.list_clients():
-                if c['id'] == client_id:
-                    cname = c['name']
-                    break
-        suffix = f"{start}_{end}" + (f"_{cname}" if cname else "_ALL")
-        fname = PDF_DIR / f"{comp_slug}_receipts_{suffix}.pdf"
-        c = pdfcanvas.Canvas(str(fname), pagesize=A4)
-        width, height = A4
-        c.setFont("Helvetica-Bold", 14)
-        title = f"{self.app.company.name} – {self.app.tr('receipts')} {start} → {end}" + (f" – {cname}" if cname else "")
-        c.drawString(25*mm, height-25*mm, title)
-        c.setFont("Helvetica", 10)
-        y = height-35*mm
-        total = 0
-        for r in receipts:
-            line = f"{r['date']}  #{r['number']}  € {cents_to_money(r['total_cents'])}"
-            c.drawString(25*mm, y, line)
-            y -= 6*mm
-            total += r['total_cents']
-            if y < 70*mm:
-                c.showPage(); y = height-25*mm
-        # Subtotalen per manipulatie
-        sums = self.app.store.sum_by_manipulations_in_range(start, end, client_id)
-        c.setFont("Helvetica-Bold", 11)
-        c.drawString(25*mm, y-6*mm, self.app.tr("subtotal_by_manip"))
-        y -= 12*mm
-        c.setFont("Helvetica", 10)
-        for name, cents in sums:
-            c.drawString(25*mm, y, f"• {name}")
-            c.drawRightString(170*mm, y, f"€ {cents_to_money(cents)}")
-            y -= 6*mm
-            if y < 40*mm:
-                c.showPage(); y = height-40*mm
-        # BTW uitsplitsing
-        vat_rate = float(self.app.store.get_config("vat_rate", "21") or 21)
-        vat_amount = int(round(total * (vat_rate / (100 + vat_rate)))) if vat_rate > 0 else 0
-        net_amount = total - vat_amount
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(25*mm, 26*mm, f"Netto: € {cents_to_money(net_amount)}")
-        c.drawString(25*mm, 20*mm, f"{self.app.tr('vat')} {vat_rate:.2f}%: € {cents_to_money(vat_amount)}")
-        c.drawString(25*mm, 14*mm, f"Totaal: € {cents_to_money(total)}")
-        c.save()
-        messagebox.showinfo(self.app.tr("print_period"), f"PDF opgeslagen: {fname}")
+        company, lang, vat_rate = self.app.company, self.app.lang, self.app.settings["vat_rate"]
+
+        def work(store):
+            return period_report_pdf(store, company, lang, vat_rate, start, end, client_id)
+
+        def done(path):
+            if path is None:
+                messagebox.showinfo(self.app.tr("print_period"), "Geen reçus in deze periode.")
+            else:
+                messagebox.showinfo(self.app.tr("print_period"), f"PDF opgeslagen: {path}")
+
+        self.app.db.submit(None, work, done)
 
     def print_period(self, period: str):
         start, end = self._period_dates(period)
@@ -1257,30 +5086,82 @@ class ReceiptsTab(ttk.Frame):
         end = self._parse_date_or(self.e_to.get(), today)
         self._print_range_receipts(start, end, self._selected_client_id())
 
-    def _rows_for_export(self, start: dt.date, end: dt.date):
-        rows = self.app.store.list_receipts_in_range_by_client(start, end, self._selected_client_id())
-        clients = {c['id']: c for c in self.app.store.list_clients()}
-        data = []
-        for r in rows:
-            cname = clients.get(r['client_id'], {}).get('name', '')
-            data.append({'number': r['number'], 'date': r['date'], 'client': cname, 'total_eur': cents_to_money(r['total_cents']), 'pdf_path': r['pdf_path'] or ''})
-        return data
+    def print_batch(self):
+        """Alle reçus van de gekozen periode (en cliënt) als één PDF voor de printer."""
+        if pdfcanvas is None:
+            messagebox.showerror(self.app.tr("print_batch"), self.app.tr("no_pdf"))
+            return
+        today = dt.date.today()
+        start = self._parse_date_or(self.e_from.get(), today)
+        end = self._parse_date_or(self.e_to.get(), today)
+        client_id = self._selected_client_id()
+        company = self.app.company
+        labels = {k: self.app.tr(k) for k in RECEIPT_LABEL_KEYS}
+        comp_slug = (company.name or "firma").lower().replace(" ", "_")
+        fname = pdf_target(f"{comp_slug}_receipts_batch_{start}_{end}" + (f"_{client_id}" if client_id else "") + ".pdf", start)
+
+        def work(store):
+            clients = {c['id']: c for c in store.list_clients()}
+            if isinstance(store, Store):
+                receipts = store.iter_receipts_with_items(start, end, client_id)
+            else:
+                receipts = (store.get_receipt(r['id']) for r in store.list_receipts_in_range_by_client(start, end, client_id))
+            path, n = render_receipt_batch_pdf(fname, labels.__getitem__, company, receipts, clients)
+            if not n:
+                path.unlink()
+                return None
+            return path, n
+
+        def done(result):
+            if result is None:
+                messagebox.showinfo(self.app.tr("print_batch"), "Geen reçus in deze periode.")
+                return
+            path, n = result
+            messagebox.showinfo(self.app.tr("print_batch"), f"{n} reçus in één PDF: {path}")
+            open_with_system(path)
+
+        self.app.db.submit(None, work, done)
+
+    @staticmethod
+    def _rows_for_export(store, start: dt.date, end: dt.date, client_id: int | None):
+        """(number, date, client, total_eur, pdf_path) per reçu, als stroom."""
+        clients = {c['id']: c['name'] for c in store.list_clients()}
+        if isinstance(store, Store):
+            batches = store.iter_receipts_in_range(start, end, client_id)
+        else:
+            batches = [store.list_receipts_in_range_by_client(start, end, client_id)]
+        for rows in batches:
+            for r in rows:
+                yield (r['number'], r['date'], clients.get(r['client_id'], ''), cents_to_money(r['total_cents']), r['pdf_path'] or '')
 
     def export_csv(self):
         import csv
         today = dt.date.today()
         start = self._parse_date_or(self.e_from.get(), today.replace(day=1))
         end = self._parse_date_or(self.e_to.get(), today)
-        data = self._rows_for_export(start, end)
-        if not data:
-            messagebox.showinfo("CSV", "Geen data voor export.")
-            return
+        client_id = self._selected_client_id()
         comp_slug = (self.app.company.name or "firma").lower().replace(" ", "_")
-        fname = PDF_DIR / f"{comp_slug}_export_{start}_{end}.csv"
-        with open(fname, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=['number','date','client','total_eur','pdf_path'])
-            writer.writeheader(); writer.writerows(data)
-        messagebox.showinfo("CSV", f"CSV opgeslagen: {fname}")
+        fname = pdf_target(f"{comp_slug}_export_{start}_{end}.csv", start)
+
+        def work(store):
+            n = 0
+            with open(fname, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['number','date','client','total_eur','pdf_path'])
+                for row in self._rows_for_export(store, start, end, client_id):
+                    writer.writerow(row); n += 1
+            if not n:
+                fname.unlink()
+                return None
+            return fname
+
+        def done(path):
+            if path is None:
+                messagebox.showinfo("CSV", "Geen data voor export.")
+            else:
+                messagebox.showinfo("CSV", f"CSV opgeslagen: {path}")
+
+        self.app.db.submit(None, work, done)
 
     def export_excel(self):
         try:
@@ -1291,19 +5172,33 @@ class ReceiptsTab(ttk.Frame):
         today = dt.date.today()
         start = self._parse_date_or(self.e_from.get(), today.replace(day=1))
         end = self._parse_date_or(self.e_to.get(), today)
-        data = self._rows_for_export(start, end)
-        if not data:
-            messagebox.showinfo("Excel", "Geen data voor export.")
-            return
+        client_id = self._selected_client_id()
         comp_slug = (self.app.company.name or "firma").lower().replace(" ", "_")
-        fname = PDF_DIR / f"{comp_slug}_export_{start}_{end}.xlsx"
-        wb = xlsxwriter.Workbook(str(fname)); ws = wb.add_worksheet('Receipts')
-        headers = ['number','date','client','total_eur','pdf_path']
-        for col, h in enumerate(headers): ws.write(0, col, h)
-        for r, row in enumerate(data, start=1):
-            ws.write(r, 0, row['number']); ws.write(r, 1, row['date']); ws.write(r, 2, row['client']); ws.write(r, 3, row['total_eur']); ws.write(r, 4, row['pdf_path'])
-        ws.autofilter(0, 0, len(data), len(headers)-1); ws.set_column(0, len(headers)-1, 22)
-        wb.close(); messagebox.showinfo("Excel", f"Excel opgeslagen: {fname}")
+        fname = pdf_target(f"{comp_slug}_export_{start}_{end}.xlsx", start)
+
+        def work(store):
+            # constant_memory: rijen gaan meteen naar schijf, in volgorde
+            wb = xlsxwriter.Workbook(str(fname), {'constant_memory': True}); ws = wb.add_worksheet('Receipts')
+            headers = ['number','date','client','total_eur','pdf_path']
+            ws.set_column(0, len(headers)-1, 22)
+            for col, h in enumerate(headers): ws.write(0, col, h)
+            n = 0
+            for n, row in enumerate(self._rows_for_export(store, start, end, client_id), start=1):
+                ws.write_row(n, 0, row)
+            ws.autofilter(0, 0, n, len(headers)-1)
+            wb.close()
+            if not n:
+                fname.unlink()
+                return None
+            return fname
+
+        def done(path):
+            if path is None:
+                messagebox.showinfo("Excel", "Geen data voor export.")
+            else:
+                messagebox.showinfo("Excel", f"Excel opgeslagen: {path}")
+
+        self.app.db.submit(None, work, done)
 
     def new_receipt(self):
         dlg = ReceiptDialog(self.app, self)
@@ -1325,60 +5220,132 @@ class ReceiptsTab(ttk.Frame):
             return
         send_receipt_email(self.app, r, items, client)
 
-    def print_tax_doc(self):
-        today = dt.date.today(); start = today.replace(month=1, day=1); end = today
-        receipts = self.app.store.list_receipts_in_range_by_client(start, end, None)
-        if not receipts:
-            messagebox.showinfo("Belastingdocument", "Geen reçus dit jaar.")
+    def open_selected(self):
+        import tempfile
+        sel = self.tree.selection()
+        if not sel:
             return
+        r, _items = self.app.store.get_receipt(int(sel[0]))
+        data = load_receipt_pdf(self.app.store, r)
+        if data is None:
+            path = generate_receipt_pdf(self.app, r['id'])
+            if not path:
+                return
+            self.app.store.update_receipt_pdf(r['id'], pdf_rel(path))
+            self.refresh()
+        else:
+            path = Path(tempfile.gettempdir()) / (Path(r['pdf_path']).name if r['pdf_path'] else f"receipt_{r['number']}.pdf")
+            path.write_bytes(data)
+        open_with_system(path)
+
+    def print_tax_doc(self):
         if pdfcanvas is None:
             messagebox.showerror("Belastingdocument", self.app.tr("no_pdf"))
             return
+        company, lang, vat_rate = self.app.company, self.app.lang, self.app.settings["vat_rate"]
+
+        def work(store):
+            return tax_doc_pdf(store, company, lang, vat_rate, dt.date.today())
+
+        def done(path):
+            if path is None:
+                messagebox.showinfo("Belastingdocument", "Geen reçus dit jaar.")
+            else:
+                messagebox.showinfo("Belastingdocument", f"PDF opgeslagen: {path}")
+
+        self.app.db.submit(None, work, done)
+
+    def print_comparison(self):
+        if pdfcanvas is None:
+            messagebox.showerror(self.app.tr("compare_years"), self.app.tr("no_pdf"))
+            return
+        this_year = dt.date.today().year
+        text = simpledialog.askstring(self.app.tr("compare_years"), self.app.tr("compare_years_prompt"), initialvalue=f"{this_year-2}-{this_year}")
+        if not text:
+            return
+        try:
+            years = parse_years(text)
+        except ValueError as e:
+            messagebox.showerror(self.app.tr("compare_years"), str(e))
+            return
         try:
-            vat_rate = float(self.app.store.get_config("vat_rate", "21") or 21)
+            import xlsxwriter  # type: ignore  # noqa: F401
+            with_xlsx = True
         except Exception:
-            vat_rate = 21.0
-        comp_slug = (self.app.company.name or "firma").lower().replace(" ", "_")
-        fname = PDF_DIR / f"{comp_slug}_tax_declaration_{today.year}.pdf"
-        c = pdfcanvas.Canvas(str(fname), pagesize=A4)
-        width, height = A4
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(25*mm, height-25*mm, f"{self.app.company.name} – Jaaroverzicht {today.year}")
-        c.setFont("Helvetica", 10)
-        c.drawString(25*mm, height-32*mm, f"Administrator: {self.app.company.admin}")
-        c.drawString(25*mm, height-38*mm, f"Prijzen inclusief btw ({vat_rate:.2f}%).")
-        month_totals = {}; year_total = 0
-        for r in receipts:
-            d = dt.date.fromisoformat(r['date']); key = f"{d.year}-{d.month:02d}"
-            month_totals[key] = month_totals.get(key, 0) + r['total_cents']
-            year_total += r['total_cents']
-        y = height-52*mm
-        c.setFont("Helvetica-Bold", 11)
-        c.drawString(25*mm, y, "Maand"); c.drawRightString(115*mm, y, "Netto (€)"); c.drawRightString(150*mm, y, f"Btw {vat_rate:.2f}% (€)"); c.drawRightString(170*mm, y, "Totaal (€)")
-        y -= 6*mm; c.setLineWidth(0.5); c.line(25*mm, y, 170*mm, y); y -= 4*mm
-        c.setFont("Helvetica", 10); year_vat = 0; year_net = 0
-        for m in sorted(month_totals.keys()):
-            gross = month_totals[m]
-            vat_amt = int(round(gross * (vat_rate / (100.0 + vat_rate)))) if vat_rate > 0 else 0
-            net_amt = gross - vat_amt
-            year_vat += vat_amt; year_net += net_amt
-            c.drawString(25*mm, y, m)
-            c.drawRightString(115*mm, y, cents_to_money(net_amt))
-            c.drawRightString(150*mm, y, cents_to_money(vat_amt))
-            c.drawRightString(170*mm, y, cents_to_money(gross))
-            y -= 6*mm
-            if y < 30*mm:
-                c.showPage(); y = height-25*mm
-        if y < 40*mm:
-            c.showPage(); y = height-25*mm
-        c.setLineWidth(0.5); c.line(25*mm, y, 170*mm, y); y -= 8*mm
-        c.setFont("Helvetica-Bold", 12); c.drawString(25*mm, y, "Jaar totalen"); y -= 8*mm
-        c.setFont("Helvetica", 11)
-        c.drawString(30*mm, y, "Netto"); c.drawRightString(80*mm, y, f"€ {cents_to_money(year_net)}")
-        c.drawString(95*mm, y, f"Btw {vat_rate:.2f}%"); c.drawRightString(150*mm, y, f"€ {cents_to_money(year_vat)}")
-        y -= 7*mm; c.setFont("Helvetica-Bold", 12)
-        c.drawString(30*mm, y, "Totaal"); c.drawRightString(170*mm, y, f"€ {cents_to_money(year_total)}")
-        c.save(); messagebox.showinfo("Belastingdocument", f"PDF opgeslagen: {fname}")
+            with_xlsx = False
+        company = self.app.company
+        month_names = self.app.tr("months").split(",")
+        comp_slug = (company.name or "firma").lower().replace(" ", "_")
+        fname = pdf_target(f"{comp_slug}_comparison_{years[0]}-{years[-1]}.pdf", dt.date(years[-1], 1, 1), monthly=False)
+
+        def work(store):
+            report = comparative_report(store, years)
+            if report['empty']:
+                return None
+            inputs = ((company.name, company.admin, self.app.lang), month_names, report)
+            pdf = cached_render(store, "comparison", inputs, lambda: render_comparative_pdf(fname, company, report, month_names))
+            xlsx = write_comparative_xlsx(fname.with_suffix(".xlsx"), report, month_names) if with_xlsx else None
+            return pdf, xlsx
+
+        def done(paths):
+            if paths is None:
+                messagebox.showinfo(self.app.tr("compare_years"), "Geen reçus in deze jaren.")
+                return
+            pdf, xlsx = paths
+            msg = f"PDF opgeslagen: {pdf}"
+            msg += f"\nExcel opgeslagen: {xlsx}" if xlsx else "\n(Excel overgeslagen: pakket 'xlsxwriter' ontbreekt. Installeer met: pip install xlsxwriter)"
+            messagebox.showinfo(self.app.tr("compare_years"), msg)
+
+        self.app.db.submit(None, work, done)
+
+    def import_file(self):
+        if self._import is not None:
+            return
+        path = filedialog.askopenfilename(title=self.app.tr("import_receipts"),
+                                          filetypes=[("CSV / Excel", "*.csv *.xlsx"), ("*", "*")])
+        if not path:
+            return
+        keep = messagebox.askyesnocancel(self.app.tr("import_receipts"), self.app.tr("keep_numbers"))
+        if keep is None:
+            return
+        state = self._import = {"progress": (0, 0.0), "result": None, "error": None}
+        local = isinstance(self.app.store, Store)
+        db_path = self.app.store.path if local else None
+
+        def work():
+            try:
+                store = Store(db_path) if local else self.app.store
+                state["result"] = import_receipts(store, path, numbering="keep" if keep else "reassign",
+                                                  progress=lambda n, f: state.update(progress=(n, f)))
+            except Exception as e:
+                state["error"] = e
+
+        self.btn_import.state(["disabled"])
+        threading.Thread(target=work, name="receipt-import", daemon=True).start()
+        self.after(200, self._poll_import)
+
+    def _poll_import(self):
+        state = self._import
+        if state["result"] is None and state["error"] is None:
+            n, frac = state["progress"]
+            self.lbl_import.config(text=f"{n} ({frac:.0%})")
+            self.after(200, self._poll_import)
+            return
+        self._import = None
+        self.btn_import.state(["!disabled"])
+        self.lbl_import.config(text="")
+        if state["error"] is not None:
+            messagebox.showerror(self.app.tr("import_receipts"), f"Import onderbroken: {state['error']}\nOpnieuw importeren hervat waar het stopte.")
+            return
+        st = state["result"]
+        msg = f"Reçus geïmporteerd: {st['receipts']}\nBestaande nummers: {st['duplicates']}\nAfgesloten jaren: {st['closed']}\nAfgekeurd: {st['rejected']}"
+        if st["resumed_at"]:
+            msg += f"\n(hervat vanaf rij {st['resumed_at']})"
+        if st["reject_file"]:
+            msg += f"\n\nAfgekeurde regels: {st['reject_file']}"
+        messagebox.showinfo(self.app.tr("import_receipts"), msg)
+        self.refresh()
+        self.app.refresh_totals()
 
 class ReceiptDialog(tk.Toplevel):
     def __init__(self, app: App, parent):
@@ -1424,11 +5391,333 @@ class ReceiptDialog(tk.Toplevel):
         rid, number, total = self.app.store.create_receipt(cid, items)
         path = generate_receipt_pdf(self.app, rid)
         if path:
-            self.app.store.update_receipt_pdf(rid, str(path))
+            self.app.store.update_receipt_pdf(rid, pdf_rel(path))
         messagebox.showinfo(self.app.tr("receipt"), f"Reçu #{number} – € {cents_to_money(total)}")
         self.destroy()
 
+# ---- Analyse ------------------------------------------------------------------
+class AnalyticsTab(ttk.Frame):
+    def __init__(self, app: App):
+        super().__init__(app)
+        self.app = app
+        self.engine = None
+        top = ttk.Frame(self)
+        top.pack(fill=tk.X, padx=8, pady=6)
+        self.lbl_from = ttk.Label(top)
+        self.lbl_from.pack(side=tk.LEFT)
+        start = dt.date.today().replace(month=1, day=1)
+        if DateEntry:
+            self.e_from = DateEntry(top, width=12, date_pattern='yyyy-mm-dd')
+            self.e_from.set_date(start)
+        else:
+            self.e_from = ttk.Entry(top, width=12)
+            self.e_from.insert(0, start.isoformat())
+        self.e_from.pack(side=tk.LEFT, padx=(4,12))
+        self.lbl_to = ttk.Label(top)
+        self.lbl_to.pack(side=tk.LEFT)
+        if DateEntry:
+            self.e_to = DateEntry(top, width=12, date_pattern='yyyy-mm-dd')
+            self.e_to.set_date(dt.date.today())
+        else:
+            self.e_to = ttk.Entry(top, width=12)
+            self.e_to.insert(0, dt.date.today().isoformat())
+        self.e_to.pack(side=tk.LEFT, padx=(4,12))
+        self.cb_key = ttk.Combobox(top, state="readonly", width=24)
+        self.cb_key.pack(side=tk.LEFT, padx=4)
+        self.cb_key.bind("<<ComboboxSelected>>", lambda e: self.refresh())
+        self.btn_refresh = ttk.Button(top, command=self.refresh)
+        self.btn_refresh.pack(side=tk.LEFT, padx=4)
+
+        self.tree = ttk.Treeview(self, columns=("key","total","qty","pct"), show="headings")
+        for col, w in (("key",260),("total",120),("qty",80),("pct",100)):
+            self.tree.column(col, width=w)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.model = TreeModel(self.tree)
+
+        self.refresh_labels()
+        app.settings.subscribe(("base_lang",), lambda key, value: self.refresh_labels())
+        if np is not None:
+            self.refresh()
+
+    def refresh_labels(self):
+        i = max(self.cb_key.current(), 0)
+        self.cb_key.config(values=[self.app.tr(f"an_{k}") for k in ANALYTICS_KEYS])
+        self.cb_key.current(i)
+        self.lbl_from.config(text=self.app.tr("start_date"))
+        self.lbl_to.config(text=self.app.tr("end_date"))
+        self.btn_refresh.config(text=self.app.tr("refresh"))
+        self.tree.heading("key", text=self.app.tr("an_" + ANALYTICS_KEYS[i]))
+        self.tree.heading("total", text=self.app.tr("total"))
+        self.tree.heading("qty", text=self.app.tr("quantity"))
+        self.tree.heading("pct", text="%")
+
+    def _dates(self):
+        try:
+            start = dt.date.fromisoformat(self.e_from.get())
+        except ValueError:
+            start = dt.date.today().replace(month=1, day=1)
+        try:
+            end = dt.date.fromisoformat(self.e_to.get())
+        except ValueError:
+            end = dt.date.today()
+        return (end, start) if end < start else (start, end)
+
+    def _label(self, key: str, value, names: dict) -> str:
+        if key in ("client", "manipulation"):
+            return "-" if value is None else names.get(value, f"#{value}")
+        if key == "weekday":
+            return self.app.tr("weekdays").split(",")[value]
+        if key == "hour":
+            return "-" if value is None else f"{value:02d}:00"
+        return str(value)
+
+    def refresh(self):
+        if np is None:
+            messagebox.showerror(self.app.tr("analytics"), self.app.tr("no_numpy"))
+            return
+        self.refresh_labels()
+        start, end = self._dates()
+        key = ANALYTICS_KEYS[self.cb_key.current()]
+
+        def work(store):
+            # De snapshot hoort bij de verbinding van de DbWorker
+            if self.engine is None:
+                self.engine = AnalyticsEngine(store)
+            names = {}
+            if key == "client":
+                names = {c['id']: c['name'] for c in store.list_clients()}
+            elif key == "manipulation":
+                names = {m['id']: m['name'] for m in store.list_manips()}
+            return analytics_report(store, start, end, top_n=25, engine=self.engine), names
+
+        self.app.db.submit("analytics-tab", work, lambda res: self._show(key, *res))
+
+    def _show(self, key: str, report: dict, names: dict):
+        if key == "month":
+            self.model.set_rows(
+                (f"{key}:{m['month']}", (m["month"], f"€ {cents_to_money(m['cents'])}", m["qty"],
+                                         "" if m["change_pct"] is None else f"{m['change_pct']:+.1f}"))
+                for m in report["month_over_month"])
+            return
+        rows = report[{"client": "by_client", "weekday": "by_weekday", "hour": "by_hour",
+                       "manipulation": "by_manipulation"}[key]]
+        total = sum(r[1] for r in rows) or 1
+        self.model.set_rows((f"{key}:{value}", (self._label(key, value, names), f"€ {cents_to_money(cents)}", qty,
+                                                f"{cents * 100.0 / total:.1f}"))
+                            for value, cents, qty in rows)
+
 # ---- PDF & Email ------------------------------------------------------------
+# Rapport-PDF's zonder Tk: bruikbaar vanuit de DbWorker-thread en headless.
+def render_key(kind: str, inputs) -> str:
+    import hashlib
+    return hashlib.sha256(json_dumps([kind, inputs])).hexdigest()
+
+def cached_render(store, kind: str, inputs, render) -> Path:
+    """Geeft het bestaande document terug als de hash van `inputs` al gerenderd werd en
+    het bestand er nog is; anders render() (-> pad) en onthouden."""
+    key = render_key(kind, inputs)
+    path = store.get_rendered(key)
+    if path is None:
+        path = render()
+        store.put_rendered(key, kind, path)
+    return path
+
+def render_receipt_list_pdf(fname: Path, title: str, receipts) -> Path:
+    c = pdfcanvas.Canvas(str(fname), pagesize=A4)
+    width, height = A4
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(25*mm, height-25*mm, title)
+    c.setFont("Helvetica", 10)
+    y = height-35*mm
+    total = 0
+    for r in receipts:
+        c.drawString(25*mm, y, f"{r['date']}  #{r['number']}  € {cents_to_money(r['total_cents'])}")
+        y -= 6*mm
+        total += r['total_cents']
+        if y < 25*mm:
+            c.showPage(); y = height-25*mm
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(25*mm, 20*mm, f"Totaal: € {cents_to_money(total)}")
+    c.save()
+    return fname
+
+def render_period_pdf(fname: Path, title: str, receipts, manip_sums, vat_sums: dict,
+                      subtotal_label: str, vat_label: str) -> Path:
+    c = pdfcanvas.Canvas(str(fname), pagesize=A4)
+    width, height = A4
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(25*mm, height-25*mm, title)
+    c.setFont("Helvetica", 10)
+    y = height-35*mm
+    for r in receipts:
+        line = f"{r['date']}  #{r['number']}  € {cents_to_money(r['total_cents'])}"
+        c.drawString(25*mm, y, line)
+        y -= 6*mm
+        if y < 70*mm:
+            c.showPage(); y = height-25*mm
+    # Subtotalen per manipulatie
+    c.setFont("Helvetica-Bold", 11)
+    c.drawString(25*mm, y-6*mm, subtotal_label)
+    y -= 12*mm
+    c.setFont("Helvetica", 10)
+    for name, cents in manip_sums:
+        c.drawString(25*mm, y, f"• {name}")
+        c.drawRightString(170*mm, y, f"€ {cents_to_money(cents)}")
+        y -= 6*mm
+        if y < 40*mm:
+            c.showPage(); y = height-40*mm
+    # BTW uitsplitsing (uit de snapshots op de reçus)
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(25*mm, 26*mm, f"Netto: € {cents_to_money(vat_sums['net'])}")
+    c.drawString(25*mm, 20*mm, f"{vat_label} {vat_rate_label(vat_sums['min_rate'], vat_sums['max_rate'])}: € {cents_to_money(vat_sums['vat'])}")
+    c.drawString(25*mm, 14*mm, f"Totaal: € {cents_to_money(vat_sums['gross'])}")
+    c.save()
+    return fname
+
+def render_z_report_pdf(fname: Path, company: Company, closure: dict, labels: dict) -> Path:
+    c = pdfcanvas.Canvas(str(fname), pagesize=A4)
+    width, height = A4
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(25*mm, height-25*mm, f"{company.name} – {labels['title']} {closure['date']}")
+    c.setFont("Helvetica", 10)
+    c.drawString(25*mm, height-32*mm, f"Afsluiting {closure['runs']} – {closure['closed_at'].replace('T', ' ')}")
+    c.drawString(25*mm, height-38*mm, f"Reçus: {closure['n']} (t/m id {closure['last_id']})")
+    y = height-52*mm
+    c.setFont("Helvetica-Bold", 11)
+    c.drawString(25*mm, y, labels["subtotal"])
+    y -= 8*mm
+    c.setFont("Helvetica", 10)
+    for name, qty, cents in closure['manipulations']:
+        c.drawString(25*mm, y, f"• {name or '-'}")
+        c.drawRightString(130*mm, y, f"{qty}x")
+        c.drawRightString(170*mm, y, f"€ {cents_to_money(cents)}")
+        y -= 6*mm
+        if y < 40*mm:
+            c.showPage(); y = height-25*mm
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(25*mm, 26*mm, f"Netto: € {cents_to_money(closure['net'])}")
+    c.drawString(25*mm, 20*mm, f"{labels['vat']} {vat_rate_label(closure['min_rate'], closure['max_rate'])}: € {cents_to_money(closure['vat'])}")
+    c.drawString(25*mm, 14*mm, f"Totaal: € {cents_to_money(closure['gross'])}")
+    c.save()
+    return fname
+
+def render_comparative_pdf(fname: Path, company: Company, report: dict, month_names: list[str]) -> Path:
+    from reportlab.lib.pagesizes import landscape  # type: ignore
+    years = report['years']
+    size = landscape(A4) if len(years) > 3 else A4
+    width, height = size
+    c = pdfcanvas.Canvas(str(fname), pagesize=size)
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(20*mm, height-20*mm, f"{company.name} – Omzetvergelijking {years[0]}–{years[-1]}")
+    c.setFont("Helvetica", 9)
+    c.drawString(20*mm, height-26*mm, "Bruto per maand (€, incl. btw); Δ t.o.v. het vorige jaar in de lijst.")
+    col_w = (width - 50*mm) / len(years)
+    y = height-38*mm
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(20*mm, y, "Maand")
+    for i, yr in enumerate(years):
+        c.drawRightString(45*mm + (i + 1) * col_w, y, str(yr))
+    y -= 3*mm; c.setLineWidth(0.5); c.line(20*mm, y, width-20*mm, y); y -= 6*mm
+    for row in report['rows'] + [report['total']]:
+        if row['month'] is None:
+            c.line(20*mm, y+4*mm, width-20*mm, y+4*mm)
+        c.setFont("Helvetica-Bold" if row['month'] is None else "Helvetica", 10)
+        c.drawString(20*mm, y, month_names[row['month'] - 1] if row['month'] else "Totaal")
+        for i, cell in enumerate(row['cells']):
+            x = 45*mm + (i + 1) * col_w
+            c.drawRightString(x, y, cents_to_money(cell['gross']))
+            if cell['delta'] is not None:
+                c.setFont("Helvetica", 7)
+                c.setFillColor(colors.darkgreen if cell['delta'] >= 0 else colors.red)
+                c.drawRightString(x, y - 3.5*mm, _delta_label(cell))
+                c.setFillColor(colors.black)
+                c.setFont("Helvetica-Bold" if row['month'] is None else "Helvetica", 10)
+        y -= 10*mm
+        if y < 20*mm:
+            c.showPage(); y = height-20*mm
+    c.save()
+    return fname
+
+def period_report_pdf(store, company: Company, lang: str, vat_rate: float,
+                      start: dt.date, end: dt.date, client_id: int | None = None) -> Path | None:
+    """Periodeoverzicht via de render-cache; None zonder reçus. Het Reçus-tabblad en de
+    nachtelijke taak gebruiken dit allebei, dus ze delen dezelfde cachesleutels."""
+    receipts = store.list_receipts_in_range_by_client(start, end, client_id)
+    if not receipts:
+        return None
+    labels = {"receipts": translate(lang, "receipts"), "subtotal": translate(lang, "subtotal_by_manip"), "vat": translate(lang, "vat")}
+    context = (company.name, company.admin, lang)
+    # Bestandsnaam met firmanaam
+    comp_slug = (company.name or "firma").lower().replace(" ", "_")
+    cname = None
+    if client_id:
+        for c in store.list_clients():
+            if c['id'] == client_id:
+                cname = c['name']
+                break
+    suffix = f"{start}_{end}" + (f"_{cname}" if cname else "_ALL")
+    fname = pdf_target(f"{comp_slug}_receipts_{suffix}.pdf", start)
+    title = f"{company.name} – {labels['receipts']} {start} → {end}" + (f" – {cname}" if cname else "")
+    if client_id:
+        manip_sums = store.sum_by_manipulations_in_range(start, end, client_id)
+        vat_sums = store.sum_vat_in_range(start, end, client_id)
+    else:
+        # Zonder cliëntfilter: opgebouwd uit de dagafsluitingen
+        # period_totals kan uit de querycache komen: niet wijzigen, een kopie zonder de lijnen maken
+        totals = store.period_totals(start, end)
+        manip_sums = [tuple(m) for m in totals['manipulations']]
+        vat_sums = {k: v for k, v in totals.items() if k != 'manipulations'}
+    inputs = (context, vat_rate, labels, title,
+              [(r['date'], r['number'], r['total_cents']) for r in receipts], manip_sums, vat_sums)
+    return cached_render(store, "period", inputs, lambda: render_period_pdf(
+        fname, title, receipts, manip_sums, vat_sums, labels["subtotal"], labels["vat"]))
+
+def tax_doc_pdf(store, company: Company, lang: str, vat_rate: float, today: dt.date) -> Path | None:
+    """Belastingdocument van het lopende jaar tot `today` via de render-cache; None zonder reçus."""
+    start = today.replace(month=1, day=1)
+    months = store.monthly_vat_totals(start, today)
+    if not months:
+        return None
+    comp_slug = (company.name or "firma").lower().replace(" ", "_")
+    fname = pdf_target(f"{comp_slug}_tax_declaration_{today.year}.pdf", start, monthly=False)
+    inputs = ((company.name, company.admin, lang), vat_rate, today.year, months)
+    return cached_render(store, "tax_doc", inputs, lambda: render_tax_doc_pdf(fname, company, today.year, months))
+
+def render_tax_doc_pdf(fname: Path, company: Company, year: int, months: list[dict]) -> Path:
+    rate_label = vat_rate_label(min(m['min_rate'] for m in months), max(m['max_rate'] for m in months))
+    c = pdfcanvas.Canvas(str(fname), pagesize=A4)
+    width, height = A4
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(25*mm, height-25*mm, f"{company.name} – Jaaroverzicht {year}")
+    c.setFont("Helvetica", 10)
+    c.drawString(25*mm, height-32*mm, f"Administrator: {company.admin}")
+    c.drawString(25*mm, height-38*mm, f"Prijzen inclusief btw ({rate_label}).")
+    y = height-52*mm
+    c.setFont("Helvetica-Bold", 11)
+    c.drawString(25*mm, y, "Maand"); c.drawRightString(115*mm, y, "Netto (€)"); c.drawRightString(150*mm, y, f"Btw {rate_label} (€)"); c.drawRightString(170*mm, y, "Totaal (€)")
+    y -= 6*mm; c.setLineWidth(0.5); c.line(25*mm, y, 170*mm, y); y -= 4*mm
+    c.setFont("Helvetica", 10); year_total = 0; year_vat = 0; year_net = 0
+    for m in months:
+        year_total += m['gross']; year_vat += m['vat']; year_net += m['net']
+        c.drawString(25*mm, y, m['month'])
+        c.drawRightString(115*mm, y, cents_to_money(m['net']))
+        c.drawRightString(150*mm, y, cents_to_money(m['vat']))
+        c.drawRightString(170*mm, y, cents_to_money(m['gross']))
+        y -= 6*mm
+        if y < 30*mm:
+            c.showPage(); y = height-25*mm
+    if y < 40*mm:
+        c.showPage(); y = height-25*mm
+    c.setLineWidth(0.5); c.line(25*mm, y, 170*mm, y); y -= 8*mm
+    c.setFont("Helvetica-Bold", 12); c.drawString(25*mm, y, "Jaar totalen"); y -= 8*mm
+    c.setFont("Helvetica", 11)
+    c.drawString(30*mm, y, "Netto"); c.drawRightString(80*mm, y, f"€ {cents_to_money(year_net)}")
+    c.drawString(95*mm, y, f"Btw {rate_label}"); c.drawRightString(150*mm, y, f"€ {cents_to_money(year_vat)}")
+    y -= 7*mm; c.setFont("Helvetica-Bold", 12)
+    c.drawString(30*mm, y, "Totaal"); c.drawRightString(170*mm, y, f"€ {cents_to_money(year_total)}")
+    c.save()
+    return fname
+
 
 def generate_receipt_pdf(app: App, rid: int) -> Path | None:
     if pdfcanvas is None:
@@ -1440,42 +5729,107 @@ def generate_receipt_pdf(app: App, rid: int) -> Path | None:
     for c in app.store.list_clients():
         if c['id'] == r['client_id']:
             client = c; break
-    try:
-        vat_rate = float(app.store.get_config("vat_rate", "21") or 21)
-    except Exception:
-        vat_rate = 21.0
+    fname = receipt_pdf_name(company, r)
+    inputs = receipt_pdf_inputs(company, app.lang, app.settings["vat_rate"], r, items, client)
+    return cached_render(app.store, "receipt", inputs, lambda: _draw_receipt_pdf(app, fname, r, items, client))
+
+def receipt_pdf_name(company: Company, r) -> Path:
     comp_slug = (company.name or "firma").lower().replace(" ", "_")
-    fname = PDF_DIR / f"{comp_slug}_receipt_{r['number']}.pdf"
+    return pdf_target(f"{comp_slug}_receipt_{r['number']}.pdf", dt.date.fromisoformat(r['date']))
+
+def receipt_pdf_inputs(company: Company, lang: str, vat_rate: float, r, items, client) -> tuple:
+    """Alles wat op de reçu-PDF terechtkomt; de hash hiervan is de render-cachesleutel."""
+    client_info = (client['name'], client['email']) if client else None
+    return ((company.name, company.admin, lang), vat_rate, client_info,
+            [r[k] for k in ('number', 'date', 'total_cents', 'net_cents', 'vat_cents', 'vat_rate')],
+            [(it['name'], it['qty'], it['price_cents']) for it in items])
+
+# Labels op een reçu; worden vooraf opgehaald als er buiten de UI-thread getekend wordt
+RECEIPT_LABEL_KEYS = ("admin", "receipt", "date", "name", "email", "manipulation", "price", "total")
+PARALLEL_RENDER_MIN = 200  # ~2 ms per reçu: daaronder weegt het starten van processen niet op tegen het tekenen
+
+def _render_receipt_job(fname: Path, labels: dict, company: Company, r: dict, items: list, client) -> Path:
+    """Tekent één reçu; draait ook in een apart proces, dus alleen picklebare argumenten."""
+    c = pdfcanvas.Canvas(str(fname), pagesize=A4)
+    _draw_receipt_page(c, labels.__getitem__, company, r, items, client)
+    c.save()
+    return fname
+
+def render_receipt_pdfs(store, rids, company: Company, lang: str, labels: dict, vat_rate: float, workers=None) -> dict:
+    """PDF's voor een reeks reçus (bv. na checkout_day). Wat niet in de render-cache zit wordt
+    getekend, vanaf PARALLEL_RENDER_MIN reçus verdeeld over processen: reportlab is pure
+    Python en zou in threads op de GIL wachten. pdf_path gaat in één transactie mee."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    clients = {c['id']: _records_to_dicts(c) for c in store.list_clients()}
+    paths, jobs = {}, []
+    for rid in rids:
+        r, items = store.get_receipt(rid)
+        r, items = _records_to_dicts(r), [_records_to_dicts(it) for it in items]
+        client = clients.get(r['client_id'])
+        key = render_key("receipt", receipt_pdf_inputs(company, lang, vat_rate, r, items, client))
+        path = store.get_rendered(key)
+        if path is not None:
+            paths[rid] = path
+        else:
+            jobs.append((rid, key, (receipt_pdf_name(company, r), labels, company, r, items, client)))
+    if len(jobs) >= PARALLEL_RENDER_MIN and (os.cpu_count() or 1) > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            done = list(pool.map(_render_receipt_job, *zip(*(args for _rid, _key, args in jobs)), chunksize=16))
+    else:
+        done = [_render_receipt_job(*args) for _rid, _key, args in jobs]
+    for (rid, key, _args), path in zip(jobs, done):
+        store.put_rendered(key, "receipt", path)
+        paths[rid] = path
+    store.set_receipt_pdf_paths([(rid, pdf_rel(path)) for rid, path in paths.items()])
+    return paths
+
+def _draw_receipt_pdf(app: App, fname: Path, r, items, client) -> Path:
     c = pdfcanvas.Canvas(str(fname), pagesize=A4)
+    _draw_receipt_page(c, app.tr, app.company, r, items, client)
+    c.save(); return fname
+
+def render_receipt_batch_pdf(fname: Path, tr, company: Company, receipts, clients: dict) -> tuple[Path, int]:
+    """Alle reçus uit `receipts` ((reçu, lijnen) paren) als pagina's van één PDF,
+    zodat de printer één opdracht krijgt. Geeft (pad, aantal reçus) terug."""
+    c = pdfcanvas.Canvas(str(fname), pagesize=A4)
+    n = 0
+    for r, items in receipts:
+        _draw_receipt_page(c, tr, company, r, items, clients.get(r['client_id']))
+        c.showPage()
+        n += 1
+    c.save()
+    return fname, n
+
+def _draw_receipt_page(c, tr, company: Company, r, items, client):
+    vat_rate = r['vat_rate']
     width, height = A4
     c.setStrokeColor(colors.black)
     c.rect(20*mm, height-30*mm, width-40*mm, 20*mm, stroke=1, fill=0)
     c.setFont("Helvetica-Bold", 16); c.drawString(25*mm, height-18*mm, company.name)
-    c.setFont("Helvetica", 10); c.drawString(25*mm, height-24*mm, f"{app.tr('admin')}: {company.admin}")
-    c.setFont("Helvetica-Bold", 12); c.drawString(25*mm, height-40*mm, f"{app.tr('receipt')} #{r['number']}")
-    c.setFont("Helvetica", 10); c.drawString(25*mm, height-46*mm, f"{app.tr('date')}: {r['date']}")
+    c.setFont("Helvetica", 10); c.drawString(25*mm, height-24*mm, f"{tr('admin')}: {company.admin}")
+    c.setFont("Helvetica-Bold", 12); c.drawString(25*mm, height-40*mm, f"{tr('receipt')} #{r['number']}")
+    c.setFont("Helvetica", 10); c.drawString(25*mm, height-46*mm, f"{tr('date')}: {r['date']}")
     if client:
-        c.drawString(25*mm, height-52*mm, f"{app.tr('name')}: {client['name']}")
+        c.drawString(25*mm, height-52*mm, f"{tr('name')}: {client['name']}")
         if client['email']:
-            c.drawString(25*mm, height-58*mm, f"{app.tr('email')}: {client['email']}")
+            c.drawString(25*mm, height-58*mm, f"{tr('email')}: {client['email']}")
     y = height-72*mm
     c.setFont("Helvetica-Bold", 10)
-    c.drawString(25*mm, y, app.tr("manipulation"))
-    c.drawRightString(170*mm, y, app.tr("price"))
+    c.drawString(25*mm, y, tr("manipulation"))
+    c.drawRightString(170*mm, y, tr("price"))
     y -= 6*mm; c.setFont("Helvetica", 10)
-    total = 0
     for it in items:
-        name = it['name']; price = it['price_cents'] * it['qty']; total += price
+        name = it['name']; price = it['price_cents'] * it['qty']
         c.drawString(25*mm, y, f"{name}"); c.drawRightString(170*mm, y, f"€ {cents_to_money(price)}")
         y -= 6*mm
         if y < 40*mm:
             c.showPage(); y = height-30*mm
-    vat_amount = int(round(total * (vat_rate / (100.0 + vat_rate)))) if vat_rate > 0 else 0
-    net_amount = total - vat_amount
+    total = r['total_cents']; vat_amount = r['vat_cents']; net_amount = r['net_cents']
     if y < 30*mm:
         c.showPage(); y = height-30*mm
     c.setFont("Helvetica-Bold", 11)
-    c.drawRightString(170*mm, y-2*mm, f"{app.tr('total')}: € {cents_to_money(total)}")
+    c.drawRightString(170*mm, y-2*mm, f"{tr('total')}: € {cents_to_money(total)}")
     y -= 10*mm; c.setFont("Helvetica", 10)
     c.drawRightString(170*mm, y, f"Netto: € {cents_to_money(net_amount)}"); y -= 6*mm
     c.drawRightString(170*mm, y, f"Btw {vat_rate:.2f}%: € {cents_to_money(vat_amount)}"); y -= 8*mm
@@ -1483,21 +5837,40 @@ def generate_receipt_pdf(app: App, rid: int) -> Path | None:
     c.setFont("Helvetica-Bold", 11); c.drawRightString(170*mm, y, f"Totaal incl. btw: € {cents_to_money(total)}")
     y -= 10*mm; c.setFont("Helvetica", 8)
     c.drawString(25*mm, y, "Prijzen inclusief btw. Bewaar dit reçu voor uw administratie.")
-    c.save(); return fname
 
 
-def send_receipt_email(app: App, r, items, client_row):
+def smtp_settings() -> dict | None:
+    """SMTP-gegevens uit de omgeving; None als er iets ontbreekt."""
+    cfg = {"host": os.getenv("SMTP_HOST", ""), "port": int(os.getenv("SMTP_PORT", "587")),
+           "user": os.getenv("SMTP_USER", ""), "password": os.getenv("SMTP_PASS", "")}
+    cfg["from"] = os.getenv("SMTP_FROM", cfg["user"])
+    return cfg if all(cfg.values()) else None
+
+def smtp_send(cfg: dict, messages):
+    """Verstuurt (sleutel, EmailMessage)-paren over één verbinding en levert de sleutel
+    van elk verstuurd bericht. Een geweigerde ontvanger houdt de rest niet tegen."""
     import smtplib
+    with smtplib.SMTP(cfg["host"], cfg["port"]) as s:
+        s.starttls(); s.login(cfg["user"], cfg["password"])
+        for key, msg in messages:
+            try:
+                s.send_message(msg)
+            except smtplib.SMTPRecipientsRefused:
+                continue
+            yield key
+
+def send_receipt_email(app: App, r, items, client_row):
     from email.message import EmailMessage
-    SMTP_HOST = os.getenv("SMTP_HOST", ""); SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-    SMTP_USER = os.getenv("SMTP_USER", ""); SMTP_PASS = os.getenv("SMTP_PASS", ""); SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USER)
-    if not all([SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS, SMTP_FROM]):
+    smtp = smtp_settings()
+    if smtp is None:
         messagebox.showerror("Email", "SMTP instellingen ontbreken (env: SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS, SMTP_FROM)"); return
-    if not r['pdf_path'] or not Path(r['pdf_path']).exists():
-        path = generate_receipt_pdf(app, r['id'])
-        if path:
-            app.store.update_receipt_pdf(r['id'], str(path))
-    filepath = r['pdf_path']
+    data = load_receipt_pdf(app.store, r)
+    filename = Path(r['pdf_path']).name if r['pdf_path'] else f"receipt_{r['number']}.pdf"
+    if data is None:
+        filepath = generate_receipt_pdf(app, r['id'])
+        if filepath:
+            app.store.update_receipt_pdf(r['id'], pdf_rel(filepath))
+            data = filepath.read_bytes(); filename = filepath.name
     lang = client_row['lang'] or app.lang
     subj_map = {'nl': f"Reçu #{r['number']} – {app.company.name}", 'fr': f"Reçu #{r['number']} – {app.company.name}", 'en': f"Receipt #{r['number']} – {app.company.name}", 'ar': f"إيصال #{r['number']} – {app.company.name}"}
     body_map = {
@@ -1507,17 +5880,38 @@ def send_receipt_email(app: App, r, items, client_row):
         'ar': f"{client_row['name']} العزيز/العزيزة،\nيرجى العثور على الإيصال بالمرفق. شكراً لك.\n{app.company.name}",
     }
     subj = subj_map.get(lang, subj_map['en']); body = body_map.get(lang, body_map['en'])
-    msg = EmailMessage(); msg['Subject'] = subj; msg['From'] = SMTP_FROM; msg['To'] = client_row['email']; msg.set_content(body)
-    if filepath and Path(filepath).exists():
-        with open(filepath, 'rb') as f:
-            data = f.read(); msg.add_attachment(data, maintype='application', subtype='pdf', filename=Path(filepath).name)
+    msg = EmailMessage(); msg['Subject'] = subj; msg['From'] = smtp["from"]; msg['To'] = client_row['email']; msg.set_content(body)
+    if data:
+        msg.add_attachment(data, maintype='application', subtype='pdf', filename=filename)
     try:
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as s:
-            s.starttls(); s.login(SMTP_USER, SMTP_PASS); s.send_message(msg)
+        if not list(smtp_send(smtp, [(r['id'], msg)])):
+            messagebox.showerror("Email", f"Adres geweigerd door de server: {client_row['email']}"); return
         messagebox.showinfo("Email", "E-mail verzonden.")
     except Exception as e:
         messagebox.showerror("Email", f"Fout bij verzenden: {e}")
 
 # ---- main -------------------------------------------------------------------
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Pedicure administratie")
+    ap.add_argument("--serve", action="store_true", help="start de lokale server voor meerdere werkposten")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--readers", type=int, default=4, help="aantal leesverbindingen van de server")
+    ap.add_argument("--server", metavar="URL", help="gebruik een server i.p.v. de lokale databank")
+    ap.add_argument("--load-test", action="store_true", help="simuleer meerdere werkposten tegen een tijdelijke testserver")
+    ap.add_argument("--desks", type=int, default=4)
+    ap.add_argument("--rounds", type=int, default=50)
+    args = ap.parse_args(argv)
+    token = os.getenv("PEDICURE_SERVER_TOKEN") or None
+    if args.serve:
+        Scheduler().start()     # werkposten laten de geplande taken aan de server over
+        StoreServer(readers=args.readers, token=token).serve_forever(args.host, args.port)
+    elif args.load_test:
+        print(json.dumps(run_load_test(args.desks, args.rounds, args.readers), indent=2))
+    else:
+        store = RemoteStore(args.server, token) if args.server else None
+        app = App(store); app.mainloop()
+
 if __name__ == "__main__":
-    app = App(); app.mainloop()
+    main()
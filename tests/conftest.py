@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# De module maakt bij import ~/.pedicure_app aan: tijdens tests niet in de echte home-map
+os.environ["HOME"] = tempfile.mkdtemp(prefix="pedicure_test_home_")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+import pedicure_admin_app_v_4_tax_btw as app
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Verse Store op een tijdelijke databank met één cliënt (id 1) en één behandeling (id 1)."""
+    s = app.Store(tmp_path / "pedicure.db")
+    s.add_client("Test Cliënt", "test@example.com", "0470 12 34 56", "")
+    s.add_manip("Pedicure", 3500)
+    yield s
+    s.conn.close()
+
+
+@pytest.fixture
+def make_receipt(store):
+    """make_receipt(dag, cent=3500, qty=1) -> id: reçu op een willekeurige dag."""
+    def make(day, cents=3500, qty=1):
+        rid, _number, _total = store._insert_receipt(store.conn.cursor(), 1, [(1, qty, cents)], day.isoformat(), "10:00")
+        store.conn.commit()
+        return rid
+    return make
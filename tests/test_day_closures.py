@@ -0,0 +1,73 @@
+import datetime as dt
+
+import pytest
+
+
+def live_totals(store, start, end):
+    row = store.conn.execute(
+        "SELECT COALESCE(SUM(total_cents),0), COALESCE(SUM(net_cents),0), COALESCE(SUM(vat_cents),0), COUNT(*)"
+        " FROM receipts WHERE date>=? AND date<=?", (start.isoformat(), end.isoformat())).fetchone()
+    return dict(zip(("gross", "net", "vat", "n"), row))
+
+
+def live_manipulations(store, start, end):
+    rows = store.conn.execute(
+        "SELECT name, SUM(qty*price_cents) FROM receipt_items WHERE date>=? AND date<=? GROUP BY name ORDER BY name",
+        (start.isoformat(), end.isoformat())).fetchall()
+    return [tuple(r) for r in rows]
+
+
+def assert_matches_live(store, start, end):
+    expected = live_totals(store, start, end)
+    totals = store.period_totals(start, end)
+    assert {k: totals[k] for k in expected} == expected
+    assert totals['manipulations'] == live_manipulations(store, start, end)
+    assert store.sum_total_in_range(start, end) == expected['gross']
+    months = store.monthly_vat_totals(start, end)
+    assert sum(m['vat'] for m in months) == expected['vat']
+    assert sum(m['n'] for m in months) == expected['n']
+
+
+@pytest.fixture
+def closed_days(store, make_receipt):
+    """Twee afgesloten dagen en een open dag, alle in het lopende jaar."""
+    today = dt.date.today()
+    days = [today - dt.timedelta(days=n) for n in (2, 1, 0)] if today.timetuple().tm_yday > 2 else [today] * 3
+    ids = [make_receipt(days[0], cents=3500), make_receipt(days[0], cents=5000, qty=2),
+           make_receipt(days[1], cents=2500), make_receipt(days[2], cents=4000)]
+    store.close_day(days[0])
+    store.close_day(days[1])
+    return days[0], days[-1], ids
+
+
+def test_period_totals_use_closures(store, closed_days):
+    start, end, _ids = closed_days
+    assert not any(c['stale'] for c in store.day_closures_in_range(start, end))
+    assert_matches_live(store, start, end)
+
+
+def test_period_totals_after_updating_closed_receipt(store, closed_days):
+    start, end, ids = closed_days
+    store.conn.execute("UPDATE receipts SET total_cents=total_cents+100, net_cents=net_cents+83, vat_cents=vat_cents+17 WHERE id=?", (ids[0],))
+    store.conn.execute("UPDATE receipt_items SET price_cents=3600 WHERE receipt_id=?", (ids[0],))
+    store.conn.commit()
+    assert store.day_closures_in_range(start, start)[0]['stale']
+    assert_matches_live(store, start, end)
+
+
+def test_period_totals_after_deleting_closed_receipt(store, closed_days):
+    start, end, ids = closed_days
+    store.conn.execute("DELETE FROM receipt_items WHERE receipt_id=?", (ids[1],))
+    store.conn.execute("DELETE FROM receipts WHERE id=?", (ids[1],))
+    store.conn.commit()
+    assert_matches_live(store, start, end)
+    store.close_day(start)
+    assert not store.day_closures_in_range(start, start)[0]['stale']
+    assert_matches_live(store, start, end)
+
+
+def test_period_totals_count_receipts_after_closure(store, make_receipt, closed_days):
+    start, end, _ids = closed_days
+    make_receipt(start, cents=1234)
+    assert not store.day_closures_in_range(start, start)[0]['stale']
+    assert_matches_live(store, start, end)
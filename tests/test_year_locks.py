@@ -0,0 +1,51 @@
+import datetime as dt
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def closed_year(store, make_receipt):
+    year = dt.date.today().year - 1
+    rid = make_receipt(dt.date(year, 3, 14), cents=4200)
+    make_receipt(dt.date(year, 11, 2))
+    store.close_year(year)
+    return year, rid
+
+
+def test_closed_year_rejects_receipt_changes(store, make_receipt, closed_year):
+    year, rid = closed_year
+    with pytest.raises(sqlite3.DatabaseError, match="afgesloten"):
+        store.conn.execute("UPDATE receipts SET total_cents=1 WHERE id=?", (rid,))
+    with pytest.raises(sqlite3.DatabaseError, match="afgesloten"):
+        store.conn.execute("UPDATE receipt_items SET qty=2 WHERE receipt_id=?", (rid,))
+    with pytest.raises(sqlite3.DatabaseError, match="afgesloten"):
+        store.conn.execute("DELETE FROM receipts WHERE id=?", (rid,))
+    with pytest.raises(sqlite3.DatabaseError, match="afgesloten"):
+        make_receipt(dt.date(year, 6, 1))
+    store.conn.rollback()
+    assert store.get_receipt(rid)[0]['total_cents'] == 4200
+
+
+def test_closed_year_totals_are_frozen(store, closed_year):
+    year, _rid = closed_year
+    with pytest.raises(sqlite3.DatabaseError, match="afgesloten"):
+        store.conn.execute("UPDATE year_totals SET gross=0")
+    with pytest.raises(sqlite3.DatabaseError, match="afgesloten"):
+        store.conn.execute("DELETE FROM closed_years WHERE year=?", (year,))
+    with pytest.raises(ValueError):
+        store.close_year(year)
+
+
+def test_closed_year_allows_pdf_path_and_archive(store, closed_year):
+    year, rid = closed_year
+    store.update_receipt_pdf(rid, f"{year}/03/receipt_{rid}.pdf")
+    assert store.get_receipt(rid)[0]['pdf_path'] == f"{year}/03/receipt_{rid}.pdf"
+
+    before = store.sum_vat_in_range(dt.date(year, 1, 1), dt.date(year, 12, 31))
+    path = store.archive_year(year)
+    assert path.exists()
+    assert store.conn.execute("SELECT COUNT(*) FROM main.receipts").fetchone()[0] == 0
+    r, items = store.get_receipt(rid)
+    assert r['total_cents'] == 4200 and len(items) == 1
+    assert store.sum_vat_in_range(dt.date(year, 1, 1), dt.date(year, 12, 31)) == before